@@ -0,0 +1,351 @@
+import asyncio
+import json
+import logging
+import time
+from collections import Counter, deque
+
+import aiohttp
+import aiomysql
+
+from metrics import registry as metrics
+from hitstream import page_total
+from migrate import build_insert_sql, decode_page, scroll_complete
+from projection import Projection
+from retry import MYSQL_CONNECTION_LOST, MYSQL_TRANSIENT, RETRY_STATUSES, SCROLL_RETRY_STATUSES, RetryPolicy, mysql_errno
+from transport import es_base_url
+
+# Failures that mean the request was never sent (ConnectionTimeoutError is aiohttp 3.10+)
+CONNECT_ERRORS = (aiohttp.ClientConnectorError, getattr(aiohttp, "ConnectionTimeoutError", aiohttp.ClientConnectorError))
+
+
+class AsyncBoundedQueue:
+    """asyncio counterpart of migrate.BoundedQueue, bounded by item count and content bytes.
+
+    Consumers take whole batches with get_batch(); a None item is a per-consumer stop
+    sentinel and is never returned inside a batch.
+    """
+
+    def __init__(self, max_items=0, max_bytes=0):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.bytes_in_flight = 0
+        self._items = deque()
+        self._cond = asyncio.Condition()
+
+    @staticmethod
+    def _item_bytes(item):
+        return 0 if item is None else len(item[1])
+
+    def _is_full(self, size):
+        if 0 < self.max_items <= len(self._items):
+            return True
+        return 0 < self.max_bytes < self.bytes_in_flight + size and self.bytes_in_flight > 0
+
+    async def put(self, item):
+        size = self._item_bytes(item)
+        async with self._cond:
+            await self._cond.wait_for(lambda: not self._is_full(size))
+            self._items.append(item)
+            self.bytes_in_flight += size
+            self._cond.notify_all()
+
+    async def get_batch(self, max_rows, max_bytes):
+        """Wait for at least one item, then take up to max_rows items / max_bytes of content.
+
+        Returns None when the next item is the stop sentinel.
+        """
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._items)
+            if self._items[0] is None:
+                self._items.popleft()
+                return None
+            batch = []
+            batch_bytes = 0
+            while self._items and len(batch) < max_rows and self._items[0] is not None:
+                item_bytes = self._item_bytes(self._items[0])
+                if batch and batch_bytes + item_bytes > max_bytes:
+                    break
+                batch.append(self._items.popleft())
+                batch_bytes += item_bytes
+            self.bytes_in_flight -= batch_bytes
+            self._cond.notify_all()
+            return batch
+
+    def qsize(self):
+        return len(self._items)
+
+    def fill(self):
+        return max(len(self._items) / self.max_items if self.max_items > 0 else 0.0,
+                   self.bytes_in_flight / self.max_bytes if self.max_bytes > 0 else 0.0)
+
+    def describe(self):
+        return f"queue depth {len(self._items)}, {self.bytes_in_flight / (1024 * 1024):.1f} MiB in flight"
+
+
+async def _post(session, fetch_limit, url, body, params=None, retry=None, label="", idempotent=True):
+    """POST and return (status, body bytes or error text), retrying like retry.post_with_retry."""
+    with metrics.timer("es_request_seconds"):
+        return await _post_with_retry(session, fetch_limit, url, body, params, retry or RetryPolicy(), label, idempotent)
+
+
+async def _post_with_retry(session, fetch_limit, url, body, params, retry, label, idempotent):
+    statuses = RETRY_STATUSES if idempotent else SCROLL_RETRY_STATUSES
+    attempt = 0
+    while True:
+        retry_after = None
+        try:
+            async with fetch_limit:
+                async with session.post(url, params=params, data=json.dumps(body)) as response:
+                    if response.status == 200:
+                        return 200, await response.read()
+                    status, text = response.status, await response.text()
+                    retry_after = response.headers.get("Retry-After")
+            if status not in statuses or attempt >= retry.max_retries:
+                return status, text
+            logging.warning(f"{label}: HTTP {status}; retrying ({attempt + 1}/{retry.max_retries})")
+            metrics.inc("retries_total")
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            if attempt >= retry.max_retries or not (idempotent or isinstance(e, CONNECT_ERRORS)):
+                raise
+            logging.warning(f"{label}: {e!r}; retrying ({attempt + 1}/{retry.max_retries})")
+            metrics.inc("retries_total")
+        # Sleep outside fetch_limit so a backing-off slice does not hold a request slot
+        await asyncio.sleep(retry.delay(attempt, retry_after))
+        attempt += 1
+
+
+async def _clear_scroll(session, scroll_url, scroll_id, label):
+    if not scroll_id:
+        return
+    try:
+        async with session.delete(scroll_url, data=json.dumps({"scroll_id": [scroll_id]})) as response:
+            if response.status not in (200, 404):
+                logging.warning(f"{label}: clearing scroll context failed: {response.status}, {await response.text()}")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logging.warning(f"{label}: clearing scroll context failed: {e!r}")
+
+
+async def scroll_slice_async(session, fetch_limit, es_url, query, batch_size, queue, slice_id=0, slices=1, tracker=None,
+                             id_index=None, retry=None, projection=None):
+    """Async version of migrate.scroll_slice.
+
+    The next scroll page is requested as soon as the current one arrives, so it is in
+    flight while the current page is being queued. Returns (records fetched, whether the
+    slice was scrolled to the end).
+    """
+    body = dict(query)
+    label = "Scroll"
+    if slices > 1:
+        body["slice"] = {"id": slice_id, "max": slices}
+        label = f"Slice {slice_id + 1}/{slices}"
+    projection = projection or Projection()
+    params = {"scroll": "2m", "size": str(batch_size), **projection.request_params()}
+    scroll_url = f"{es_base_url(es_url)}/_search/scroll"
+
+    try:
+        status, data = await _post(session, fetch_limit, es_url, body, params, retry, label)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logging.error(f"{label}: initial scroll request failed: {e!r}")
+        return 0, False
+    if status != 200:
+        logging.error(f"{label}: initial scroll request failed: {status}, {data}")
+        return 0, False
+
+    try:
+        scroll_id, hits = decode_page(data)
+    except ValueError as e:
+        logging.error(f"{label}: unreadable initial scroll response: {e}")
+        return 0, False
+    total = page_total(data)
+    total_queued = 0
+    completed = False
+    next_page = None
+
+    try:
+        while hits:
+            next_page = asyncio.ensure_future(
+                _post(session, fetch_limit, scroll_url, {"scroll": "2m", "scroll_id": scroll_id},
+                      projection.request_params(), retry, label, idempotent=False)
+            )
+            new_hits = id_index.filter_new(hits) if id_index is not None else hits
+            new_hits = projection.transform_hits(new_hits)
+            mark = None
+            if tracker:
+                last_id, _, last_sort = hits[-1]
+                mark = tracker.start_page(slice_id, last_sort, last_id, len(new_hits))
+            with metrics.timer("queue_put_wait_seconds"):
+                for row_id, content_json, _ in new_hits:
+                    await queue.put((row_id, content_json, mark))
+            total_queued += len(hits)
+            known = f", {len(hits) - len(new_hits)} already known" if id_index is not None else ""
+            logging.info(f"{label}: queued {len(new_hits)} records{known}. Total so far: {total_queued} ({queue.describe()})")
+
+            try:
+                status, data = await next_page
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.error(f"{label}: scroll request failed: {e!r}")
+                break
+            if status != 200:
+                logging.error(f"{label}: scroll request failed: {status}, {data}")
+                break
+            try:
+                scroll_id, hits = decode_page(data)
+            except ValueError as e:
+                logging.error(f"{label}: unreadable scroll response: {e}")
+                break
+        else:
+            completed = scroll_complete(label, total, total_queued)
+            if completed and tracker:
+                tracker.finish_slice(slice_id)
+    finally:
+        if next_page is not None and not next_page.done():
+            next_page.cancel()
+        await _clear_scroll(session, scroll_url, scroll_id, label)
+
+    logging.info(f"{label}: {'finished' if completed else 'stopped early'}, {total_queued} records queued")
+    return total_queued, completed
+
+
+async def _insert_with_retry(pool, table, batch, retry, label):
+    """Insert and commit one batch, retrying transient errors; returns rows inserted or None."""
+    params = []
+    for item in batch:
+        params.append(item[0])
+        params.append(item[1])
+    attempt = 0
+    while True:
+        try:
+            async with pool.acquire() as conn:
+                try:
+                    async with conn.cursor() as cursor:
+                        with metrics.timer("insert_seconds"):
+                            await cursor.execute(build_insert_sql(table, len(batch)), params)
+                        inserted = cursor.rowcount
+                    with metrics.timer("commit_seconds"):
+                        await conn.commit()
+                    return inserted
+                except Exception as e:
+                    errno = mysql_errno(e)
+                    if errno in MYSQL_CONNECTION_LOST:
+                        # A closed connection is dropped from the pool on release
+                        conn.close()
+                    else:
+                        try:
+                            await conn.rollback()
+                        except Exception:
+                            conn.close()
+                    raise
+        except Exception as e:
+            errno = mysql_errno(e)
+            if errno not in MYSQL_TRANSIENT or attempt >= retry.max_retries:
+                logging.error(f"{label}: {e}")
+                return None
+            logging.warning(f"{label}: {e}; retrying ({attempt + 1}/{retry.max_retries})")
+            metrics.inc("retries_total")
+            await asyncio.sleep(retry.delay(attempt))
+            attempt += 1
+
+
+async def insert_worker_async(pool, queue, table, batch_rows, batch_bytes, tracker=None, id_index=None, retry=None,
+                              tuner=None, worker_index=0):
+    """Async version of migrate.insert_worker; returns the number of rows that failed to insert after retries."""
+    retry = retry or RetryPolicy()
+    inserted_count = 0
+    skipped_count = 0
+    failed_count = 0
+    total_processed = 0
+
+    while True:
+        if tuner:
+            while not tuner.is_active(worker_index):
+                await asyncio.sleep(0.1)
+            batch_rows = tuner.batch_rows
+        with metrics.timer("queue_get_wait_seconds"):
+            batch = await queue.get_batch(batch_rows, batch_bytes)
+        if batch is None:
+            break
+        label = f"Error inserting batch of {len(batch)} rows (IDs {batch[0][0]} .. {batch[-1][0]})"
+        started = time.perf_counter()
+        inserted = await _insert_with_retry(pool, table, batch, retry, label)
+        if tuner:
+            tuner.record(len(batch), time.perf_counter() - started, inserted is None)
+        if inserted is None:
+            failed_count += len(batch)
+            metrics.inc("rows_failed_total", len(batch))
+        else:
+            inserted_count += inserted
+            skipped_count += len(batch) - inserted
+            metrics.inc("rows_inserted_total", inserted)
+            metrics.inc("rows_skipped_total", len(batch) - inserted)
+            if tracker:
+                for mark, count in Counter(item[2] for item in batch).items():
+                    tracker.ack(mark, count)
+            if id_index is not None:
+                id_index.add_many(item[0] for item in batch)
+        total_processed += len(batch)
+        logging.info(f"Worker progress: {total_processed} processed, {inserted_count} inserted, {skipped_count} skipped ({queue.describe()})")
+
+    logging.info(f"Worker finished: {total_processed} processed, {inserted_count} inserted, {skipped_count} duplicates skipped, {failed_count} failed")
+    return failed_count
+
+
+async def _run(args, db_config, headers, auth, slice_queries, slices, tracker, id_index, tuner, projection):
+    fetch_concurrency = args.fetch_concurrency or max(1, len(slice_queries))
+    insert_concurrency = args.insert_concurrency or args.threads
+    queue = AsyncBoundedQueue(args.queue_max_items, args.queue_max_bytes)
+    retry = RetryPolicy(args.max_retries, args.retry_base_delay, args.retry_max_delay)
+    metrics.gauge("queue_depth", queue.qsize)
+    metrics.gauge("queue_bytes", lambda: queue.bytes_in_flight)
+    if tuner:
+        tuner.queue_fill = queue.fill
+    fetch_limit = asyncio.Semaphore(fetch_concurrency)
+
+    logging.info(f"Starting async engine: {insert_concurrency} insert tasks for table {args.db_table} in DB {args.db_name} "
+                 f"on host {args.db_host} as user {args.db_user}, {fetch_concurrency} concurrent ES requests")
+    pool = await aiomysql.create_pool(
+        host=db_config["host"], user=db_config["user"], password=db_config["password"],
+        db=db_config["database"], minsize=1, maxsize=insert_concurrency, autocommit=False,
+    )
+    workers = [
+        asyncio.ensure_future(insert_worker_async(pool, queue, args.db_table, args.insert_batch_rows, args.insert_batch_bytes, tracker, id_index, retry,
+                                               tuner, i))
+        for i in range(insert_concurrency)
+    ]
+
+    results = [(0, True)] * slices
+    session_auth = aiohttp.BasicAuth(*auth) if auth else None
+    connector = aiohttp.TCPConnector(limit=fetch_concurrency)
+    timeout = aiohttp.ClientTimeout(sock_connect=args.es_connect_timeout, sock_read=args.es_read_timeout)
+    logging.info(f"Starting Elasticsearch scroll with {slices} slice(s)...")
+    try:
+        async with aiohttp.ClientSession(headers=headers, auth=session_auth, connector=connector, timeout=timeout) as session:
+            slice_ids = list(slice_queries)
+            slice_results = await asyncio.gather(*(
+                scroll_slice_async(session, fetch_limit, args.es_url, slice_queries[i], args.batch_size, queue, i, slices, tracker, id_index, retry,
+                                   projection)
+                for i in slice_ids
+            ))
+            for i, result in zip(slice_ids, slice_results):
+                results[i] = result
+    finally:
+        # Stop workers once everything queued so far is written
+        if tuner:
+            tuner.stop()
+        for _ in workers:
+            await queue.put(None)
+        failed = await asyncio.gather(*workers)
+        pool.close()
+        await pool.wait_closed()
+    return results, sum(failed)
+
+
+def run_async_migration(args, db_config, headers, auth, slice_queries, slices, tracker=None, id_index=None, tuner=None,
+                        projection=None):
+    """Run fetch and insert on one event loop (aiohttp + aiomysql).
+
+    ES request concurrency (--fetch_concurrency) and insert concurrency
+    (--insert_concurrency) are limited independently. Returns the same
+    ([(records queued, slice completed) per slice], failed rows) as
+    migrate.run_threaded_migration.
+    """
+    return asyncio.run(_run(args, db_config, headers, auth, slice_queries, slices, tracker, id_index, tuner, projection))
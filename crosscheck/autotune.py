@@ -0,0 +1,133 @@
+"""Run-time tuning of insert batch size and active insert workers (migrate.py --autotune).
+
+Every interval the tuner looks at the insert batches committed since the last decision:
+
+- Batch rows follow AIMD on batch latency: +step rows while the mean batch latency is
+  under the target, halved when it is over the target or a batch failed.
+- Active workers grow by one while latency is under target and the queue is backing up
+  (MySQL is the bottleneck and has headroom), and are halved when latency exceeds twice
+  the target. A worker added in the previous interval is removed again if throughput
+  dropped. When the queue is nearly empty ES is the bottleneck and workers are left alone.
+
+Workers above the active count park between batches. The scroll page size cannot change
+once a scroll context is open, so it is only recommended for the next run.
+"""
+import logging
+import threading
+import time
+
+from metrics import registry as metrics
+
+
+class Autotuner:
+    def __init__(self, batch_rows, max_workers, queue_fill=None, target_latency=1.0, interval=10.0,
+                 min_batch_rows=50, max_batch_rows=5000, step_rows=100):
+        self.batch_rows = max(min_batch_rows, min(max_batch_rows, batch_rows))
+        self.max_workers = max_workers
+        # Start in the middle and let the feedback loop find the level
+        self.workers = max(1, (max_workers + 1) // 2)
+        # Set by the engine once its queue exists
+        self.queue_fill = queue_fill or (lambda: 0.0)
+        self.target_latency = target_latency
+        self.interval = interval
+        self.min_batch_rows = min_batch_rows
+        self.max_batch_rows = max_batch_rows
+        self.step_rows = step_rows
+        self.decisions = 0
+        self.stopped = False
+        self._cond = threading.Condition()
+        self._reset_window(time.monotonic())
+        self._last_throughput = None
+        self._added_worker = False
+
+    def _reset_window(self, now):
+        self._window_start = now
+        self._batches = 0
+        self._rows = 0
+        self._seconds = 0.0
+        self._failures = 0
+
+    def is_active(self, index):
+        return self.stopped or index < self.workers
+
+    def wait_active(self, index):
+        """Block a worker thread while it is above the active worker count."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.is_active(index))
+
+    def stop(self):
+        """Release parked workers so they can take their stop sentinel."""
+        with self._cond:
+            self.stopped = True
+            self._cond.notify_all()
+
+    def record(self, rows, seconds, failed=False):
+        """Report one insert batch; may trigger a tuning decision."""
+        with self._cond:
+            self._batches += 1
+            self._rows += rows
+            self._seconds += seconds
+            self._failures += int(failed)
+            now = time.monotonic()
+            if now - self._window_start >= self.interval:
+                self._decide(now)
+                self._cond.notify_all()
+
+    def _decide(self, now):
+        latency = self._seconds / self._batches
+        throughput = self._rows / (now - self._window_start)
+        fill = self.queue_fill()
+        batch_rows, workers = self.batch_rows, self.workers
+        reasons = []
+
+        if self._failures:
+            batch_rows = max(self.min_batch_rows, batch_rows // 2)
+            workers = max(1, workers // 2)
+            reasons.append(f"{self._failures} failed batch(es)")
+        elif latency > self.target_latency:
+            batch_rows = max(self.min_batch_rows, batch_rows // 2)
+            reasons.append(f"batch latency {latency:.3f}s over target {self.target_latency}s")
+            if latency > 2 * self.target_latency:
+                workers = max(1, workers // 2)
+        else:
+            batch_rows = min(self.max_batch_rows, batch_rows + self.step_rows)
+            reasons.append(f"batch latency {latency:.3f}s under target {self.target_latency}s")
+            if self._added_worker and self._last_throughput and throughput < 0.9 * self._last_throughput:
+                workers -= 1
+                reasons.append(f"throughput fell to {throughput:.0f} rows/s from {self._last_throughput:.0f} after adding a worker")
+            elif fill > 0.5 and workers < self.max_workers:
+                workers += 1
+                reasons.append(f"queue {fill:.0%} full")
+            elif fill < 0.1:
+                reasons.append(f"queue {fill:.0%} full, ES is the bottleneck")
+
+        self._added_worker = workers > self.workers
+        self._last_throughput = throughput
+        self.decisions += 1
+        logging.info(f"Autotune: batch rows {self.batch_rows} -> {batch_rows}, active workers {self.workers} -> {workers} "
+                     f"({throughput:.0f} rows/s over {self._batches} batches; {'; '.join(reasons)})")
+        self.batch_rows, self.workers = batch_rows, workers
+        self._reset_window(now)
+
+    def recommended_page_size(self, page_size):
+        """Suggest --batch_size for the next run from this run's scroll latency and queue wait."""
+        requests, request_seconds = metrics.totals("es_request_seconds")
+        _, starved_total = metrics.totals("queue_get_wait_seconds")
+        if not requests:
+            return page_size
+        request_mean = request_seconds / requests
+        if request_mean > 5.0:
+            return max(100, page_size // 2)
+        # Workers spent a noticeable share of the run waiting for pages and ES answers quickly
+        if request_mean < 1.0 and starved_total > 0.2 * self.max_workers * (time.time() - metrics.started):
+            return min(10000, page_size * 2)
+        return page_size
+
+    def describe(self, page_size):
+        return {
+            "batch_rows": self.batch_rows,
+            "active_workers": self.workers,
+            "max_workers": self.max_workers,
+            "decisions": self.decisions,
+            "recommended_batch_size": self.recommended_page_size(page_size),
+        }
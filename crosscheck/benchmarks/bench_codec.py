@@ -0,0 +1,120 @@
+"""Compression ratio and encode/decode throughput of --content_codec zstd against alternatives.
+
+    python benchmarks/bench_codec.py                          # gen_data.py hits
+    python benchmarks/bench_codec.py --ndjson hits.ndjson     # real hits, e.g. from codec.py cat
+
+Every variant compresses the same hits one row at a time, as migrate.py stores them,
+except the InnoDB row: it compresses consecutive rows in 16 KB pages with zlib and rounds
+each page up to 4 KB, which is roughly what transparent page compression
+(COMPRESSION='zlib') saves on a filesystem with 4 KB hole punching. The dictionary is
+trained on a separate sample, so its ratio is not flattered by having seen the test rows.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import zlib
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import gen_data  # noqa: E402
+from codec import ContentCodec, ContentReader, require_zstandard, train_dictionary  # noqa: E402
+
+PAGE_BYTES = 16384
+HOLE_BYTES = 4096
+
+
+def generated_hits(count, seed):
+    rng = random.Random(seed)
+    return [content for _, content in gen_data.iter_batch(count, rng, datetime(2025, 12, 1))]
+
+
+def file_hits(path, count, skip=0):
+    hits = []
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f):
+            if n < skip:
+                continue
+            if len(hits) >= count:
+                break
+            hits.append(line.rstrip("\n"))
+    return hits
+
+
+def measure(hits, encode, decode):
+    """(stored bytes, encode MiB/s, decode MiB/s) over raw content bytes."""
+    raw = sum(len(hit.encode("utf-8")) for hit in hits)
+    started = time.perf_counter()
+    stored = [encode(hit) for hit in hits]
+    encode_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    for value in stored:
+        decode(value)
+    decode_seconds = time.perf_counter() - started
+    mib = raw / (1024 * 1024)
+    return sum(len(value) for value in stored), mib / encode_seconds, mib / decode_seconds
+
+
+def innodb_pages(hits, level=6):
+    """Stored bytes and encode MiB/s of zlib over 16 KB pages rounded up to 4 KB."""
+    raw = [hit.encode("utf-8") for hit in hits]
+    started = time.perf_counter()
+    stored = 0
+    page = bytearray()
+    for value in raw + [None]:
+        if value is None or len(page) + len(value) > PAGE_BYTES and page:
+            size = len(zlib.compress(bytes(page), level))
+            stored += -(-size // HOLE_BYTES) * HOLE_BYTES
+            page.clear()
+        if value is not None:
+            page += value
+    seconds = time.perf_counter() - started
+    return stored, sum(map(len, raw)) / (1024 * 1024) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare content compression options for the staging table.")
+    parser.add_argument("--rows", type=int, default=20000, help="Hits to compress")
+    parser.add_argument("--train_rows", type=int, default=5000, help="Separate hits to train the dictionary on")
+    parser.add_argument("--dict_size", type=int, default=112640)
+    parser.add_argument("--ndjson", help="Read hits from this file (one hit JSON per line) instead of generating them")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    require_zstandard()
+
+    if args.ndjson:
+        train = file_hits(args.ndjson, args.train_rows)
+        hits = file_hits(args.ndjson, args.rows, skip=args.train_rows)
+    else:
+        train = generated_hits(args.train_rows, args.seed + 1)
+        hits = generated_hits(args.rows, args.seed)
+    raw = sum(len(hit.encode("utf-8")) for hit in hits)
+    print(f"{len(hits)} hits, {raw / len(hits):.0f} bytes each on average, {raw / (1024 * 1024):.1f} MiB")
+
+    started = time.perf_counter()
+    dictionary = train_dictionary(train, args.dict_size)
+    print(f"dictionary: {len(dictionary)} bytes trained on {len(train)} hits in {time.perf_counter() - started:.1f}s\n")
+
+    reader = ContentReader()
+    dict_reader = ContentReader({ContentCodec(dictionary=dictionary).dict_id: dictionary})
+    variants = [
+        ("zlib 6 per row (COMPRESS())", lambda hit: zlib.compress(hit.encode("utf-8"), 6),
+         lambda value: zlib.decompress(value).decode("utf-8")),
+    ]
+    for level in (1, 3, 9):
+        variants.append((f"zstd {level}", ContentCodec(level).encode, reader.decode))
+    for level in (1, 3, 9):
+        variants.append((f"zstd {level} + dictionary", ContentCodec(level, dictionary).encode, dict_reader.decode))
+
+    print(f"  {'variant':<32} {'bytes/row':>9} {'ratio':>6} {'enc MiB/s':>10} {'dec MiB/s':>10}")
+    for name, encode, decode in variants:
+        stored, encode_rate, decode_rate = measure(hits, encode, decode)
+        print(f"  {name:<32} {stored / len(hits):9.0f} {raw / stored:6.2f} {encode_rate:10.0f} {decode_rate:10.0f}")
+    stored, encode_rate = innodb_pages(hits)
+    print(f"  {'InnoDB zlib pages (16K, 4K holes)':<32} {stored / len(hits):9.0f} {raw / stored:6.2f} {encode_rate:10.0f} {'-':>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Throughput of the page decode/encode stage, in the scroll threads vs the --encode_processes pool.
+
+    python benchmarks/bench_encode_pool.py --pages 200 --feeders 8 --processes 1,4,8,16
+    python benchmarks/bench_encode_pool.py --drop_redundant_original --content_codec zstd
+
+--feeders threads (the scroll slices) push fake_es.py pages through the stage as fast as
+they can; hits/s is what the stage could sustain if ES and MySQL kept up. Processes 0 is
+the in-process path (parse_scroll_page() plus projection and codec under the GIL).
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from codec import ContentCodec  # noqa: E402
+from encode_pool import EncodePool  # noqa: E402
+from fake_es import FakeIndex  # noqa: E402
+from hitstream import parse_scroll_page  # noqa: E402
+from projection import Projection  # noqa: E402
+
+
+def in_process(projection, codec):
+    def decode(body):
+        scroll_id, hits = parse_scroll_page(body)
+        hits = projection.transform_hits(hits)
+        if codec:
+            hits = [(row_id, codec.encode(content), sort) for row_id, content, sort in hits]
+        return scroll_id, hits
+    return decode
+
+
+def run(decode, pages, feeders):
+    """Hits per second with feeders threads sharing the pages."""
+    hits = [0] * feeders
+
+    def feed(n):
+        for body in pages[n::feeders]:
+            hits[n] += len(decode(body)[1])
+
+    threads = [threading.Thread(target=feed, args=(n,)) for n in range(feeders)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(hits) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the page decode/encode stage with and without the process pool.")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--page_size", type=int, default=2000, help="Hits per page")
+    parser.add_argument("--feeders", type=int, default=4, help="Concurrent scroll threads")
+    parser.add_argument("--processes", default="0,2,4", help="Comma-separated pool sizes (0 = in-process)")
+    parser.add_argument("--drop_redundant_original", action="store_true")
+    parser.add_argument("--content_codec", choices=["json", "zstd"], default="json")
+    args = parser.parse_args()
+
+    index = FakeIndex(args.page_size)
+    scroll_id = index.open_scroll(args.page_size, {"sort": [{"@timestamp": "asc"}]})
+    page = index.page(scroll_id)
+    pages = [page] * args.pages
+    projection = Projection(drop_redundant_original=args.drop_redundant_original)
+    codec = ContentCodec() if args.content_codec == "zstd" else None
+    print(f"{args.pages} pages of {args.page_size} hits ({len(page) / (1024 * 1024):.1f} MiB each), {args.feeders} feeders, "
+          f"{os.cpu_count()} CPUs")
+
+    for processes in [int(value) for value in args.processes.split(",")]:
+        if processes == 0:
+            rate = run(in_process(projection, codec), pages, args.feeders)
+        else:
+            pool = EncodePool(processes, projection, codec)
+            try:
+                rate = run(pool.decode_page, pages, args.feeders)
+            finally:
+                pool.close()
+        print(f"  processes {processes:>3}: {rate:10.0f} hits/s")
+
+
+if __name__ == "__main__":
+    main()
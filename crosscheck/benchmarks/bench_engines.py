@@ -0,0 +1,85 @@
+"""Compare migrate.py's threaded and async engines on the same local dataset.
+
+Every argument not recognised here is passed straight through to migrate.py, so point
+it at a local ES index and a scratch MySQL table:
+
+    python benchmarks/bench_engines.py --runs 3 -- \
+        --es_url http://localhost:9200/bench/_search --es_user elastic --es_pass changeme \
+        --db_host 127.0.0.1 --db_user root --db_pass root --db_name test_json \
+        --db_table bench_toprocess --match_all --slices 4 --threads 4 --batch_size 2000
+
+The target table is truncated before each run so both engines insert the same rows.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+import mysql.connector
+
+MIGRATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrate.py")
+COMPLETED = re.compile(r"Total records processed from Elasticsearch: (\d+)")
+
+
+def passthrough_value(migrate_args, name):
+    flag = f"--{name}"
+    return migrate_args[migrate_args.index(flag) + 1] if flag in migrate_args else None
+
+
+def truncate(migrate_args):
+    conn = mysql.connector.connect(
+        host=passthrough_value(migrate_args, "db_host"),
+        user=passthrough_value(migrate_args, "db_user"),
+        password=passthrough_value(migrate_args, "db_pass"),
+        database=passthrough_value(migrate_args, "db_name"),
+    )
+    cursor = conn.cursor()
+    cursor.execute(f"TRUNCATE TABLE {passthrough_value(migrate_args, 'db_table')}")
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def run_once(engine, migrate_args, log_dir):
+    """Run migrate.py once; returns (docs, seconds, peak RSS in MiB, exit code)."""
+    log_path = os.path.join(log_dir, f"bench_{engine}.out")
+    started = time.perf_counter()
+    with open(log_path, "w") as log:
+        proc = subprocess.Popen([sys.executable, MIGRATE, "--engine", engine] + migrate_args,
+                                stdout=log, stderr=subprocess.STDOUT, cwd=log_dir)
+        _, status, usage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - started
+    with open(log_path) as log:
+        match = COMPLETED.search(log.read())
+    docs = int(match.group(1)) if match else 0
+    # ru_maxrss is KiB on Linux
+    return docs, elapsed, usage.ru_maxrss / 1024, os.waitstatus_to_exitcode(status)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark migrate.py --engine threaded vs async.")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per engine")
+    parser.add_argument("--engines", default="threaded,async", help="Comma-separated engines to compare")
+    parser.add_argument("--no_truncate", action="store_true", help="Do not truncate the target table between runs")
+    parser.add_argument("--log_dir", default=".", help="Where migrate.py output and es_to_mysql.log go")
+    args, migrate_args = parser.parse_known_args()
+    if migrate_args and migrate_args[0] == "--":
+        migrate_args = migrate_args[1:]
+
+    print(f"{'engine':<10} {'run':>3} {'docs':>10} {'seconds':>9} {'docs/sec':>10} {'peak RSS MiB':>13} {'exit':>5}")
+    for engine in args.engines.split(","):
+        rates = []
+        for run in range(1, args.runs + 1):
+            if not args.no_truncate:
+                truncate(migrate_args)
+            docs, elapsed, rss, code = run_once(engine, migrate_args, args.log_dir)
+            rate = docs / elapsed if elapsed else 0.0
+            rates.append(rate)
+            print(f"{engine:<10} {run:>3} {docs:>10} {elapsed:>9.2f} {rate:>10.0f} {rss:>13.1f} {code:>5}")
+        print(f"{engine:<10} best {max(rates):.0f} docs/sec, mean {sum(rates) / len(rates):.0f} docs/sec")
+
+
+if __name__ == "__main__":
+    main()
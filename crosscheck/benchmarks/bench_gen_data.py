@@ -0,0 +1,114 @@
+"""Compare gen_data.py's per-record generate_record() with the batch iter_batch() path.
+
+    python benchmarks/bench_gen_data.py                 # 50000 records each way
+    python benchmarks/bench_gen_data.py --records 200000
+
+Both paths produce serialized hits (what gen_data.py writes and inserts). The distribution
+check compares field-level frequencies of the batch sample with a per-record sample, next
+to the distance between two per-record samples with different seeds (sampling noise).
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import gen_data  # noqa: E402
+
+
+def per_record(n, rng, now):
+    return [(record["_id"], json.dumps(record)) for record in (gen_data.generate_record(i, rng, now) for i in range(n))]
+
+
+def batch(n, rng, now, block=gen_data.SHARD_RECORDS):
+    rows = []
+    for first in range(0, n, block):
+        rows += [(record["_id"], content) for record, content in gen_data.iter_batch(min(block, n - first), rng, now)]
+    return rows
+
+
+def features(record):
+    """Categorical views of every randomly drawn field."""
+    source = record["_source"]
+    event, pipeline = source["eventData"], source["pipelineData"]
+    yield "timestamp", source["@timestamp"][:10]
+    yield "type", event["type"]
+    yield "status", event["status"]
+    yield "duration_ms/10000", event["duration_ms"] // 10000
+    yield "jenkins server", event["reportingToolURL"].split("/")[2]
+    yield "jenkins folder", event["reportingToolURL"].split("/")[4]
+    yield "branch", branch_kind(pipeline["gitBranch"])
+    yield "pipelineId/100", int(pipeline["pipelineId"]) // 100
+    yield "askId count", len(pipeline["askId"])
+    yield "askId digit", pipeline["askId"][-1][-1]
+    yield "gitURL", pipeline["gitURL"].split("/")[-2] + (" token" if "ghp_" in pipeline["gitURL"] else "")
+    yield "caAgileId", pipeline["caAgileId"][:2] if pipeline["caAgileId"] != "poc" else "poc"
+    yield "gitCommit char", pipeline["gitCommit"][7]
+    yield "isTestMode", pipeline["isTestMode"]
+    yield "libraries", " ".join(f"{lib['id'][-4:]}@{lib['version']}" for lib in pipeline["pipelineLibraries"][:1]) + f" x{len(pipeline['pipelineLibraries'])}"
+    yield "_id char", record["_id"][3]
+    if "testData" in source:
+        test = source["testData"]
+        yield "test type", test["type"]
+        yield "totalTests/20", test["totalTests"] // 20
+        yield "testsFailed", test["testsFailed"]
+    if "sonarData" in source:
+        sonar = source["sonarData"]
+        yield "sonar gate", sonar["targetQualityGate"] + "/" + sonar["sonarQualityGate"]
+        yield "loc/1000", sonar["loc"] // 1000
+        yield "coverage/10", int(sonar["unitTestMetrics"].split(",")[0].split(":")[1]) // 10
+        yield "blocker", sonar["sonarMetrics"].split(",")[0].split(":")[1]
+
+
+def branch_kind(branch):
+    if branch.startswith("DE"):
+        return "DE*_" + branch.split("_", 1)[1]
+    if branch.startswith("PR-"):
+        return f"PR-{int(branch[3:]) // 10000}*"
+    return branch
+
+
+def distribution(rows):
+    counts = {}
+    for _, content in rows:
+        for name, value in features(json.loads(content)):
+            counts.setdefault(name, Counter())[value] += 1
+    return counts
+
+
+def total_variation(a, b):
+    na, nb = sum(a.values()), sum(b.values())
+    return 0.5 * sum(abs(a[key] / na - b[key] / nb) for key in set(a) | set(b))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-record against batch mock record generation.")
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    now = datetime(2025, 12, 1, 12, 0, 0)
+
+    results = {}
+    for name, generate in (("per-record", per_record), ("batch", batch)):
+        rng = random.Random(args.seed)
+        started = time.perf_counter()
+        results[name] = generate(args.records, rng, now)
+        elapsed = time.perf_counter() - started
+        print(f"{name:<11} {args.records / elapsed:10.0f} records/s  {elapsed / args.records * 1e6:6.1f} us/record")
+
+    print("\nTotal variation distance per field (0 = identical distributions):")
+    expected = distribution(results["per-record"])
+    actual = distribution(results["batch"])
+    noise = distribution(per_record(args.records, random.Random(args.seed + 1), now))
+    print(f"  {'field':<18} {'batch':>8} {'noise':>8}")
+    for field in expected:
+        print(f"  {field:<18} {total_variation(expected[field], actual[field]):8.4f} "
+              f"{total_variation(expected[field], noise[field]):8.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Compare hitstream.parse_scroll_page() with the json.loads() + json.dumps() round trip.
+
+    python benchmarks/bench_hitstream.py                      # synthetic 2000-hit page
+    python benchmarks/bench_hitstream.py --page response.json # a saved scroll response
+
+Save a real page with e.g. curl ... '_search?scroll=2m&size=2000' > response.json.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from hitstream import parse_scroll_page  # noqa: E402
+
+
+def synthetic_page(hits, seed=1):
+    rng = random.Random(seed)
+    docs = []
+    for i in range(hits):
+        event_data = {"type": rng.choice(["pipeline.build", "pipeline.deploy", "pipeline.test.unit"]),
+                      "status": rng.choice(["SUCCESS", "FAILURE"]), "duration_ms": rng.randint(5000, 300000),
+                      "reportingToolURL": f"https://jenkins.example.com/job/Build/job/app-{i}/{rng.randint(1, 999)}/"}
+        pipeline_data = {"askId": [f"UHGWM{rng.randint(100, 999)}-{rng.randint(100000, 999999)}"],
+                         "gitCommit": "".join(rng.choices("abcdef0123456789", k=40)),
+                         "projectKey": "com.example:app", "gitBranch": "main",
+                         "pipelineLibraries": [{"id": "com.example.jenkins.pipeline.library", "version": "master"}]}
+        docs.append({
+            "_index": "platforms.cicd.data-000008",
+            "_id": "".join(rng.choices("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789", k=16)),
+            "_score": None,
+            "_ignored": ["event.original.keyword"],
+            "_source": {"event": {"original": json.dumps({"eventData": event_data, "pipelineData": pipeline_data})},
+                        "@version": "1", "@timestamp": "2025-12-01T12:00:00.000000Z",
+                        "eventData": event_data, "pipelineData": pipeline_data},
+            "sort": [1764590400000 + i],
+        })
+    page = {"_scroll_id": "FGluY2x1ZGVfY29udGV4dF91dWlkDXF1ZXJ5QW5kRmV0Y2gBFkVf", "took": 12, "timed_out": False,
+            "hits": {"total": {"value": hits, "relation": "eq"}, "max_score": None, "hits": docs}}
+    return json.dumps(page, separators=(",", ":")).encode("utf-8")
+
+
+def round_trip(body):
+    data = json.loads(body)
+    return [(hit["_id"], json.dumps(hit), hit.get("sort")) for hit in data["hits"]["hits"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark raw hit extraction against a JSON round trip.")
+    parser.add_argument("--page", help="Saved scroll/search response body")
+    parser.add_argument("--hits", type=int, default=2000, help="Hits in the synthetic page")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.page:
+        with open(args.page, "rb") as f:
+            body = f.read()
+    else:
+        body = synthetic_page(args.hits)
+    hits = len(parse_scroll_page(body)[1])
+    print(f"page: {len(body) / 1024:.0f} KiB, {hits} hits")
+    for name, parse in (("json round trip", round_trip), ("hitstream", parse_scroll_page)):
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            parse(body)
+        per_doc = (time.perf_counter() - started) / args.repeat / max(1, hits)
+        print(f"{name:<16} {per_doc * 1e6:8.1f} us/doc")
+
+
+if __name__ == "__main__":
+    main()
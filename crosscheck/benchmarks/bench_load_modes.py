@@ -0,0 +1,102 @@
+"""Measure rows/sec of the multi-row INSERT path against the LOAD DATA LOCAL INFILE path.
+
+Loads synthetic ES hits straight into a scratch table on a local MySQL (no ES needed),
+using the same helpers migrate.py uses for --load_mode insert and --load_mode infile:
+
+    python benchmarks/bench_load_modes.py --db_host 127.0.0.1 --db_user root --db_pass root \
+        --db_name test_json --rows 200000
+
+The server must allow local_infile (SET GLOBAL local_infile = 1). The scratch table is
+dropped and recreated for every measurement.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import mysql.connector
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_hitstream import synthetic_page  # noqa: E402
+from hitstream import parse_scroll_page  # noqa: E402
+from infile import ChunkWriter, create_staging_table, load_chunk  # noqa: E402
+from migrate import insert_batch  # noqa: E402
+
+
+def make_rows(count):
+    rows = []
+    page = 0
+    while len(rows) < count:
+        _, hits = parse_scroll_page(synthetic_page(min(2000, count - len(rows)), seed=page))
+        rows.extend((f"{page}-{row_id}", content, None) for row_id, content, _ in hits)
+        page += 1
+    return rows
+
+
+def reset_table(cursor, table):
+    cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    cursor.execute(f"CREATE TABLE {table} (id VARCHAR(255) PRIMARY KEY, content JSON NOT NULL)")
+
+
+def bench_insert(conn, table, rows, batch_rows):
+    cursor = conn.cursor()
+    reset_table(cursor, table)
+    started = time.perf_counter()
+    inserted = 0
+    for i in range(0, len(rows), batch_rows):
+        inserted += insert_batch(conn, cursor, table, rows[i:i + batch_rows])
+    elapsed = time.perf_counter() - started
+    cursor.close()
+    return inserted, elapsed
+
+
+def bench_infile(conn, table, rows, chunk_rows, directory):
+    cursor = conn.cursor()
+    reset_table(cursor, table)
+    create_staging_table(cursor, table)
+    chunk = ChunkWriter(directory, f"bench-{table}")
+    started = time.perf_counter()
+    inserted = 0
+    for i, (row_id, content, _) in enumerate(rows, 1):
+        chunk.write(row_id, content)
+        if chunk.rows >= chunk_rows or i == len(rows):
+            path = chunk.close()
+            inserted += load_chunk(conn, cursor, table, path)
+            os.remove(path)
+    elapsed = time.perf_counter() - started
+    cursor.close()
+    return inserted, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark --load_mode insert vs infile against a local MySQL.")
+    parser.add_argument("--db_host", default="127.0.0.1")
+    parser.add_argument("--db_user", default="root")
+    parser.add_argument("--db_pass", default="")
+    parser.add_argument("--db_name", default="test_json")
+    parser.add_argument("--db_table", default="bench_load_modes", help="Scratch table (dropped and recreated)")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--insert_batch_rows", default="500,2000", help="Comma-separated batch sizes for insert mode")
+    parser.add_argument("--infile_chunk_rows", default="10000,100000", help="Comma-separated chunk sizes for infile mode")
+    parser.add_argument("--infile_dir", default=tempfile.gettempdir())
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    size_mib = sum(len(content) for _, content, _ in rows) / (1024 * 1024)
+    print(f"{len(rows)} rows, {size_mib:.0f} MiB of JSON")
+    conn = mysql.connector.connect(host=args.db_host, user=args.db_user, password=args.db_pass,
+                                   database=args.db_name, allow_local_infile=True)
+    print(f"{'mode':<8} {'rows/stmt':>10} {'inserted':>10} {'seconds':>9} {'rows/sec':>10}")
+    for batch_rows in (int(v) for v in args.insert_batch_rows.split(",")):
+        inserted, elapsed = bench_insert(conn, args.db_table, rows, batch_rows)
+        print(f"{'insert':<8} {batch_rows:>10} {inserted:>10} {elapsed:>9.2f} {inserted / elapsed:>10.0f}")
+    for chunk_rows in (int(v) for v in args.infile_chunk_rows.split(",")):
+        inserted, elapsed = bench_infile(conn, args.db_table, rows, chunk_rows, args.infile_dir)
+        print(f"{'infile':<8} {chunk_rows:>10} {inserted:>10} {elapsed:>9.2f} {inserted / elapsed:>10.0f}")
+    conn.cursor().execute(f"DROP TABLE IF EXISTS {args.db_table}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
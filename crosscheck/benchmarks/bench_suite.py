@@ -0,0 +1,164 @@
+"""End-to-end migrate.py benchmark against the local ES stand-in (fake_es.py).
+
+    python benchmarks/bench_suite.py --docs 200000 --threads 1,2,4 --batch_sizes 1000,2000
+    python benchmarks/bench_suite.py --latency_ms 20 --sink_statement_ms 5 --results_json after.json --compare before.json
+    python benchmarks/bench_suite.py --sink mysql -- \
+        --db_host 127.0.0.1 --db_user root --db_pass root --db_name test_json --db_table bench_toprocess
+
+Starts fake_es.py once, then runs migrate.py for every --threads x --batch_sizes cell and
+reports docs/sec, peak RSS and per-stage timings from migrate.py's --summary_json.
+--sink stub (the default) puts sink_stub/ on PYTHONPATH so rows are discarded by a fake
+mysql.connector/aiomysql with --sink_statement_ms/--sink_row_us of simulated cost; --sink
+mysql inserts into a real table (truncated before every run). Arguments after -- are
+passed to migrate.py, e.g. --engine async or --load_mode infile.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+MIGRATE = os.path.join(os.path.dirname(BENCHMARKS), "migrate.py")
+STUB_DB_ARGS = ["--db_host", "stub", "--db_user", "stub", "--db_pass", "stub", "--db_name", "stub",
+                "--db_table", "bench_toprocess"]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_fake_es(args, port):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(BENCHMARKS, "fake_es.py"), "--port", str(port), "--docs", str(args.docs),
+         "--latency_ms", str(args.latency_ms), "--doc_bytes", str(args.doc_bytes),
+         "--max_page_size", str(args.max_page_size)] + (["--no_compression"] if args.no_es_compression else []),
+        stdout=subprocess.PIPE, text=True)
+    # Generating the document pool takes a moment; the server prints once it is listening
+    if not proc.stdout.readline().startswith("Serving"):
+        proc.kill()
+        raise SystemExit("fake_es.py did not start")
+    return proc
+
+
+def run_cell(es_url, threads, batch_size, migrate_args, env, work_dir):
+    """Run migrate.py once; returns a result row (summary numbers, peak RSS, exit code)."""
+    summary_path = os.path.join(work_dir, "summary.json")
+    if os.path.exists(summary_path):
+        os.unlink(summary_path)
+    command = [sys.executable, MIGRATE, "--es_url", es_url, "--api_key", "bench", "--match_all",
+               "--threads", str(threads), "--batch_size", str(batch_size), "--summary_json", summary_path] + migrate_args
+    started = time.perf_counter()
+    with open(os.path.join(work_dir, f"migrate_t{threads}_b{batch_size}.out"), "w") as log:
+        proc = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, cwd=work_dir, env=env)
+        _, status, usage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - started
+    summary = {}
+    if os.path.exists(summary_path):
+        with open(summary_path) as f:
+            summary = json.load(f)
+    stages = summary.get("stages", {})
+    inserted = summary.get("counters", {}).get("rows_inserted_total", 0)
+    return {
+        "threads": threads,
+        "batch_size": batch_size,
+        "docs": summary.get("fetched", 0),
+        "inserted": inserted,
+        "seconds": round(elapsed, 3),
+        "docs_per_second": round(inserted / elapsed, 1) if elapsed else 0.0,
+        # ru_maxrss is KiB on Linux
+        "peak_rss_mib": round(usage.ru_maxrss / 1024, 1),
+        "exit_code": os.waitstatus_to_exitcode(status),
+        "stages": {name: {key: stage[key] for key in ("count", "total", "mean", "p95")} for name, stage in stages.items()},
+    }
+
+
+def stage_mean_ms(row, name):
+    return row["stages"].get(name, {}).get("mean", 0.0) * 1000
+
+
+def stage_total(row, name):
+    return row["stages"].get(name, {}).get("total", 0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark migrate.py end to end against a local ES stand-in.")
+    parser.add_argument("--docs", type=int, default=100000, help="Documents served by fake_es.py")
+    parser.add_argument("--doc_bytes", type=int, default=0, help="Pad hits to about this many bytes (0 = natural size)")
+    parser.add_argument("--latency_ms", type=float, default=0.0, help="ES latency added to every search/scroll request")
+    parser.add_argument("--max_page_size", type=int, default=10000, help="Cap on the scroll size fake_es.py returns")
+    parser.add_argument("--no_es_compression", action="store_true", help="fake_es.py sends uncompressed responses")
+    parser.add_argument("--threads", default="1,2,4", help="Comma-separated --threads values")
+    parser.add_argument("--batch_sizes", default="1000,2000", help="Comma-separated --batch_size values")
+    parser.add_argument("--runs", type=int, default=1, help="Runs per cell; the fastest is reported")
+    parser.add_argument("--sink", choices=["stub", "mysql"], default="stub")
+    parser.add_argument("--sink_statement_ms", type=float, default=0.0, help="Stub sink: cost per statement and commit")
+    parser.add_argument("--sink_row_us", type=float, default=0.0, help="Stub sink: cost per inserted row")
+    parser.add_argument("--work_dir", help="Where migrate.py runs and logs (default: a temporary directory)")
+    parser.add_argument("--results_json", help="Write all result rows to this file")
+    parser.add_argument("--compare", help="results_json of an earlier run; print the docs/sec change per cell")
+    args, migrate_args = parser.parse_known_args()
+    if migrate_args and migrate_args[0] == "--":
+        migrate_args = migrate_args[1:]
+
+    env = dict(os.environ)
+    if args.sink == "stub":
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.join(BENCHMARKS, "sink_stub"), env.get("PYTHONPATH")]))
+        env["BENCH_SINK_STATEMENT_MS"] = str(args.sink_statement_ms)
+        env["BENCH_SINK_ROW_US"] = str(args.sink_row_us)
+        migrate_args = STUB_DB_ARGS + migrate_args
+    else:
+        from bench_engines import truncate
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="bench_suite-")
+    os.makedirs(work_dir, exist_ok=True)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {(row["threads"], row["batch_size"]): row for row in json.load(f)["results"]}
+
+    port = free_port()
+    es = start_fake_es(args, port)
+    es_url = f"http://127.0.0.1:{port}/bench/_search"
+    results = []
+    print(f"{args.docs} docs, ES latency {args.latency_ms} ms, sink {args.sink}; logs in {work_dir}")
+    print(f"{'threads':>7} {'batch':>6} {'docs':>9} {'seconds':>8} {'docs/sec':>9} {'RSS MiB':>8} "
+          f"{'es ms':>7} {'insert ms':>9} {'put wait s':>10} {'get wait s':>10} {'exit':>4}"
+          + (f" {'vs base':>8}" if baseline else ""))
+    try:
+        for threads in [int(value) for value in args.threads.split(",")]:
+            for batch_size in [int(value) for value in args.batch_sizes.split(",")]:
+                runs = []
+                for _ in range(args.runs):
+                    if args.sink == "mysql":
+                        truncate(migrate_args)
+                    runs.append(run_cell(es_url, threads, batch_size, migrate_args, env, work_dir))
+                row = max(runs, key=lambda run: run["docs_per_second"])
+                results.append(row)
+                line = (f"{threads:>7} {batch_size:>6} {row['docs']:>9} {row['seconds']:>8.2f} "
+                        f"{row['docs_per_second']:>9.0f} {row['peak_rss_mib']:>8.1f} "
+                        f"{stage_mean_ms(row, 'es_request_seconds'):>7.1f} {stage_mean_ms(row, 'insert_seconds'):>9.1f} "
+                        f"{stage_total(row, 'queue_put_wait_seconds'):>10.1f} {stage_total(row, 'queue_get_wait_seconds'):>10.1f} "
+                        f"{row['exit_code']:>4}")
+                before = baseline.get((threads, batch_size))
+                if before and before["docs_per_second"]:
+                    line += f" {row['docs_per_second'] / before['docs_per_second'] - 1:>+8.1%}"
+                print(line, flush=True)
+    finally:
+        es.kill()
+
+    if args.results_json:
+        with open(args.results_json, "w") as f:
+            json.dump({"docs": args.docs, "doc_bytes": args.doc_bytes, "latency_ms": args.latency_ms, "sink": args.sink,
+                       "migrate_args": migrate_args, "results": results}, f, indent=2)
+    if any(row["exit_code"] for row in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
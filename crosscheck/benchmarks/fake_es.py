@@ -0,0 +1,182 @@
+"""Local stand-in for the Elasticsearch scroll endpoints migrate.py uses.
+
+    python benchmarks/fake_es.py --docs 1000000 --port 9299 --latency_ms 20
+    python migrate.py --es_url http://127.0.0.1:9299/bench/_search --api_key x --match_all ...
+
+Implements POST <index>/_search?scroll=&size= (with sliced scroll), POST _search/scroll
+and DELETE _search/scroll. Documents are gen_data.py records: a pool of --unique_docs is
+generated once and cycled through with distinct _ids, so a 10M-doc index costs no more
+memory than the pool and serving a page is a bytes join, not JSON encoding.
+
+Queries are not evaluated (every document matches), and `_source` filtering and
+filter_path are ignored: full hits are always returned. When the search sorts, hits carry
+a sort value of [timestamp millis] that increases with the document number.
+
+Like ES with http.compression (the default; --no_compression turns it off), responses are gzipped at level 3 when the
+client accepts gzip, and gzipped request bodies are accepted. GET / reports the number
+of connections opened, which shows whether the client reuses them.
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import gen_data  # noqa: E402
+
+FIRST_TIMESTAMP_MS = 1735689600000  # 2025-01-01T00:00:00Z
+
+
+class FakeIndex:
+    def __init__(self, docs, unique_docs=10000, doc_bytes=0, seed=1):
+        self.docs = docs
+        self.pool = []
+        rng = random.Random(seed)
+        for record in gen_data.generate_batch(min(docs, unique_docs) or 1, rng, datetime(2025, 1, 31)):
+            if doc_bytes:
+                # Pad to roughly doc_bytes of JSON per hit
+                size = len(json.dumps(record))
+                record["_source"]["message"] = "x" * max(0, doc_bytes - size - 16)
+            encoded = json.dumps(record, separators=(",", ":"))
+            # Keep everything after the _id so each hit only needs its own _id spliced in
+            self.pool.append(encoded[len('{"_id":"') + len(record["_id"]) + 1:-1].encode("utf-8"))
+        self.scrolls = {}
+        self.lock = threading.Lock()
+        self.stats = {"connections": 0, "searches": 0, "scroll_pages": 0, "hits": 0, "bytes": 0, "cleared": 0}
+
+    def hit(self, n, sort):
+        head = b'{"_id":"bench%010d"' % n
+        tail = b',"sort":[%d]}' % (FIRST_TIMESTAMP_MS + n) if sort else b"}"
+        return head + self.pool[n % len(self.pool)] + tail
+
+    def page(self, scroll_id):
+        """Next page of a scroll as response bytes, or None for an unknown scroll_id."""
+        with self.lock:
+            state = self.scrolls.get(scroll_id)
+            if state is None:
+                return None
+            position = state["position"]
+            numbers = range(position, self.docs, state["step"])[:state["size"]]
+            state["position"] = position + len(numbers) * state["step"]
+        hits = b",".join(self.hit(n, state["sort"]) for n in numbers)
+        body = b'{"_scroll_id":"%s","took":1,"timed_out":false,"hits":{"total":{"value":%d,"relation":"eq"},' \
+               b'"max_score":null,"hits":[%s]}}' % (scroll_id.encode("ascii"), state["total"], hits)
+        with self.lock:
+            self.stats["hits"] += len(numbers)
+            self.stats["bytes"] += len(body)
+        return body
+
+    def open_scroll(self, size, body):
+        sliced = body.get("slice") or {}
+        step = int(sliced.get("max", 1))
+        first = int(sliced.get("id", 0))
+        scroll_id = uuid.uuid4().hex
+        with self.lock:
+            self.scrolls[scroll_id] = {"position": first, "step": step, "size": size, "sort": "sort" in body,
+                                       "total": len(range(first, self.docs, step))}
+            self.stats["searches"] += 1
+        return scroll_id
+
+    def clear(self, scroll_ids):
+        with self.lock:
+            freed = sum(1 for scroll_id in scroll_ids if self.scrolls.pop(scroll_id, None) is not None)
+            self.stats["cleared"] += freed
+        return freed
+
+
+def make_handler(index, latency, max_page_size, compression=True):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def setup(self):
+            super().setup()
+            with index.lock:
+                index.stats["connections"] += 1
+
+        def send_body(self, status, body):
+            if isinstance(body, dict):
+                body = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            if compression and "gzip" in (self.headers.get("Accept-Encoding") or ""):
+                body = gzip.compress(body, 3)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            data = self.rfile.read(length)
+            if self.headers.get("Content-Encoding") == "gzip":
+                data = gzip.decompress(data)
+            return json.loads(data or b"{}")
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            body = self.read_json()
+            if latency:
+                time.sleep(latency)
+            if url.path.endswith("/_search/scroll"):
+                with index.lock:
+                    index.stats["scroll_pages"] += 1
+                page = index.page(body.get("scroll_id", ""))
+                if page is None:
+                    return self.send_body(404, {"error": {"type": "search_context_missing_exception"}, "status": 404})
+                return self.send_body(200, page)
+            if url.path.endswith("/_search"):
+                size = min(int(parse_qs(url.query).get("size", ["10"])[0]), max_page_size)
+                return self.send_body(200, index.page(index.open_scroll(size, body)))
+            self.send_body(404, {"error": f"no handler for {url.path}", "status": 404})
+
+        def do_DELETE(self):
+            scroll_ids = self.read_json().get("scroll_id") or []
+            freed = index.clear(scroll_ids if isinstance(scroll_ids, list) else [scroll_ids])
+            self.send_body(200 if freed else 404, {"succeeded": True, "num_freed": freed})
+
+        def do_GET(self):
+            self.send_body(200, dict(index.stats, docs=index.docs, open_scrolls=len(index.scrolls)))
+
+    return Handler
+
+
+def serve(index, port=9299, latency_ms=0.0, max_page_size=10000, compression=True):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(index, latency_ms / 1000, max_page_size, compression))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic index over the ES scroll API.")
+    parser.add_argument("--docs", type=int, default=100000, help="Documents in the index")
+    parser.add_argument("--port", type=int, default=9299)
+    parser.add_argument("--latency_ms", type=float, default=0.0, help="Added to every search/scroll request")
+    parser.add_argument("--max_page_size", type=int, default=10000, help="Cap on the requested scroll size")
+    parser.add_argument("--doc_bytes", type=int, default=0, help="Pad hits to about this many bytes (0 = natural size, ~1.8 KB)")
+    parser.add_argument("--unique_docs", type=int, default=10000, help="Distinct documents cycled through")
+    parser.add_argument("--no_compression", action="store_true", help="Never gzip responses (ES with http.compression: false)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    index = FakeIndex(args.docs, args.unique_docs, args.doc_bytes, args.seed)
+    server = serve(index, args.port, args.latency_ms, args.max_page_size, not args.no_compression)
+    print(f"Serving {args.docs} docs on http://127.0.0.1:{args.port}/bench/_search", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
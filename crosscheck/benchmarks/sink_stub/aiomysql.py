@@ -0,0 +1,66 @@
+"""Discarding stand-in for aiomysql (bench_suite.py --sink stub with --engine async).
+
+Same accounting as the mysql.connector stub; statement costs are awaited instead of slept.
+"""
+import asyncio
+
+from mysql.connector import INSERT_VALUES, ROW_SECONDS, STATEMENT_SECONDS
+
+
+async def cost(rows):
+    seconds = STATEMENT_SECONDS + rows * ROW_SECONDS
+    if seconds:
+        await asyncio.sleep(seconds)
+
+
+class Cursor:
+    def __init__(self):
+        self.rowcount = -1
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def execute(self, sql, params=()):
+        rows = len(params) // 2 if INSERT_VALUES.match(sql) else 0
+        await cost(rows)
+        self.rowcount = rows
+
+
+class Connection:
+    def cursor(self):
+        return Cursor()
+
+    async def commit(self):
+        await cost(0)
+
+    async def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _Acquire:
+    async def __aenter__(self):
+        return Connection()
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+class Pool:
+    def acquire(self):
+        return _Acquire()
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+async def create_pool(**kwargs):
+    return Pool()
@@ -0,0 +1,102 @@
+"""Discarding stand-in for mysql.connector, used by bench_suite.py --sink stub.
+
+Put benchmarks/sink_stub first on PYTHONPATH and migrate.py "inserts" into nothing:
+every row is reported as inserted and dropped. Statements cost
+BENCH_SINK_STATEMENT_MS milliseconds plus BENCH_SINK_ROW_US microseconds per row
+(both default 0), so the ES side and the pipeline can be measured without MySQL.
+"""
+import os
+import re
+import time
+
+STATEMENT_SECONDS = float(os.environ.get("BENCH_SINK_STATEMENT_MS", "0")) / 1000
+ROW_SECONDS = float(os.environ.get("BENCH_SINK_ROW_US", "0")) / 1e6
+
+INSERT_VALUES = re.compile(r"\s*INSERT IGNORE INTO \S+ \(id, content\) VALUES", re.I)
+LOAD_DATA = re.compile(r"\s*LOAD DATA LOCAL INFILE", re.I)
+INSERT_SELECT = re.compile(r"\s*INSERT IGNORE INTO \S+ \(id, content\) SELECT", re.I)
+
+
+class Error(Exception):
+    def __init__(self, msg="", errno=None):
+        super().__init__(msg)
+        self.msg = msg
+        self.errno = errno
+
+
+class InterfaceError(Error):
+    pass
+
+
+class DatabaseError(Error):
+    pass
+
+
+class OperationalError(DatabaseError):
+    pass
+
+
+def cost(rows):
+    seconds = STATEMENT_SECONDS + rows * ROW_SECONDS
+    if seconds:
+        time.sleep(seconds)
+
+
+class Cursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = -1
+
+    def execute(self, sql, params=()):
+        rows = 0
+        if INSERT_VALUES.match(sql):
+            rows = len(params) // 2
+        elif LOAD_DATA.match(sql):
+            with open(params[0], "rb") as f:
+                rows = sum(1 for _ in f)
+            self.connection.staged = rows
+        elif INSERT_SELECT.match(sql):
+            rows, self.connection.staged = self.connection.staged, 0
+        cost(rows)
+        self.rowcount = rows
+
+    def executemany(self, sql, seq):
+        seq = list(seq)
+        cost(len(seq))
+        self.rowcount = len(seq)
+
+    def fetchall(self):
+        return []
+
+    def fetchmany(self, size=1):
+        return []
+
+    def fetchone(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class Connection:
+    def __init__(self):
+        self.staged = 0
+
+    def cursor(self, *args, **kwargs):
+        return Cursor(self)
+
+    def commit(self):
+        cost(0)
+
+    def rollback(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+def connect(**kwargs):
+    return Connection()
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+
+def job_key(*parts):
+    """Stable identifier for a migration: same ES URL, table, window and slicing -> same key."""
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class CheckpointStore:
+    """Durable per-slice cursor store backed by a local SQLite file.
+
+    Each row holds the sort key and _id of the last hit of a slice whose rows (and all
+    rows before it) are committed in MySQL, plus whether the slice finished.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                job TEXT NOT NULL,
+                slice INTEGER NOT NULL,
+                sort_key TEXT,
+                last_id TEXT,
+                rows_committed INTEGER NOT NULL DEFAULT 0,
+                done INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (job, slice)
+            )
+        """)
+        self._conn.commit()
+
+    def load(self, job):
+        """Return {slice_id: {"sort_key", "last_id", "rows_committed", "done"}} for a job."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT slice, sort_key, last_id, rows_committed, done FROM checkpoints WHERE job = ?", (job,)
+            ).fetchall()
+        return {
+            slice_id: {
+                "sort_key": json.loads(sort_key) if sort_key else None,
+                "last_id": last_id,
+                "rows_committed": rows_committed,
+                "done": bool(done),
+            }
+            for slice_id, sort_key, last_id, rows_committed, done in rows
+        }
+
+    def save(self, job, slice_id, sort_key, last_id, rows_committed, done=False):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (job, slice, sort_key, last_id, rows_committed, done, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job, slice_id, json.dumps(sort_key) if sort_key is not None else None, last_id,
+                 rows_committed, int(done), datetime.now(timezone.utc).isoformat()),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CheckpointTracker:
+    """Advances each slice's checkpoint only past pages whose rows are all committed.
+
+    Scroll threads register every page before queueing its hits and tag the hits with
+    the returned mark; insert workers ack marks after their batch commits. Workers
+    commit out of order, so a slice's checkpoint moves to a page's last sort key only
+    once that page and every earlier page of the slice are fully acked.
+    """
+
+    def __init__(self, store, job, resumed=None):
+        self.store = store
+        self.job = job
+        self._lock = threading.Lock()
+        self._pages = {}
+        self._next_seq = {}
+        resumed = resumed or {}
+        self._finished = {slice_id for slice_id, state in resumed.items() if state["done"]}
+        self._committed = {slice_id: state["rows_committed"] for slice_id, state in resumed.items()}
+        self._last = {slice_id: (state["sort_key"], state["last_id"]) for slice_id, state in resumed.items()}
+
+    def start_page(self, slice_id, sort_key, last_id, rows):
+        with self._lock:
+            seq = self._next_seq.get(slice_id, 0)
+            self._next_seq[slice_id] = seq + 1
+            # [rows still to commit, rows in page, sort key and _id of the page's last hit]
+            self._pages.setdefault(slice_id, OrderedDict())[seq] = [rows, rows, sort_key, last_id]
+            if rows == 0:
+                self._advance(slice_id)
+        return slice_id, seq
+
+    def ack(self, mark, count=1):
+        slice_id, seq = mark
+        with self._lock:
+            self._pages[slice_id][seq][0] -= count
+            self._advance(slice_id)
+
+    def finish_slice(self, slice_id):
+        """Record that a slice's scroll ran to completion; it is marked done once drained."""
+        with self._lock:
+            self._finished.add(slice_id)
+            self._advance(slice_id)
+
+    def low_watermark(self, slices):
+        """Return (sort_key, last_id) at or below which every hit of every slice is committed.
+
+        An unfinished slice bounds the watermark at its own checkpoint; a finished slice
+        bounds nothing. None if some unfinished slice has committed nothing yet.
+        """
+        with self._lock:
+            lasts = [self._last.get(slice_id, (None, None)) for slice_id in range(slices)]
+            open_lasts = [lasts[slice_id] for slice_id in range(slices)
+                          if not (slice_id in self._finished and not self._pages.get(slice_id))]
+        candidates = open_lasts if open_lasts else lasts
+        if open_lasts and any(sort_key is None for sort_key, _ in open_lasts):
+            return None
+        candidates = [last for last in candidates if last[0] is not None]
+        if not candidates:
+            return None
+        pick = min if open_lasts else max
+        return pick(candidates, key=lambda last: last[0])
+
+    def _advance(self, slice_id):
+        pages = self._pages.setdefault(slice_id, OrderedDict())
+        advanced = False
+        while pages and next(iter(pages.values()))[0] <= 0:
+            _, (_, rows, sort_key, last_id) = pages.popitem(last=False)
+            self._committed[slice_id] = self._committed.get(slice_id, 0) + rows
+            self._last[slice_id] = (sort_key, last_id)
+            advanced = True
+        done = slice_id in self._finished and not pages
+        if not (advanced or done):
+            return
+        sort_key, last_id = self._last.get(slice_id, (None, None))
+        try:
+            self.store.save(self.job, slice_id, sort_key, last_id, self._committed.get(slice_id, 0), done)
+        except sqlite3.Error as e:
+            logging.error(f"Failed to save checkpoint for slice {slice_id + 1}: {e}")
@@ -0,0 +1,255 @@
+"""zstd-compressed content for the staging table (--content_codec zstd) and a reader for it.
+
+    python codec.py train --db_host ... --db_table platforms_cicd_data --name platforms.cicd --store
+    python codec.py cat --db_host ... --db_table platforms_cicd_data_toprocess_z > hits.ndjson
+
+With --content_codec zstd, migrate.py writes every hit as one zstd frame into a BLOB
+content column instead of JSON text. A dictionary trained on earlier hits of the same
+index (--zstd_dict) makes each small document compress like part of a large stream: the
+repeated keys, URLs and the event.original copy are already in the dictionary.
+
+Frames carry their dictionary ID, and trained dictionaries are stored by ID in
+content_dictionaries, so ContentReader/iter_rows() can decode any row, whatever
+dictionary (or none) it was written with. Values that are not zstd frames (a JSON
+column, or rows loaded before the switch) are returned as they are.
+
+Needs the optional zstandard package (pip install zstandard).
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+import mysql.connector
+
+from metrics import registry as metrics
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DICTIONARY_TABLE = "content_dictionaries"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+DEFAULT_LEVEL = 3
+# zstd's own default; larger dictionaries rarely help documents of a few KB
+DEFAULT_DICT_SIZE = 112640
+
+
+def require_zstandard():
+    if zstandard is None:
+        raise ImportError("zstd content needs the zstandard package (pip install zstandard)")
+
+
+class ContentCodec:
+    """Compresses hit JSON into zstd frames, optionally with a trained dictionary.
+
+    python-zstandard compressors must not be shared between threads, so every insert
+    worker gets its own.
+    """
+
+    def __init__(self, level=DEFAULT_LEVEL, dictionary=None):
+        require_zstandard()
+        self.level = level
+        self.dictionary = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        self.dict_id = self.dictionary.dict_id() if self.dictionary else 0
+        self._local = threading.local()
+
+    def _compressor(self):
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            compressor = self._local.compressor = zstandard.ZstdCompressor(level=self.level, dict_data=self.dictionary)
+        return compressor
+
+    def encode(self, content):
+        return self.compress(content.encode("utf-8"))
+
+    def compress(self, data):
+        """encode() for content that is already UTF-8 bytes."""
+        return self._compressor().compress(data)
+
+    def encode_batch(self, batch):
+        """(id, content, mark) items with content compressed; records raw/stored bytes and encode time."""
+        compressor = self._compressor()
+        started = time.perf_counter()
+        encoded = [(item[0], compressor.compress(item[1].encode("utf-8")), item[2]) for item in batch]
+        metrics.observe("encode_seconds", time.perf_counter() - started)
+        metrics.inc("content_bytes_total", sum(len(item[1]) for item in batch))
+        metrics.inc("stored_bytes_total", sum(len(item[1]) for item in encoded))
+        return encoded
+
+    def describe(self):
+        dictionary = f"dictionary {self.dict_id} ({len(self.dictionary.as_bytes())} bytes)" if self.dictionary else "no dictionary"
+        return f"zstd level {self.level}, {dictionary}"
+
+
+class ContentReader:
+    """Decodes content values of any row: zstd frames (with their dictionary) or plain JSON."""
+
+    def __init__(self, dictionaries=None):
+        require_zstandard()
+        self.dictionaries = {dict_id: zstandard.ZstdCompressionDict(data) for dict_id, data in (dictionaries or {}).items()}
+        self._local = threading.local()
+
+    def _decompressor(self, dict_id):
+        decompressors = getattr(self._local, "decompressors", None)
+        if decompressors is None:
+            decompressors = self._local.decompressors = {}
+        decompressor = decompressors.get(dict_id)
+        if decompressor is None:
+            if dict_id and dict_id not in self.dictionaries:
+                raise ValueError(f"content was compressed with dictionary {dict_id}, which is not loaded")
+            decompressor = decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=self.dictionaries.get(dict_id))
+        return decompressor
+
+    def decode(self, value):
+        """The hit JSON text of a content value."""
+        if isinstance(value, str):
+            return value
+        value = bytes(value)
+        if not value.startswith(ZSTD_MAGIC):
+            return value.decode("utf-8")
+        dict_id = zstandard.get_frame_parameters(value).dict_id
+        return self._decompressor(dict_id).decompress(value).decode("utf-8")
+
+
+def save_dictionary(conn, name, data):
+    """Store a trained dictionary under its zstd dictionary ID; returns the ID."""
+    require_zstandard()
+    dict_id = zstandard.ZstdCompressionDict(data).dict_id()
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {DICTIONARY_TABLE} ("
+                   "dict_id INT UNSIGNED NOT NULL PRIMARY KEY, "
+                   "name VARCHAR(255) NOT NULL, "
+                   "created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+                   "data MEDIUMBLOB NOT NULL, "
+                   "KEY (name, created_at))")
+    cursor.execute(f"INSERT IGNORE INTO {DICTIONARY_TABLE} (dict_id, name, data) VALUES (%s, %s, %s)", (dict_id, name, data))
+    conn.commit()
+    cursor.close()
+    return dict_id
+
+
+def load_dictionary(source, conn=None):
+    """Dictionary bytes from a file or, by name, the newest stored dictionary of that name."""
+    if os.path.exists(source):
+        with open(source, "rb") as f:
+            return f.read()
+    if conn is None:
+        raise ValueError(f"{source} is not a file")
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT data FROM {DICTIONARY_TABLE} WHERE name = %s ORDER BY created_at DESC, dict_id DESC LIMIT 1",
+                   (source,))
+    row = cursor.fetchone()
+    cursor.close()
+    if row is None:
+        raise ValueError(f"no file or stored dictionary named {source}")
+    return bytes(row[0])
+
+
+def load_dictionaries(conn):
+    """{dict_id: bytes} of every stored dictionary ({} if none were ever stored)."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                   (DICTIONARY_TABLE,))
+    if not cursor.fetchone()[0]:
+        cursor.close()
+        return {}
+    cursor.execute(f"SELECT dict_id, data FROM {DICTIONARY_TABLE}")
+    dictionaries = {int(dict_id): bytes(data) for dict_id, data in cursor.fetchall()}
+    cursor.close()
+    return dictionaries
+
+
+def train_dictionary(samples, dict_size=DEFAULT_DICT_SIZE):
+    """Train a dictionary on hit JSON texts; a few thousand samples are plenty."""
+    require_zstandard()
+    return zstandard.train_dictionary(dict_size, [sample.encode("utf-8") for sample in samples]).as_bytes()
+
+
+def iter_rows(conn, table, reader=None, where=None, params=(), fetch_rows=1000):
+    """Stream (id, content JSON text) from table, decoding compressed rows.
+
+    Rows are fetched fetch_rows at a time over an unbuffered cursor, so memory stays
+    flat however large the table is. where is an SQL condition on id/content.
+    """
+    reader = reader or ContentReader(load_dictionaries(conn))
+    cursor = conn.cursor(buffered=False)
+    cursor.execute(f"SELECT id, content FROM {table}" + (f" WHERE {where}" if where else ""), params)
+    try:
+        while True:
+            rows = cursor.fetchmany(fetch_rows)
+            if not rows:
+                break
+            for row_id, content in rows:
+                yield row_id, reader.decode(content)
+    finally:
+        cursor.close()
+
+
+def sample_rows(conn, table, count):
+    """Up to count decoded contents; ordering by the random ES _ids spreads them over the table."""
+    reader = ContentReader(load_dictionaries(conn))
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT content FROM {table} ORDER BY id LIMIT %s", (count,))
+    samples = [reader.decode(row[0]) for row in cursor.fetchall()]
+    cursor.close()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train zstd dictionaries for --content_codec zstd and read compressed tables")
+    parser.add_argument("--db_host", required=True)
+    parser.add_argument("--db_user", required=True)
+    parser.add_argument("--db_pass", required=True)
+    parser.add_argument("--db_name", required=True)
+    parser.add_argument("--db_table", required=True, help="train: table to sample hits from; cat: table to read")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train = commands.add_parser("train", help="Train a dictionary on sampled hits")
+    train.add_argument("--name", required=True, help="Dictionary name, e.g. the ES index pattern it was trained on")
+    train.add_argument("--samples", type=int, default=5000, help="Hits to train on")
+    train.add_argument("--dict_size", type=int, default=DEFAULT_DICT_SIZE, help="Dictionary size in bytes")
+    train.add_argument("--output", help="Also write the dictionary to this file")
+    train.add_argument("--store", action="store_true", help=f"Store it in {DICTIONARY_TABLE} for --zstd_dict NAME and readers")
+    cat = commands.add_parser("cat", help="Write the decoded hits of the table as NDJSON to stdout")
+    cat.add_argument("--where", help="SQL condition, e.g. \"id > 'a'\"")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s",
+                        handlers=[logging.StreamHandler(sys.stderr)])
+    try:
+        require_zstandard()
+    except ImportError as e:
+        logging.error(f"Error: {e}")
+        sys.exit(1)
+    conn = mysql.connector.connect(host=args.db_host, user=args.db_user, password=args.db_pass, database=args.db_name)
+    try:
+        if args.command == "train":
+            samples = sample_rows(conn, args.db_table, args.samples)
+            if not samples:
+                logging.error(f"Error: {args.db_table} has no rows to train on")
+                sys.exit(1)
+            data = train_dictionary(samples, args.dict_size)
+            dict_id = zstandard.ZstdCompressionDict(data).dict_id()
+            logging.info(f"Trained dictionary {dict_id} ({len(data)} bytes) on {len(samples)} hits of {args.db_table}")
+            if args.output:
+                with open(args.output, "wb") as f:
+                    f.write(data)
+                logging.info(f"Written to {args.output}")
+            if args.store:
+                save_dictionary(conn, args.name, data)
+                logging.info(f"Stored in {DICTIONARY_TABLE} as {args.name}")
+        else:
+            count = 0
+            for _, content in iter_rows(conn, args.db_table, where=args.where):
+                sys.stdout.write(content + "\n")
+                count += 1
+            logging.info(f"{count} rows decoded from {args.db_table}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,13 @@ LOGFILE="/Users/kmcallo@optum.com/git/es-to-mysql-cli/daily_run.log"
 
   source /Users/kmcallo@optum.com/git/es-to-mysql-cli/.venv/bin/activate
   cd /Users/kmcallo@optum.com/git/es-to-mysql-cli
+  # One insert worker; AUTOTUNE=1 lets --autotune run up to MAX_INSERT_THREADS (default 4)
+  INSERT_ARGS=(--threads 1)
+  if [ "${AUTOTUNE:-0}" = "1" ]; then
+    INSERT_ARGS=(--autotune --threads "${MAX_INSERT_THREADS:-4}")
+  fi
+  # migrate.py exits non-zero on a partial migration; record the code instead of aborting the log block
+  EXIT_CODE=0
   python migrate.py \
     --es_url "$ES_URL" \
     --api_key "$API_KEY" \
@@ -23,11 +30,15 @@ LOGFILE="/Users/kmcallo@optum.com/git/es-to-mysql-cli/daily_run.log"
     --db_pass "$DB_PASS" \
     --db_name "$DB_NAME" \
     --db_table "$DB_TABLE" \
+    --since_watermark "${WATERMARK_FILE:-/Users/kmcallo@optum.com/git/es-to-mysql-cli/daily_run.watermark.json}" \
+    --watermark_lateness_hours "${WATERMARK_LATENESS_HOURS:-6}" \
     --gte "$(python3 -c 'from datetime import datetime, timedelta; print((datetime.utcnow() - timedelta(hours=109)).strftime("%Y-%m-%dT%H:00:00"))')" \
     --lte "$(python3 -c 'from datetime import datetime, timedelta; print((datetime.utcnow() - timedelta(hours=13)).strftime("%Y-%m-%dT%H:59:59"))')" \
-    --threads 1 \
-    --batch_size 2000
-  EXIT_CODE=$?
+    --summary_json "${SUMMARY_FILE:-/Users/kmcallo@optum.com/git/es-to-mysql-cli/daily_run.summary.json}" \
+    "${INSERT_ARGS[@]}" \
+    --batch_size "${ES_BATCH_SIZE:-2000}" || EXIT_CODE=$?
   echo "Exit code: $EXIT_CODE"
   echo "----- $(date '+%Y-%m-%d %H:%M:%S') END -----"
 } >> "$LOGFILE" 2>&1
+
+exit $EXIT_CODE
@@ -0,0 +1,137 @@
+"""Process pool for the page decode/encode stage of migrate.py (--encode_processes N).
+
+Splitting a scroll page into hits, --drop_redundant_original (a json.loads() per hit)
+and --content_codec zstd are CPU work that otherwise runs under the GIL of the one
+migrate.py process. With --encode_processes each scroll thread hands its raw page to a
+pool process and waits (without holding the GIL) for ready-to-queue rows.
+
+Pages are not pickled either way. The scroll thread copies the response into a shared
+memory segment it owns and sends only the segment name and length. The pool process
+parses the page, applies the projection and codec, and writes each row's final content
+back into the same segment, one after another (a row is never longer than its hit, so
+the output fits, except when re-serializing a hit makes it longer; then that page's
+contents are returned pickled). It returns the row IDs, sort values and content offsets.
+The scroll thread slices the contents out of the segment, and the segment is reused for
+its next page.
+"""
+import multiprocessing
+import threading
+import time
+from array import array
+from multiprocessing import shared_memory
+
+from codec import ContentCodec
+from hitstream import scroll_page_spans
+from metrics import registry as metrics
+
+_state = {}
+
+
+def _init_process(projection, codec_settings):
+    _state["projection"] = projection
+    _state["codec"] = ContentCodec(*codec_settings) if codec_settings else None
+
+
+def _encode_page(name, length):
+    """Pool side: decode the page in segment name and write the rows' contents back into it.
+
+    Returns (scroll_id, row IDs, sort values, content end offsets or None, pickled contents
+    or None, encode seconds, counters recorded while transforming).
+    """
+    projection, codec = _state["projection"], _state["codec"]
+    segment = shared_memory.SharedMemory(name=name)
+    try:
+        body = bytes(segment.buf[:length])
+        scroll_id, spans = scroll_page_spans(body)
+        ids = [row_id for row_id, _, _, _ in spans]
+        sorts = [sort for _, _, _, sort in spans]
+        contents = [body[start:end] for _, start, end, _ in spans]
+        metrics.counters.clear()
+        if projection and projection.drop_redundant_original:
+            hits = projection.transform_hits([(row_id, content.decode("utf-8"), None) for row_id, content in zip(ids, contents)])
+            contents = [content.encode("utf-8") for _, content, _ in hits]
+        encode_seconds = 0.0
+        if codec:
+            started = time.perf_counter()
+            raw_bytes = sum(map(len, contents))
+            contents = [codec.compress(content) for content in contents]
+            encode_seconds = time.perf_counter() - started
+            metrics.inc("content_bytes_total", raw_bytes)
+            metrics.inc("stored_bytes_total", sum(map(len, contents)))
+        counters = dict(metrics.counters)
+        if sum(map(len, contents)) > segment.size:
+            return scroll_id, ids, sorts, None, contents, encode_seconds, counters
+        ends = array("q")
+        offset = 0
+        for content in contents:
+            segment.buf[offset:offset + len(content)] = content
+            offset += len(content)
+            ends.append(offset)
+        return scroll_id, ids, sorts, ends.tobytes(), None, encode_seconds, counters
+    finally:
+        segment.close()
+
+
+class EncodePool:
+    """Runs the decode/encode stage of every scroll page in a pool of processes."""
+
+    def __init__(self, processes, projection=None, codec=None):
+        self.codec = codec
+        codec_settings = (codec.level, codec.dictionary.as_bytes() if codec.dictionary else None) if codec else None
+        # spawn: the pool is started next to running threads, which fork would copy mid-state
+        self.pool = multiprocessing.get_context("spawn").Pool(processes, _init_process, (projection, codec_settings))
+        self.processes = processes
+        self._local = threading.local()
+        self._segments = []
+        self._lock = threading.Lock()
+
+    def _segment(self, size):
+        """This thread's segment, replaced by a larger one when size does not fit."""
+        segment = getattr(self._local, "segment", None)
+        if segment is None or segment.size < size:
+            if segment is not None:
+                self._release(segment)
+            segment = self._local.segment = shared_memory.SharedMemory(create=True, size=max(size * 5 // 4, 1 << 20))
+            with self._lock:
+                self._segments.append(segment)
+        return segment
+
+    def _release(self, segment):
+        with self._lock:
+            self._segments.remove(segment)
+        segment.close()
+        segment.unlink()
+
+    def decode_page(self, body):
+        """(scroll_id, [(row_id, content, sort), ...]) with projection and codec applied.
+
+        content is JSON text, or zstd bytes with a codec. Raises ValueError for a page
+        the hit parser cannot read, like parse_scroll_page().
+        """
+        segment = self._segment(len(body))
+        segment.buf[:len(body)] = body
+        scroll_id, ids, sorts, ends, contents, encode_seconds, counters = self.pool.apply(_encode_page, (segment.name, len(body)))
+        if contents is None:
+            offsets = array("q")
+            offsets.frombytes(ends)
+            view = segment.buf
+            # Text is decoded straight out of the segment; compressed rows are copied out
+            copy = bytes if self.codec else lambda data: str(data, "utf-8")
+            contents = [copy(view[start:end]) for start, end in zip([0, *offsets], offsets)]
+            del view
+        elif not self.codec:
+            contents = [content.decode("utf-8") for content in contents]
+        if self.codec:
+            metrics.observe("encode_seconds", encode_seconds)
+        for name, value in counters.items():
+            metrics.inc(name, value)
+        return scroll_id, list(zip(ids, contents, sorts))
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        with self._lock:
+            segments, self._segments = self._segments, []
+        for segment in segments:
+            segment.close()
+            segment.unlink()
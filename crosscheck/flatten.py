@@ -0,0 +1,417 @@
+"""Flatten-on-ingest for migrate.py (--load_mode flatten).
+
+Applies a saved mapping config (what the backend's /api/mappings/configs endpoint
+stores) to every hit and writes the normalized rows straight into the target tables,
+instead of staging raw JSON in <base>_toprocess for ExecutionService.flattenRecords to
+re-read. The hit itself goes into the archive table (the config's baseTableName), which
+is where flattenRecords moves rows it has processed, so the end state is the same.
+
+Semantics follow executionService.ts and relationshipService.ts: values are looked up
+by dotted source path (an array gives its first element, an object its JSON text),
+DATETIME/TIMESTAMP/DATE columns get the same conversion, whereConditions decide which
+hits are flattened (the rest are only archived), relationships are auto-detected from
+<parent>_id columns when the config has none, and tables are written in dependency
+order with each parent's ID copied into the child's foreign key column.
+
+One addition: a child table whose mapped paths run through an array (askId,
+pipelineLibraries.id, ...) gets one row per array element instead of a row for the
+first element only.
+"""
+import json
+import logging
+import os
+import re
+from collections import Counter
+from datetime import datetime
+
+from metrics import registry as metrics
+from retry import MYSQL_TRANSIENT, mysql_errno
+
+_DATETIME = re.compile(r"^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}")
+_MISSING = object()
+
+
+def quote_id(name):
+    return "`" + name.replace("`", "``") + "`"
+
+
+def is_datetime_type(column_type):
+    lower = column_type.lower()
+    return "datetime" in lower or "timestamp" in lower or lower == "date"
+
+
+def convert_datetime(value):
+    """ExecutionService.convertToDateTime: ISO strings and epoch seconds/millis to 'YYYY-MM-DD HH:MM:SS'."""
+    if isinstance(value, str):
+        return value.replace("T", " ", 1).replace("Z", "", 1)[:19] if _DATETIME.match(value) else value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        seconds = value / 1000 if value > 10000000000 else value
+        # Local time, like the backend's Date getters
+        return datetime.fromtimestamp(seconds).strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+
+def column_value(value):
+    """The value a mapped path yields: first element of an array, JSON text of an object."""
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    return value
+
+
+def lookup(value, parts):
+    """Follow parts into value; _MISSING if the path does not exist."""
+    for part in parts:
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return _MISSING
+    return value
+
+
+def extract(value, parts):
+    """ExecutionService.extractValue."""
+    value = lookup(value, parts)
+    return None if value is _MISSING else column_value(value)
+
+
+def first_array(value, parts):
+    """Length of the path prefix that ends at the first array on the path, or 0."""
+    for depth, part in enumerate(parts, 1):
+        value = value.get(part) if isinstance(value, dict) else None
+        if isinstance(value, list):
+            return depth
+    return 0
+
+
+def json_text(value):
+    """JSON_UNQUOTE(JSON_EXTRACT(...)) of a present value: strings raw, everything else as JSON."""
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+def auto_detect_relationships(tables):
+    """RelationshipService.autoDetectRelationships: <parent>_id columns that name another table."""
+    names = {table["name"] for table in tables}
+    relationships = []
+    for table in tables:
+        for column in table.get("columns", []):
+            if column["name"].endswith("_id") and not column.get("isPrimaryKey"):
+                parent = column["name"][:-len("_id")]
+                if parent in names:
+                    relationships.append({"parentTable": parent, "childTable": table["name"],
+                                          "foreignKeyColumn": column["name"], "parentKeyColumn": "id"})
+    return relationships
+
+
+def insert_order(table_names, relationships):
+    """RelationshipService.getInsertOrder (Kahn's algorithm, parents first)."""
+    children = {name: [] for name in table_names}
+    in_degree = dict.fromkeys(table_names, 0)
+    for rel in relationships:
+        if rel["parentTable"] in children and rel["childTable"] in children:
+            children[rel["parentTable"]].append(rel["childTable"])
+            in_degree[rel["childTable"]] += 1
+    ready = [name for name, degree in in_degree.items() if degree == 0]
+    order = []
+    while ready:
+        current = ready.pop(0)
+        order.append(current)
+        for child in children[current]:
+            in_degree[child] -= 1
+            if in_degree[child] == 0:
+                ready.append(child)
+    if len(order) != len(table_names):
+        raise ValueError("Circular dependency detected in table relationships")
+    return order
+
+
+class TablePlan:
+    """How one target table is filled from a hit."""
+
+    def __init__(self, table, mappings, relationships):
+        self.name = table["name"]
+        columns = {column["name"]: column for column in table.get("columns", [])}
+        self.columns = [(m["targetColumn"], m["sourcePath"].split("."),
+                         is_datetime_type(columns.get(m["targetColumn"], {}).get("type", "")))
+                        for m in mappings]
+        self.foreign_keys = [(rel["foreignKeyColumn"], rel["parentTable"]) for rel in relationships
+                             if rel["childTable"] == self.name]
+        mapped = {column for column, _, _ in self.columns}
+        parent_keys = [rel["parentKeyColumn"] for rel in relationships if rel["parentTable"] == self.name]
+        self.is_parent = bool(parent_keys)
+        # flattenRecords takes the AUTO_INCREMENT insertId first and the mapped key column otherwise;
+        # createTables() makes every primary key column AUTO_INCREMENT
+        self.auto_id = any(column.get("isPrimaryKey") and name not in mapped for name, column in columns.items())
+        self.key_column = parent_keys[0] if parent_keys else None
+
+    def rows(self, doc):
+        """Column values for the rows one hit produces, before foreign keys are added."""
+        depth = 0
+        if self.foreign_keys:
+            for _, parts, _ in self.columns:
+                depth = first_array(doc, parts)
+                if depth:
+                    prefix = parts[:depth]
+                    break
+        if not depth:
+            return [self._values(lambda parts: extract(doc, parts))]
+        rows = []
+        for element in lookup(doc, prefix):
+            # Paths under the array are read from the element, the others from the hit
+            rows.append(self._values(lambda parts: extract(element, parts[depth:]) if parts[:depth] == prefix
+                                     else extract(doc, parts)))
+        return rows
+
+    def _values(self, value):
+        values = {}
+        for column, parts, is_datetime in self.columns:
+            values[column] = convert_datetime(value(parts)) if is_datetime else value(parts)
+        return values
+
+
+class FlattenConfig:
+    """A mapping config prepared for flattening: insert order, per-table plans, filter."""
+
+    def __init__(self, name, base_table, tables, mappings, where_conditions=None, relationships=None):
+        self.name = name
+        self.base_table = base_table
+        self.where_conditions = [(c["field"].split("."), c["operator"], c.get("value")) for c in where_conditions or []]
+        self.relationships = relationships or auto_detect_relationships(tables)
+        self.tables = {table["name"]: table for table in tables}
+        self.plans = []
+        for name in insert_order(list(self.tables), self.relationships):
+            table_mappings = [m for m in mappings if m["targetTable"] == name]
+            # Like flattenRecords, a table without mappings is not written at all
+            if table_mappings:
+                self.plans.append(TablePlan(self.tables[name], table_mappings, self.relationships))
+
+    @classmethod
+    def from_dict(cls, data):
+        """From the API's camelCase shape or a mapping_configs row."""
+        def field(camel, snake):
+            value = data.get(camel, data.get(snake)) or []
+            # mapping_configs keeps these as JSON text
+            return json.loads(value) if isinstance(value, (str, bytes, bytearray)) else value
+        return cls(data["name"], data.get("baseTableName", data.get("base_table_name")), field("tables", "tables"),
+                   field("mappings", "mappings"), field("whereConditions", "where_conditions"),
+                   field("relationships", "relationships"))
+
+    def matches(self, doc):
+        """The flattenRecords WHERE clause ('=' and 'IS NOT NULL') evaluated on the hit."""
+        for parts, operator, expected in self.where_conditions:
+            value = lookup(doc, parts)
+            if operator == "=":
+                if value is _MISSING:
+                    return False
+                text = json_text(value)
+                if isinstance(expected, (int, float)) and not isinstance(expected, bool):
+                    try:
+                        if float(text) != expected:
+                            return False
+                    except ValueError:
+                        return False
+                elif text != str(expected):
+                    return False
+            elif operator == "IS NOT NULL" and value is _MISSING:
+                return False
+        return True
+
+    def describe(self):
+        order = " -> ".join(plan.name for plan in self.plans)
+        return f"mapping config {self.name}: {order}, archive table {self.base_table}, {len(self.where_conditions)} where condition(s)"
+
+
+def load_config(source, conn=None):
+    """A FlattenConfig from a JSON file or, by name, from the mapping_configs table."""
+    if os.path.exists(source):
+        with open(source, encoding="utf-8") as f:
+            return FlattenConfig.from_dict(json.load(f))
+    if conn is None:
+        raise ValueError(f"{source} is not a file")
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT name, base_table_name, where_conditions, tables, mappings, relationships "
+                   "FROM mapping_configs WHERE name = %s", (source,))
+    row = cursor.fetchone()
+    cursor.close()
+    if row is None:
+        raise ValueError(f"no file or saved mapping config named {source}")
+    return FlattenConfig.from_dict(row)
+
+
+def create_tables(cursor, config):
+    """ExecutionService.createTables for the config's new tables (CREATE TABLE IF NOT EXISTS)."""
+    for table in config.tables.values():
+        if not table.get("isNew"):
+            continue
+        columns = []
+        for column in table["columns"]:
+            sql = f"{quote_id(column['name'])} {column['type']}"
+            if column.get("isPrimaryKey"):
+                sql += " PRIMARY KEY AUTO_INCREMENT"
+            elif not column.get("nullable"):
+                sql += " NOT NULL"
+            columns.append(sql)
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {quote_id(table['name'])} ({', '.join(columns)})")
+
+
+def consecutive_ids(cursor):
+    """Step between the AUTO_INCREMENT values of one multi-row INSERT, or None if they may interleave.
+
+    Lock modes 0 (traditional) and 1 (consecutive) reserve a consecutive block for a
+    multi-row INSERT ... VALUES; mode 2 (interleaved, the MySQL 8 default) does not.
+    """
+    cursor.execute("SELECT @@innodb_autoinc_lock_mode, @@auto_increment_increment")
+    lock_mode, increment = cursor.fetchone()
+    return int(increment) if int(lock_mode) in (0, 1) else None
+
+
+def describe_error(error, table):
+    """A shorter form of ExecutionService.translateError for the log."""
+    message = str(error)
+    match = re.search(r"FOREIGN KEY \(`([^`]+)`\) REFERENCES `([^`]+)` \(`([^`]+)`\)", message)
+    if match:
+        return f"{table}.{match.group(1)} references {match.group(2)}.{match.group(3)}, but the parent row does not exist"
+    match = re.search(r"Field '([^']+)' doesn't have a default value", message)
+    if match:
+        return f"required column {table}.{match.group(1)} is not mapped"
+    match = re.search(r"Unknown column '([^']+)'", message)
+    if match:
+        return f"column {match.group(1)} does not exist in {table}; recreate the table or fix the mapping"
+    return f"error inserting into {table}: {message}"
+
+
+def _insert(cursor, table, rows):
+    """Multi-row INSERT of (owner, values) pairs, one statement per column set.
+
+    Returns [(pairs, first AUTO_INCREMENT ID)] per statement.
+    """
+    groups = {}
+    for owner, values in rows:
+        groups.setdefault(tuple(values), []).append((owner, values))
+    inserted = []
+    for columns, group in groups.items():
+        placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        cursor.execute(f"INSERT INTO {quote_id(table)} ({', '.join(quote_id(c) for c in columns)}) "
+                       f"VALUES {', '.join([placeholders] * len(group))}",
+                       [values[c] for _, values in group for c in columns])
+        inserted.append((group, cursor.lastrowid))
+    return inserted
+
+
+def flatten_docs(cursor, config, docs, increment):
+    """Insert the normalized rows of docs [(id, parsed hit)], table by table; returns rows per table.
+
+    increment is consecutive_ids() of the session. A failing statement's error is raised
+    with the table name attached as flatten_table.
+    """
+    ids = {}
+    written = Counter()
+    for plan in config.plans:
+        rows = []
+        for owner, (_, doc) in enumerate(docs):
+            for values in plan.rows(doc):
+                for column, parent in plan.foreign_keys:
+                    parent_id = ids.get((parent, owner))
+                    if parent_id is not None:
+                        values[column] = parent_id
+                rows.append((owner, values))
+        if not rows:
+            continue
+        try:
+            if plan.is_parent and plan.auto_id and increment is None:
+                # Interleaved AUTO_INCREMENT locking: only single-row INSERTs report every row's ID
+                for owner, values in rows:
+                    _insert(cursor, plan.name, [(owner, values)])
+                    ids.setdefault((plan.name, owner), cursor.lastrowid)
+            else:
+                for group, first_id in _insert(cursor, plan.name, rows):
+                    if not plan.is_parent:
+                        continue
+                    for offset, (owner, values) in enumerate(group):
+                        row_id = first_id + offset * increment if plan.auto_id else values.get(plan.key_column)
+                        if row_id is not None:
+                            # A fanned-out parent passes its first row's ID on, like a single row would
+                            ids.setdefault((plan.name, owner), row_id)
+        except Exception as e:
+            e.flatten_table = plan.name
+            raise
+        written[plan.name] += len(rows)
+    return written
+
+
+def archive(cursor, table, items):
+    cursor.execute(f"INSERT IGNORE INTO {quote_id(table)} (id, content) VALUES {', '.join(['(%s, %s)'] * len(items))}",
+                   [value for item in items for value in item[:2]])
+
+
+def _permanent(error):
+    errno = mysql_errno(error)
+    return errno is not None and errno not in MYSQL_TRANSIENT
+
+
+def write_batch(conn, cursor, config, items, increment, progress=None):
+    """Flatten and archive a batch of (id, content, mark) items in one transaction.
+
+    Items already in the archive table are skipped. If a permanent MySQL error fails the
+    batch, it is rolled back and each hit is written on its own, so one bad document
+    only costs its own rows; like flattenRecords, a hit that cannot be flattened is
+    archived anyway. Transient errors are raised for write_with_retry to handle.
+    A transient error can come after some hits were committed one by one; pass the same
+    progress dict to every attempt and the retry counts those as archived, not skipped.
+    Returns (archived, skipped, hits that failed to flatten).
+    """
+    progress = {} if progress is None else progress
+    committed = progress.setdefault("committed", set())
+    unflattened = progress.setdefault("unflattened", set())
+    unique = list({item[0]: item for item in items}.values())
+    cursor.execute(f"SELECT id FROM {quote_id(config.base_table)} WHERE id IN ({', '.join(['%s'] * len(unique))})",
+                   [item[0] for item in unique])
+    known = {row[0] for row in cursor.fetchall()}
+    new = [item for item in unique if item[0] not in known]
+    skipped = len(items) - len(new) - len(committed)
+    if new:
+        with metrics.timer("decode_seconds"):
+            docs = [(item[0], json.loads(item[1])) for item in new]
+        matched = [(row_id, doc) for row_id, doc in docs if config.matches(doc)]
+        try:
+            with metrics.timer("insert_seconds"):
+                written = flatten_docs(cursor, config, matched, increment)
+                archive(cursor, config.base_table, new)
+            with metrics.timer("commit_seconds"):
+                conn.commit()
+        except Exception as e:
+            if not _permanent(e):
+                raise
+            conn.rollback()
+            _write_one_by_one(conn, cursor, config, new, dict(matched), increment, progress)
+        else:
+            metrics.inc("flatten_rows_total", sum(written.values()))
+            committed.update(item[0] for item in new)
+        metrics.inc("flatten_unmatched_total", len(docs) - len(matched))
+    return len(committed), skipped, len(unflattened)
+
+
+def _write_one_by_one(conn, cursor, config, items, matched, increment, progress):
+    """Write items one transaction each, recording every commit in progress."""
+    for item in items:
+        doc = matched.get(item[0])
+        failed = False
+        written = Counter()
+        if doc is not None:
+            try:
+                written = flatten_docs(cursor, config, [(item[0], doc)], increment)
+            except Exception as e:
+                if not _permanent(e):
+                    raise
+                conn.rollback()
+                logging.error(f"Record {item[0]}: {describe_error(e, getattr(e, 'flatten_table', '?'))}; archived without flattening")
+                failed = True
+        archive(cursor, config.base_table, [item])
+        conn.commit()
+        metrics.inc("flatten_rows_total", sum(written.values()))
+        progress["committed"].add(item[0])
+        if failed:
+            progress["unflattened"].add(item[0])
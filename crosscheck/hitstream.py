@@ -0,0 +1,213 @@
+"""Extract raw hits from an Elasticsearch search/scroll response without decoding them.
+
+parse_scroll_page() returns the scroll id plus, for every hit, its _id, the hit's exact
+JSON text as it came over the wire, and its sort values. The hit documents themselves
+are never turned into Python objects, so a page costs one pass of byte searches instead
+of a full json.loads() of the page followed by a json.dumps() per hit.
+
+ES writes hits as compact JSON whose first key is always the same (normally "_index"),
+so hit boundaries are found by searching for "},{" followed by that key; a raw '"'
+cannot occur inside a JSON string, so that sequence is never part of a string value.
+Each piece is checked for balanced braces, and if anything looks off (pretty-printed
+output, a nested object that happens to start with the same key, ...) the page is
+re-parsed with the exact tokenizer instead.
+"""
+import json
+import re
+
+# A JSON string (group 1 = its raw contents) optionally followed by ':' (group 2 =
+# it is an object key), or a single bracket.
+_TOKEN = re.compile(rb'"((?:[^"\\]|\\.)*)"(\s*:)?|[{}\[\]]')
+_HIT_ID = re.compile(rb'"_id"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_SORT_KEY = b',"sort":['
+# hits.total: a bare count (rest_total_hits_as_int) or {"value": n, "relation": "eq"|"gte"}
+_TOTAL = re.compile(rb'\s*(?:(\d+)|\{\s*"value"\s*:\s*(\d+)\s*,\s*"relation"\s*:\s*"(\w+)"\s*\})')
+
+_OPEN = (ord("{"), ord("["))
+_QUOTE = ord('"')
+
+
+def _unescape(raw):
+    return json.loads(b'"' + raw + b'"') if b"\\" in raw else raw.decode("utf-8")
+
+
+def _envelope(body):
+    """Scan the response envelope up to the inner hits array.
+
+    Returns (scroll_id, offset just past the '[' of hits.hits or None if absent, hits.total
+    as (value, relation) or None if absent).
+    """
+    scroll_id = None
+    total = None
+    depth = 0
+    key = None
+    path = []
+    for m in _TOKEN.finditer(body):
+        first = body[m.start()]
+        if first == _QUOTE:
+            if m.group(2):
+                key = m.group(1)
+                if key == b"total" and path == [None, b"hits"]:
+                    t = _TOTAL.match(body, m.end())
+                    if t:
+                        total = (int(t.group(1)), "eq") if t.group(1) else (int(t.group(2)), t.group(3).decode("ascii"))
+                continue
+            if depth == 1 and key == b"_scroll_id":
+                scroll_id = _unescape(m.group(1))
+            key = None
+            continue
+        if first in _OPEN:
+            path.append(key)
+            depth += 1
+            if first == ord("[") and path == [None, b"hits", b"hits"]:
+                return scroll_id, m.end(), total
+        else:
+            path.pop()
+            depth -= 1
+        key = None
+    return scroll_id, None, total
+
+
+def _exact_hits(body, pos):
+    """Reference tokenizer: walk the hits array from pos, tracking depth exactly.
+
+    Returns [(row_id, start, end, sort), ...] with byte offsets of each hit.
+    """
+    hits = []
+    depth = 0
+    start = None
+    key = None
+    row_id = None
+    sort_start = None
+    sort = None
+    for m in _TOKEN.finditer(body, pos):
+        first = body[m.start()]
+        if first == _QUOTE:
+            if m.group(2):
+                key = m.group(1)
+                continue
+            if depth == 1 and key == b"_id":
+                row_id = _unescape(m.group(1))
+            key = None
+            continue
+        if first in _OPEN:
+            depth += 1
+            if depth == 1:
+                if first != ord("{"):
+                    raise ValueError("hits array contains a non-object")
+                start, row_id, sort = m.start(), None, None
+            elif depth == 2 and key == b"sort":
+                sort_start = m.start()
+            key = None
+            continue
+        depth -= 1
+        if depth == 1 and sort_start is not None:
+            sort = json.loads(body[sort_start:m.end()])
+            sort_start = None
+        elif depth == 0:
+            hits.append((row_id, start, m.end(), sort))
+        elif depth < 0:
+            # End of the hits array
+            return hits
+        key = None
+    raise ValueError("truncated hits array")
+
+
+def _fast_hits(body, pos):
+    """Split the hits array on '},{<first key>' and pick out _id/sort with byte searches.
+
+    Returns None when the page does not have the expected shape, so the caller can fall
+    back to _exact_hits().
+    """
+    colon = body.find(b":", pos)
+    if colon < 0 or body[pos] != ord("{") or body[colon - 1] != _QUOTE:
+        return None
+    separator = b"}," + body[pos:colon + 1]
+    # The last hit is delimited by the end of the array, which needs the exact tokenizer
+    last = body.rfind(separator, pos)
+    last = pos if last < 0 else last + 2
+    try:
+        tail = _exact_hits(body, last)
+    except ValueError:
+        # The separator was inside the last hit's _source
+        return None
+    if len(tail) != 1:
+        return None
+    tail_end = tail[0][2]
+
+    hits = []
+    start = pos
+    while start < last:
+        end = body.find(separator, start, tail_end) + 1
+        if end <= 0:
+            return None
+        hit = _fast_hit(body, start, end)
+        if hit is None:
+            return None
+        hits.append(hit)
+        start = end + 1
+    hit = _fast_hit(body, last, tail_end)
+    if hit is None:
+        return None
+    hits.append(hit)
+    return hits
+
+
+def _fast_hit(body, start, end):
+    # A piece cut at a nested object still has the hit's own '{' open
+    if body.count(b"{", start, end) != body.count(b"}", start, end):
+        return None
+    id_at = body.find(b'"_id":"', start, end)
+    id_end = body.find(b'"', id_at + 7, end)
+    if id_at < 0 or id_end < 0:
+        return None
+    if body.find(b"\\", id_at + 7, id_end) >= 0:
+        # Escaped: the raw slice may also stop short at an escaped quote
+        m = _HIT_ID.search(body, start, end)
+        if m is None:
+            return None
+        row_id = _unescape(m.group(1))
+    else:
+        row_id = body[id_at + 7:id_end].decode("utf-8")
+    sort = None
+    sort_at = body.rfind(_SORT_KEY, start, end)
+    # sort is the last key ES writes for a hit: ,"sort":[...]}
+    if sort_at >= 0 and body[end - 2] == ord("]"):
+        values = body[sort_at + len(_SORT_KEY):end - 2].split(b",")
+        if all(value.isdigit() for value in values):
+            # The common case: epoch-millis @timestamp sort values
+            sort = [int(value) for value in values]
+        else:
+            try:
+                sort = json.loads(body[sort_at + len(_SORT_KEY) - 1:end - 1].decode("utf-8"))
+            except ValueError:
+                return None
+    return row_id, start, end, sort
+
+
+def scroll_page_spans(body):
+    """Return (scroll_id, [(row_id, start, end, sort values or None), ...]) with each hit's byte offsets in body."""
+    scroll_id, pos, _ = _envelope(body)
+    if pos is None or body[pos:pos + 1] == b"]":
+        return scroll_id, []
+    spans = _fast_hits(body, pos)
+    if spans is None:
+        spans = _exact_hits(body, pos)
+    return scroll_id, spans
+
+
+def parse_scroll_page(body):
+    """Return (scroll_id, [(row_id, raw hit JSON, sort values or None), ...]) for a response body."""
+    scroll_id, spans = scroll_page_spans(body)
+    return scroll_id, [(row_id, body[start:end].decode("utf-8"), sort) for row_id, start, end, sort in spans]
+
+
+def page_total(body):
+    """hits.total of a search response as (value, "eq" or "gte"), or None if it was left out."""
+    return _envelope(body)[2]
+
+
+def hit_id(raw):
+    """The _id of one hit's JSON bytes (an NDJSON line), or None; ES writes _id before _source."""
+    m = _HIT_ID.search(raw)
+    return _unescape(m.group(1)) if m else None
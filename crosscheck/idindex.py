@@ -0,0 +1,175 @@
+"""Known-ID index used by migrate.py --id_index to drop already-loaded hits before queueing.
+
+IDs are stored as 64-bit digests (the first 8 bytes of their MD5) in a sorted array,
+8 bytes per ID, plus a small set for IDs committed during the run. The index is
+persisted to a flat file between runs. Unlike a Bloom filter, an unseen ID is only
+reported as known on a full 64-bit digest collision (about n / 2**64 per lookup), so new
+documents are not silently dropped.
+
+The file is little-endian on every host. Its header names the tables the index was built
+from and their row count when it was saved, so that an index for other tables, or for
+tables that have since lost rows, is rebuilt instead of trusted.
+"""
+import hashlib
+import heapq
+import logging
+import os
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+
+_MAGIC = b"MIGIDX2\n"
+# Written before the tables were recorded; loaded, but never matches
+_MAGIC_V1 = b"MIGIDX1\n"
+# digests, table rows when saved, byte length of the newline-separated table names
+_HEADER = struct.Struct("<QQH")
+
+# Same value MySQL computes for CONV(LEFT(MD5(id), 16), 16, 10)
+_SQL_DIGEST = "CONV(LEFT(MD5(id), 16), 16, 10)"
+
+
+def id_digest(row_id):
+    return int.from_bytes(hashlib.md5(row_id.encode("utf-8")).digest()[:8], "big")
+
+
+def _existing_tables(cursor, tables):
+    placeholders = ", ".join(["%s"] * len(tables))
+    cursor.execute(
+        "SELECT table_name FROM information_schema.tables "
+        f"WHERE table_schema = DATABASE() AND table_name IN ({placeholders})",
+        list(tables),
+    )
+    existing = {row[0] for row in cursor.fetchall()}
+    return [table for table in tables if table in existing]
+
+
+def _count_rows(cursor, existing):
+    total = 0
+    for table in existing:
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        total += cursor.fetchone()[0]
+    return total
+
+
+def count_rows(conn, tables):
+    """Total rows of whichever of tables exist."""
+    cursor = conn.cursor()
+    total = _count_rows(cursor, _existing_tables(cursor, tables))
+    cursor.close()
+    return total
+
+
+class IdIndex:
+    def __init__(self, sorted_digests=None, tables=(), rows=0):
+        self._sorted = sorted_digests if sorted_digests is not None else array("Q")
+        # None for a file that did not record them
+        self.tables = list(tables) if tables is not None else None
+        self.rows = rows
+        self._added = set()
+        self._lock = threading.Lock()
+        self.filtered = 0
+
+    def __len__(self):
+        return len(self._sorted) + len(self._added)
+
+    def _in_sorted(self, digest):
+        i = bisect_left(self._sorted, digest)
+        return i < len(self._sorted) and self._sorted[i] == digest
+
+    def __contains__(self, row_id):
+        digest = id_digest(row_id)
+        return digest in self._added or self._in_sorted(digest)
+
+    def add_many(self, row_ids):
+        digests = [id_digest(row_id) for row_id in row_ids]
+        with self._lock:
+            self._added.update(digests)
+
+    def filter_new(self, hits):
+        """Return the hits whose _id (first element) is not known, counting the rest."""
+        new = [hit for hit in hits if hit[0] not in self]
+        with self._lock:
+            self.filtered += len(hits) - len(new)
+        return new
+
+    @classmethod
+    def from_tables(cls, conn, tables, fetch_size=50000):
+        """Bulk-load the IDs of whichever of tables exist.
+
+        MySQL computes, de-duplicates and sorts the digests, so the client only streams
+        them into the array and never holds more than fetch_size rows as Python objects.
+        The tables and their row count go into the header when the index is saved.
+        """
+        cursor = conn.cursor()
+        existing = _existing_tables(cursor, tables)
+        for table in tables:
+            if table not in existing:
+                logging.warning(f"ID index: table {table} does not exist, skipping")
+        row_count = _count_rows(cursor, existing)
+        digests = array("Q")
+        if existing:
+            union = " UNION ".join(f"SELECT {_SQL_DIGEST} AS digest FROM {table}" for table in existing)
+            cursor.execute(f"SELECT digest FROM ({union}) AS ids ORDER BY CAST(digest AS UNSIGNED)")
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                digests.extend(int(row[0]) for row in rows)
+        cursor.close()
+        logging.info(f"ID index: loaded {len(digests)} IDs from {', '.join(existing) or 'no tables'}")
+        return cls(digests, tables, row_count)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            magic = f.read(len(_MAGIC))
+            if magic == _MAGIC:
+                count, rows, names_length = _HEADER.unpack(f.read(_HEADER.size))
+                names = f.read(names_length).decode("utf-8")
+                tables = names.split("\n") if names else []
+            elif magic == _MAGIC_V1:
+                (count,) = struct.unpack("<Q", f.read(8))
+                rows, tables = 0, None
+            else:
+                raise ValueError(f"{path} is not an ID index file")
+            digests = array("Q")
+            digests.fromfile(f, count)
+        if sys.byteorder == "big":
+            digests.byteswap()
+        return cls(digests, tables, rows)
+
+    def mismatch(self, tables, rows):
+        """Why this index cannot be trusted for tables now holding rows rows, or None."""
+        if self.tables is None:
+            return "does not record its tables"
+        if self.tables != list(tables):
+            return f"was built from {', '.join(self.tables) or 'no tables'}"
+        if rows < self.rows:
+            # Rows deleted outside this tool would otherwise never be reloaded
+            return f"was saved when the tables held {self.rows} rows, they now hold {rows}"
+        return None
+
+    def save(self, path, rows):
+        """Merge IDs committed during the run into the sorted array and write it atomically.
+
+        rows is count_rows() of the index's tables now, checked by mismatch() on the next run.
+        """
+        with self._lock:
+            added = sorted(digest for digest in self._added if not self._in_sorted(digest))
+            merged = array("Q", heapq.merge(self._sorted, added))
+            self._sorted = merged
+            self._added.clear()
+        self.rows = rows
+        names = "\n".join(self.tables or []).encode("utf-8")
+        if sys.byteorder == "big":
+            merged = array("Q", merged)
+            merged.byteswap()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_MAGIC)
+            f.write(_HEADER.pack(len(merged), rows, len(names)))
+            f.write(names)
+            merged.tofile(f)
+        os.replace(tmp_path, path)
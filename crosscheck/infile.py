@@ -0,0 +1,82 @@
+"""LOAD DATA LOCAL INFILE bulk-load path for migrate.py (--load_mode infile).
+
+Rows are spooled into TSV chunk files, each chunk is loaded into a per-connection
+temporary staging table and then merged into the target with INSERT IGNORE ... SELECT,
+so duplicate handling is the same as the multi-row INSERT path.
+"""
+import os
+
+from metrics import registry as metrics
+
+# MySQL's default LOAD DATA escaping (FIELDS ESCAPED BY '\\')
+_TSV_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\0": "\\0"})
+
+
+def staging_table_name(table):
+    return f"{table}_load"
+
+
+def create_staging_table(cursor, table):
+    # Temporary tables are per session, so every worker gets its own staging table
+    cursor.execute(
+        f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging_table_name(table)} ("
+        "id VARCHAR(255) NOT NULL PRIMARY KEY, "
+        "content LONGTEXT CHARACTER SET utf8mb4 NOT NULL)"
+    )
+
+
+class ChunkWriter:
+    """Writes rows to a sequence of numbered TSV chunk files."""
+
+    def __init__(self, directory, prefix):
+        self.directory = directory
+        self.prefix = prefix
+        self.sequence = 0
+        self.path = None
+        self.file = None
+        self.rows = 0
+        self.bytes = 0
+
+    def write(self, row_id, content):
+        if self.file is None:
+            self.sequence += 1
+            self.path = os.path.join(self.directory, f"{self.prefix}-{self.sequence:06d}.tsv")
+            self.file = open(self.path, "w", encoding="utf-8", newline="")
+        self.file.write(f"{row_id.translate(_TSV_ESCAPES)}\t{content.translate(_TSV_ESCAPES)}\n")
+        self.rows += 1
+        self.bytes += len(content)
+
+    def close(self):
+        """Close the current chunk and return its path; the next write starts a new one."""
+        path = self.path
+        if self.file is not None:
+            self.file.close()
+        self.file = None
+        self.path = None
+        self.rows = 0
+        self.bytes = 0
+        return path
+
+
+def load_chunk(conn, cursor, table, path):
+    """Load one chunk file into the staging table, merge it into table and commit.
+
+    Returns the number of rows inserted into table; rows already present (or repeated
+    within the chunk) are skipped exactly as with INSERT IGNORE, so a chunk can be loaded
+    again after a failure.
+    """
+    staging = staging_table_name(table)
+    # Clears rows left behind by a failed attempt at this chunk
+    cursor.execute(f"TRUNCATE TABLE {staging}")
+    with metrics.timer("insert_seconds"):
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {staging} CHARACTER SET utf8mb4 "
+            "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' (id, content)",
+            (os.path.abspath(path),),
+        )
+        cursor.execute(f"INSERT IGNORE INTO {table} (id, content) SELECT id, content FROM {staging}")
+    inserted = cursor.rowcount
+    with metrics.timer("commit_seconds"):
+        conn.commit()
+    cursor.execute(f"TRUNCATE TABLE {staging}")
+    return inserted
@@ -0,0 +1,256 @@
+"""Run many index-to-table migrations in one process: migrate.py --jobs.
+
+    python migrate.py --jobs daily_jobs.json --max_es_requests 8 --max_mysql_writes 6 --summary_json run.json
+
+The job file is JSON (or YAML, with PyYAML installed). Every key is a migrate.py option
+without its leading dashes; "defaults" apply to every job and a job's own keys override
+them. ${VAR} in any string is replaced from the environment, so secrets and computed
+windows stay out of the file:
+
+    {
+      "defaults": {"api_key": "${API_KEY}", "db_host": "${DB_HOST}", "db_user": "${DB_USER}",
+                   "db_pass": "${DB_PASS}", "db_name": "${DB_NAME}", "threads": 4, "slices": 2},
+      "jobs": [
+        {"name": "cicd", "priority": 2, "es_url": "https://host:9200/platforms.cicd/_search",
+         "db_table": "platforms_cicd_data_toprocess", "since_watermark": "cicd.watermark.json", "gte": "${GTE}"},
+        {"name": "deploy", "es_url": "https://host:9200/platforms.deploy/_search",
+         "db_table": "platforms_deploy_data_toprocess", "gte": "${GTE}", "lte": "${LTE}"}
+      ]
+    }
+
+Each job is a migration of its own (its own queue, scroll slices and insert workers),
+started from a thread of this process. What the jobs share:
+
+- one keep-alive HTTP session, so the jobs reuse each other's ES connections;
+- --max_es_requests search/scroll slots, optionally rate limited by
+  --max_es_requests_per_sec, and --max_mysql_writes insert/load slots, both handed out
+  by a weighted fair scheduler (scheduler.py) with each job's priority as its weight.
+  The MySQL slots bound concurrent writes, not connections: every insert worker keeps
+  its own connection, so up to the sum of the running jobs' --threads are open;
+- --max_parallel_jobs: jobs start highest priority first, the rest as others finish.
+
+The metrics endpoints (--metrics_port/--metrics_host, --metrics_textfile, --statsd) serve the whole run
+and --summary_json on the command line gets a combined report. A job may still write
+its own summary_json, but the counters in it are process-wide.
+"""
+import concurrent.futures
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime, timezone
+
+from metrics import registry as metrics, serve as serve_metrics, start_textfile, write_summary
+from migrate import REQUIRED, run_migration
+from scheduler import FairScheduler
+from transport import es_base_url, pooled_session
+
+# Options of the run as a whole; on the command line only, never in the job file
+RUNNER_OPTIONS = {"jobs", "max_parallel_jobs", "max_es_requests", "max_es_requests_per_sec", "max_mysql_writes",
+                  "metrics_port", "metrics_host", "metrics_textfile", "statsd"}
+# Files a job writes to; two jobs sharing one would overwrite each other
+PER_JOB_FILES = ("since_watermark", "id_index", "checkpoint_db", "summary_json")
+ENV_VAR = re.compile(r"\$\{(\w+)\}")
+
+
+class Job:
+    def __init__(self, name, priority, args):
+        self.name = name
+        self.priority = priority
+        self.args = args
+        self.session = None
+        self.es_gate = None
+        self.mysql_gate = None
+        self.exit_code = None
+        self.started_at = None
+        self.finished_at = None
+
+    def describe(self):
+        return {
+            "name": self.name,
+            "priority": self.priority,
+            "es_url": self.args.es_url,
+            "db_table": self.args.db_table,
+            "exit_code": self.exit_code,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "es_slots": self.es_gate.describe(),
+            "mysql_slots": self.mysql_gate.describe(),
+        }
+
+
+def expand_env(value):
+    """Replace ${VAR} in every string of value from the environment."""
+    if isinstance(value, dict):
+        return {key: expand_env(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [expand_env(item) for item in value]
+    if not isinstance(value, str):
+        return value
+
+    def lookup(match):
+        if match.group(1) not in os.environ:
+            raise ValueError(f"environment variable {match.group(1)} is not set")
+        return os.environ[match.group(1)]
+    return ENV_VAR.sub(lookup, value)
+
+
+def load_job_file(path):
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError as e:
+                raise ImportError(f"YAML job files need PyYAML (pip install pyyaml), or use JSON: {e}")
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+    if not isinstance(spec, dict) or not isinstance(spec.get("jobs"), list) or not spec["jobs"]:
+        raise ValueError(f"{path} needs a non-empty \"jobs\" list")
+    unknown = set(spec) - {"defaults", "jobs"}
+    if unknown:
+        raise ValueError(f"unknown key(s) in {path}: {', '.join(sorted(unknown))}")
+    return expand_env(spec)
+
+
+def option_argv(options):
+    """migrate.py command-line arguments for a dict of options (lists become comma-separated)."""
+    argv = []
+    for key, value in options.items():
+        if value is None or value is False:
+            continue
+        argv.append(f"--{key}")
+        if value is not True:
+            argv.append(",".join(str(item) for item in value) if isinstance(value, list) else str(value))
+    return argv
+
+
+def build_jobs(parser, spec):
+    """Parse every job of a loaded job file into migrate.py arguments; raises ValueError on the first bad one."""
+    defaults = spec.get("defaults") or {}
+    jobs = []
+    for n, entry in enumerate(spec["jobs"], 1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"job {n} is not a mapping of options")
+        options = dict(defaults, **entry)
+        name = str(options.pop("name", None) or options.get("db_table") or f"job{n}")
+        priority = options.pop("priority", 1)
+        if isinstance(priority, bool) or not isinstance(priority, (int, float)) or priority <= 0:
+            raise ValueError(f"job {name}: priority must be a positive number")
+        runner = RUNNER_OPTIONS & set(options)
+        if runner:
+            raise ValueError(f"job {name}: {', '.join(sorted(runner))} apply to the whole run; pass them on the command line")
+        try:
+            args = parser.parse_args(option_argv(options))
+        except SystemExit:
+            # argparse has already printed what is wrong
+            raise ValueError(f"job {name}: invalid options")
+        missing = [option for option in REQUIRED if getattr(args, option) is None]
+        if missing:
+            raise ValueError(f"job {name}: missing {', '.join(missing)}")
+        if args.engine != "threaded":
+            raise ValueError(f"job {name}: --jobs is only supported by the threaded engine")
+        jobs.append(Job(name, priority, args))
+
+    names = [job.name for job in jobs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"job name(s) used more than once: {', '.join(duplicates)}")
+    for option in PER_JOB_FILES:
+        paths = [getattr(job.args, option) for job in jobs if getattr(job.args, option)]
+        if len(paths) != len(set(paths)):
+            raise ValueError(f"jobs must not share a {option} file")
+    return jobs
+
+
+def run_job(job):
+    job.started_at = datetime.now(timezone.utc)
+    logging.info(f"Job {job.name}: starting ({job.args.es_url} -> {job.args.db_table}, priority {job.priority})")
+    started = time.monotonic()
+    try:
+        run_migration(job.args, job.session, job.es_gate, job.mysql_gate)
+        job.exit_code = 0
+    except SystemExit as e:
+        # run_migration() ends a failed migration with sys.exit(1)
+        job.exit_code = e.code if isinstance(e.code, int) else 1
+    except Exception:
+        logging.exception(f"Job {job.name}: failed")
+        job.exit_code = 1
+    job.finished_at = datetime.now(timezone.utc)
+    logging.info(f"Job {job.name}: {'completed' if job.exit_code == 0 else 'failed'} in {time.monotonic() - started:.1f}s "
+                 f"(ES slot time {job.es_gate.held_seconds:.1f}s, MySQL slot time {job.mysql_gate.held_seconds:.1f}s)")
+    return job.exit_code
+
+
+def run_jobs(parser, args):
+    """Run the jobs of args.jobs with shared ES and MySQL limits; returns the exit code (1 if any job failed)."""
+    defaults = vars(parser.parse_args([]))
+    stray = sorted(key for key, value in vars(args).items()
+                   if value != defaults[key] and key not in RUNNER_OPTIONS | {"summary_json"})
+    if stray:
+        logging.error(f"Error: with --jobs, put {', '.join('--' + key for key in stray)} in the job file (\"defaults\" or a job).")
+        return 1
+    if args.max_es_requests < 1 or args.max_mysql_writes < 1:
+        logging.error("Error: --max_es_requests and --max_mysql_writes must be at least 1.")
+        return 1
+    try:
+        jobs = build_jobs(parser, load_job_file(args.jobs))
+    except (ImportError, OSError, ValueError) as e:
+        logging.error(f"Error: cannot load job file {args.jobs}: {e}")
+        return 1
+
+    es_scheduler = FairScheduler("es", args.max_es_requests, args.max_es_requests_per_sec)
+    mysql_scheduler = FairScheduler("mysql", args.max_mysql_writes)
+    hosts = {es_base_url(job.args.es_url) for job in jobs}
+    # Clearing a scroll does not take a slot, so every slice may hold one more connection
+    session = pooled_session(args.max_es_requests + sum(max(1, job.args.slices) for job in jobs), len(hosts))
+    for job in jobs:
+        job.session = session
+        job.es_gate = es_scheduler.register(job.name, job.priority)
+        job.mysql_gate = mysql_scheduler.register(job.name, job.priority)
+
+    finish_textfile = None
+    if args.statsd:
+        metrics.configure_statsd(args.statsd)
+    if args.metrics_port:
+        serve_metrics(args.metrics_port, args.metrics_host)
+    if args.metrics_textfile:
+        finish_textfile = start_textfile(args.metrics_textfile)
+    started_at = datetime.now(timezone.utc)
+
+    parallel = args.max_parallel_jobs or len(jobs)
+    rate = f", {args.max_es_requests_per_sec:g}/s" if args.max_es_requests_per_sec else ""
+    logging.info(f"Running {len(jobs)} jobs, {min(parallel, len(jobs))} at a time, sharing {args.max_es_requests} ES request slots{rate} "
+                 f"and {args.max_mysql_writes} MySQL write slots")
+    # Connections are per insert worker, not per slot: the peak is the largest `parallel` jobs' threads together
+    peak = sum(sorted((job.args.threads for job in jobs), reverse=True)[:parallel])
+    logging.info(f"Up to {peak} MySQL connections may be open at once (one per insert worker); "
+                 f"check the server's max_connections")
+    # Highest priority first; the sort is stable, so equal priorities keep the file's order
+    ordered = sorted(jobs, key=lambda job: -job.priority)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(parallel, thread_name_prefix="Job") as executor:
+            codes = list(executor.map(run_job, ordered))
+    finally:
+        session.close()
+
+    if finish_textfile:
+        finish_textfile()
+    failed = [job.name for job in jobs if job.exit_code]
+    if args.summary_json:
+        write_summary(args.summary_json, {
+            "status": "partial" if failed else "completed",
+            "exit_code": 1 if failed else 0,
+            "started_at": started_at.isoformat(),
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "limits": {"max_parallel_jobs": args.max_parallel_jobs, "max_es_requests": args.max_es_requests,
+                       "max_es_requests_per_sec": args.max_es_requests_per_sec, "max_mysql_writes": args.max_mysql_writes},
+            "jobs": [job.describe() for job in jobs],
+        })
+        logging.info(f"Run summary written to {args.summary_json}")
+    if any(codes):
+        logging.error(f"{len(failed)} of {len(jobs)} jobs failed: {', '.join(failed)}")
+        return 1
+    logging.info(f"All {len(jobs)} jobs completed")
+    return 0
@@ -0,0 +1,259 @@
+"""Index hot JSON paths of a _toprocess table through generated columns.
+
+    python json_columns.py --db_host ... --db_user ... --db_pass ... --db_name ... \
+        --db_table platforms_cicd_data_toprocess \
+        --paths "_source.eventData.type,_source.eventData.status,_source.@timestamp:32,_source.pipelineData.projectKey"
+
+For every path this adds
+    g_<path> VARCHAR(n) COLLATE utf8mb4_bin
+        GENERATED ALWAYS AS (JSON_UNQUOTE(JSON_EXTRACT(content, '$.<path>'))) VIRTUAL
+and a secondary index on it. The expression is the one the backend's filter SQL uses, so
+MySQL (8.0+) substitutes the indexed column for it in WHERE clauses; utf8mb4_bin is the
+collation JSON_UNQUOTE() returns, so comparisons behave exactly as before.
+
+n is a hard limit: once the column exists, inserting a hit whose value is longer fails
+with "Data too long", and with it the whole multi-row INSERT batch of migrate.py. Unless
+a path gives its own length (path:n), n is twice the longest value in the table (at
+least 255, at most 768, the longest an index key can hold). --truncate generates
+LEFT(<expression>, n) instead, so no insert can fail; the backend's SQL then no longer
+matches the column's expression and only filters on the column itself use the index.
+
+VIRTUAL columns and their indexes are added with ALGORITHM=INPLACE, LOCK=NONE: inserts
+from migrate.py keep running while the index is built. --stored adds STORED columns
+instead, which rebuilds the table (ALGORITHM=COPY) and blocks writes meanwhile.
+
+--verify runs EXPLAIN on the filter shapes the backend generates (literal JSON path as in
+executionService.ts, JSON path bound as a prepared-statement parameter as in
+analysisService.ts) and reports which of them use the index.
+"""
+import argparse
+import logging
+import re
+import sys
+
+import mysql.connector
+
+DEFAULT_LENGTH = 255
+# InnoDB index keys are at most 3072 bytes, 4 bytes per utf8mb4 character
+MAX_LENGTH = 768
+# Room for values longer than any seen so far, when the length is not given
+LENGTH_HEADROOM = 2
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class JsonColumn:
+    def __init__(self, path, length=None, truncate=False):
+        self.path = path
+        # None: chosen from the table's data by provision()
+        self.length = length
+        self.truncate = truncate
+        name = re.sub(r"[^A-Za-z0-9_]+", "_", path.removeprefix("_source.")).strip("_")
+        self.column = f"g_{name}"[:60]
+        self.index = f"ix_{name}"[:64]
+
+    @classmethod
+    def parse(cls, spec, truncate=False):
+        """path or path:length"""
+        match = re.fullmatch(r"(.+):(\d+)", spec.strip())
+        path, length = (match.group(1), int(match.group(2))) if match else (spec.strip(), None)
+        if length is not None and not 0 < length <= MAX_LENGTH:
+            raise ValueError(f"{spec}: length must be 1..{MAX_LENGTH}")
+        return cls(path, length, truncate)
+
+    @property
+    def json_path(self):
+        # Members that are not plain identifiers (e.g. @timestamp) must be quoted in a MySQL JSON path
+        return "$." + ".".join(m if _IDENTIFIER.match(m) else f'"{m}"' for m in self.path.split("."))
+
+    @property
+    def expression(self):
+        return f"JSON_UNQUOTE(JSON_EXTRACT(content, {sql_string(self.json_path)}))"
+
+    def add_column_sql(self, table, stored=False):
+        kind, algorithm = ("STORED", "ALGORITHM=COPY") if stored else ("VIRTUAL", "ALGORITHM=INPLACE, LOCK=NONE")
+        expression = f"LEFT({self.expression}, {self.length})" if self.truncate else self.expression
+        return (f"ALTER TABLE {table} ADD COLUMN {self.column} VARCHAR({self.length}) COLLATE utf8mb4_bin "
+                f"GENERATED ALWAYS AS ({expression}) {kind}, {algorithm}")
+
+    def add_index_sql(self, table):
+        return f"ALTER TABLE {table} ADD INDEX {self.index} ({self.column}), ALGORITHM=INPLACE, LOCK=NONE"
+
+    def drop_sql(self, table):
+        return f"ALTER TABLE {table} DROP INDEX {self.index}, DROP COLUMN {self.column}"
+
+
+def sql_string(value):
+    return "'" + value.replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def existing(cursor, table):
+    """(column names, index names) of table."""
+    cursor.execute("SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                   (table,))
+    columns = {row[0] for row in cursor.fetchall()}
+    cursor.execute("SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                   (table,))
+    return columns, {row[0] for row in cursor.fetchall()}
+
+
+def longest_value(cursor, table, column):
+    """Longest current value of the path; a longer one would make inserts fail once the column exists."""
+    cursor.execute(f"SELECT MAX(CHAR_LENGTH({column.expression})) FROM {table}")
+    return cursor.fetchone()[0] or 0
+
+
+def column_length(column, longest):
+    """The column length for a path whose longest value so far is longest; raises ValueError if it does not fit."""
+    length = column.length or min(MAX_LENGTH, max(DEFAULT_LENGTH, longest * LENGTH_HEADROOM))
+    if longest > length and not column.truncate:
+        if longest > MAX_LENGTH:
+            raise ValueError(f"{column.path} has values of {longest} characters, longer than an index key can hold; "
+                             f"use --truncate to index the first {MAX_LENGTH}")
+        raise ValueError(f"{column.path} has values of {longest} characters; use {column.path}:"
+                         f"{min(MAX_LENGTH, longest * LENGTH_HEADROOM)} or --truncate")
+    return length
+
+
+def provision(conn, table, columns, stored=False, dry_run=False, check_lengths=True):
+    cursor = conn.cursor()
+    have_columns, have_indexes = existing(cursor, table)
+    for column in columns:
+        statements = []
+        if column.column not in have_columns:
+            longest = longest_value(cursor, table, column) if check_lengths else 0
+            try:
+                column.length = column_length(column, longest)
+            except ValueError as e:
+                logging.error(f"Error: {e}")
+                return False
+            if check_lengths:
+                logging.info(f"{column.path}: longest value {longest} characters, column length {column.length}")
+            statements.append(column.add_column_sql(table, stored))
+        if column.index not in have_indexes:
+            statements.append(column.add_index_sql(table))
+        if not statements:
+            logging.info(f"{column.path}: {column.column} and {column.index} already exist")
+        for sql in statements:
+            logging.info(f"{column.path}: {sql}")
+            if not dry_run:
+                cursor.execute(sql)
+    cursor.close()
+    return True
+
+
+def drop(conn, table, columns, dry_run=False):
+    cursor = conn.cursor()
+    have_columns, _ = existing(cursor, table)
+    for column in columns:
+        if column.column in have_columns:
+            logging.info(f"{column.path}: {column.drop_sql(table)}")
+            if not dry_run:
+                cursor.execute(column.drop_sql(table))
+    cursor.close()
+
+
+def filter_shapes(table, column):
+    """(description, SQL, parameters) for the WHERE clauses the backend builds for one path.
+
+    Parameters are None for literal SQL and a list for server-side prepared statements
+    (mysql2's pool.execute(), which analysisService.ts uses).
+    """
+    literal = sql_string(column.json_path)
+    return [
+        ("executionService =", f"SELECT id FROM {table} WHERE JSON_UNQUOTE(JSON_EXTRACT(content, {literal})) = 'x' LIMIT 100", None),
+        ("literal IN", f"SELECT id FROM {table} WHERE JSON_UNQUOTE(JSON_EXTRACT(content, {literal})) IN ('x', 'y')", None),
+        ("literal range", f"SELECT id FROM {table} WHERE JSON_UNQUOTE(JSON_EXTRACT(content, {literal})) >= 'x'", None),
+        ("analysisService =", f"SELECT content FROM {table} WHERE JSON_UNQUOTE(JSON_EXTRACT(content, ?)) = ? LIMIT 100",
+         [column.json_path, "x"]),
+        ("analysisService IN", f"SELECT content FROM {table} WHERE JSON_UNQUOTE(JSON_EXTRACT(content, ?)) IN (?, ?) LIMIT 100",
+         [column.json_path, "x", "y"]),
+        ("IS NOT NULL", f"SELECT id FROM {table} WHERE JSON_EXTRACT(content, {literal}) IS NOT NULL LIMIT 100", None),
+        ("column =", f"SELECT id FROM {table} WHERE {column.column} = 'x' LIMIT 100", None),
+    ]
+
+
+def explain(cursor, sql, params):
+    """EXPLAIN sql; returns (access type, key) of the table access."""
+    if params is None:
+        cursor.execute(f"EXPLAIN {sql}")
+    else:
+        cursor.execute("SET " + ", ".join(f"@p{i} = %s" for i in range(len(params))), params)
+        cursor.execute("PREPARE json_columns_check FROM %s", (f"EXPLAIN {sql}",))
+        cursor.execute("EXECUTE json_columns_check USING " + ", ".join(f"@p{i}" for i in range(len(params))))
+    names = [name.lower() for name in cursor.column_names]
+    row = dict(zip(names, cursor.fetchall()[0]))
+    if params is not None:
+        cursor.execute("DEALLOCATE PREPARE json_columns_check")
+    return row.get("type"), row.get("key")
+
+
+def verify(conn, table, columns):
+    """Log which filter shapes use each index; returns True if every literal = shape does.
+
+    A --truncate column does not match the backend's expression, so only its own
+    column = shape is required to use the index.
+    """
+    cursor = conn.cursor()
+    ok = True
+    for column in columns:
+        for description, sql, params in filter_shapes(table, column):
+            try:
+                access, key = explain(cursor, sql, params)
+            except mysql.connector.Error as e:
+                logging.warning(f"{column.path} [{description}]: could not EXPLAIN ({e})")
+                continue
+            uses_index = key == column.index
+            result = f"uses {key} ({access})" if uses_index else f"does not use {column.index} (type {access}, key {key})"
+            logging.info(f"{column.path} [{description}]: {result}")
+            if description == ("column =" if column.truncate else "executionService =") and not uses_index:
+                ok = False
+    cursor.close()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add indexed generated columns for hot JSON paths of a _toprocess table")
+    parser.add_argument("--db_host", required=True)
+    parser.add_argument("--db_user", required=True)
+    parser.add_argument("--db_pass", required=True)
+    parser.add_argument("--db_name", required=True)
+    parser.add_argument("--db_table", required=True, help="Table whose content column holds the ES hits")
+    parser.add_argument("--paths", required=True,
+                        help="Comma-separated hit paths, optionally with a max length (default: twice the longest value, 255-768): "
+                             "_source.eventData.type,_source.@timestamp:32")
+    parser.add_argument("--stored", action="store_true", help="STORED instead of VIRTUAL columns (rebuilds the table, blocks writes)")
+    parser.add_argument("--dry_run", action="store_true", help="Print the DDL without running it")
+    parser.add_argument("--skip_length_check", action="store_true",
+                        help="Do not scan for the longest value first; paths without a length get 255")
+    parser.add_argument("--truncate", action="store_true",
+                        help="Index the first n characters (LEFT(...)) so long values cannot fail inserts; the backend's SQL then does not use the index")
+    parser.add_argument("--verify", action="store_true", help="EXPLAIN the backend's filter shapes after provisioning")
+    parser.add_argument("--drop", action="store_true", help="Drop the columns and indexes for --paths instead")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s",
+                        handlers=[logging.StreamHandler(sys.stdout)])
+
+    try:
+        columns = [JsonColumn.parse(spec, args.truncate) for spec in args.paths.split(",") if spec.strip()]
+    except ValueError as e:
+        logging.error(f"Error: {e}")
+        sys.exit(1)
+
+    conn = mysql.connector.connect(host=args.db_host, user=args.db_user, password=args.db_pass, database=args.db_name)
+    try:
+        if args.drop:
+            drop(conn, args.db_table, columns, args.dry_run)
+            return
+        if not provision(conn, args.db_table, columns, args.stored, args.dry_run, not args.skip_length_check):
+            sys.exit(1)
+        if args.verify and not args.dry_run and not verify(conn, args.db_table, columns):
+            logging.error("Error: some filters still scan the table; check that the server is MySQL 8.0+ "
+                          "and that the filter SQL uses the same JSON path spelling")
+            sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Per-stage counters and latency histograms for migrate.py.
+
+One process-wide registry (like prometheus_client's default registry) so the scroll,
+queue and insert paths can record without threading an object through every call.
+Recording is a lock and a few additions per page or batch, never per document.
+
+Exposed three ways, all optional: a Prometheus /metrics endpoint (--metrics_port), a
+node_exporter textfile (--metrics_textfile) and StatsD over UDP (--statsd); plus the
+JSON summary migrate.py writes at exit (--summary_json).
+"""
+import bisect
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "migrate_"
+
+# Seconds; wide enough for a 1 ms commit and a 60 s scroll page under load
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "es_request_seconds": "Latency of ES search/scroll requests, including retries",
+    "es_bytes_total": "Response bytes fetched from ES",
+    "es_wire_bytes_total": "Response bytes received from ES before gzip decoding (threaded engine)",
+    "es_hits_total": "Hits fetched from ES",
+    "decode_seconds": "Time to extract hits from a scroll response",
+    "queue_put_wait_seconds": "Time a scroll page waited for queue space (MySQL is behind)",
+    "queue_get_wait_seconds": "Time an insert worker waited for rows (ES is behind)",
+    "insert_seconds": "Time to execute one insert batch or infile chunk load, excluding commit",
+    "commit_seconds": "Time to commit one insert batch or infile chunk",
+    "rows_inserted_total": "Rows inserted into MySQL",
+    "rows_skipped_total": "Rows skipped as duplicates by INSERT IGNORE",
+    "rows_failed_total": "Rows that failed to insert after retries",
+    "retries_total": "Retried ES requests and MySQL writes",
+    "encode_seconds": "Time to zstd-compress one insert batch (--content_codec zstd)",
+    "content_bytes_total": "Content bytes before compression (--content_codec zstd)",
+    "stored_bytes_total": "Content bytes written after compression (--content_codec zstd)",
+    "queue_depth": "Items waiting in the scroll-to-insert queue",
+    "queue_bytes": "Content bytes waiting in the scroll-to-insert queue",
+    "es_slot_wait_seconds": "Time an ES request waited for a shared request slot (--jobs)",
+    "mysql_slot_wait_seconds": "Time a MySQL write waited for a shared write slot (--jobs)",
+}
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate a quantile by linear interpolation inside its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low = BUCKETS[i - 1] if i else 0.0
+                high = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return min(self.max, low + (high - low) * (rank - seen) / n)
+            seen += n
+        return self.max
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.started = time.time()
+        self._statsd = None
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        if self._statsd:
+            self._send(f"{name}:{value}|c")
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+        if self._statsd:
+            self._send(f"{name}:{seconds * 1000:.3f}|ms")
+
+    def totals(self, name):
+        """(count, sum) of a histogram, (0, 0.0) if nothing was observed."""
+        with self._lock:
+            histogram = self.histograms.get(name)
+            return (histogram.count, histogram.sum) if histogram else (0, 0.0)
+
+    def timer(self, name):
+        return _Timer(self, name)
+
+    def gauge(self, name, read):
+        """Register a callable sampled whenever metrics are exported."""
+        self.gauges[name] = read
+
+    def configure_statsd(self, address):
+        host, _, port = address.rpartition(":")
+        self._statsd = (socket.socket(socket.AF_INET, socket.SOCK_DGRAM), (host or "127.0.0.1", int(port)))
+
+    def _send(self, line):
+        sock, address = self._statsd
+        try:
+            sock.sendto(f"{PREFIX}{line}".encode("ascii"), address)
+        except OSError:
+            pass
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {name: (list(h.counts), h.count, h.sum) for name, h in self.histograms.items()}
+        for name, value in sorted(counters.items()):
+            lines += [f"# HELP {PREFIX}{name} {HELP.get(name, name)}", f"# TYPE {PREFIX}{name} counter",
+                      f"{PREFIX}{name} {value}"]
+        for name, (counts, count, total) in sorted(histograms.items()):
+            lines += [f"# HELP {PREFIX}{name} {HELP.get(name, name)}", f"# TYPE {PREFIX}{name} histogram"]
+            cumulative = 0
+            for bound, n in zip(BUCKETS, counts):
+                cumulative += n
+                lines.append(f'{PREFIX}{name}_bucket{{le="{bound}"}} {cumulative}')
+            lines += [f'{PREFIX}{name}_bucket{{le="+Inf"}} {count}', f"{PREFIX}{name}_sum {total}",
+                      f"{PREFIX}{name}_count {count}"]
+        for name, read in sorted(self.gauges.items()):
+            lines += [f"# HELP {PREFIX}{name} {HELP.get(name, name)}", f"# TYPE {PREFIX}{name} gauge",
+                      f"{PREFIX}{name} {read()}"]
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Totals, docs/sec and per-stage latency percentiles (seconds) for the JSON report."""
+        elapsed = time.time() - self.started
+        with self._lock:
+            counters = dict(self.counters)
+            stages = {
+                name: {
+                    "count": h.count,
+                    "total": round(h.sum, 3),
+                    "mean": round(h.sum / h.count, 6) if h.count else 0.0,
+                    "p50": round(h.quantile(0.5), 6),
+                    "p95": round(h.quantile(0.95), 6),
+                    "p99": round(h.quantile(0.99), 6),
+                    "max": round(h.max, 6),
+                }
+                for name, h in self.histograms.items()
+            }
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "counters": counters,
+            "docs_per_second": {
+                "fetched": round(counters.get("es_hits_total", 0) / elapsed, 1) if elapsed else 0.0,
+                "inserted": round(counters.get("rows_inserted_total", 0) / elapsed, 1) if elapsed else 0.0,
+            },
+            "stages": stages,
+        }
+
+
+class _Timer:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+
+registry = Metrics()
+
+
+def write_atomic(path, text):
+    """Write via a temporary file and rename, so readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(os.path.abspath(path)))
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def serve(port, host="127.0.0.1", metrics=registry):
+    """Serve /metrics in Prometheus text format from a daemon thread, on localhost unless host says otherwise."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="MetricsServer", daemon=True).start()
+    logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
+
+
+def start_textfile(path, interval=15.0, metrics=registry):
+    """Rewrite a node_exporter textfile every interval seconds; call the result to write a final one."""
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            write_atomic(path, metrics.render_prometheus())
+
+    threading.Thread(target=loop, name="MetricsTextfile", daemon=True).start()
+
+    def finish():
+        stop.set()
+        write_atomic(path, metrics.render_prometheus())
+    return finish
+
+
+def write_summary(path, report, metrics=registry):
+    report = dict(report, **metrics.summary())
+    write_atomic(path, json.dumps(report, indent=2) + "\n")
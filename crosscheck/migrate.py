@@ -1,72 +1,626 @@
 import argparse
+import concurrent.futures
 import requests
-import json
 import mysql.connector
 import logging
+import os
+import tempfile
 import threading
-from queue import Queue
+from contextlib import nullcontext
+from queue import Queue, Empty, Full
 import sys
+import time
+from collections import Counter
+from datetime import date, datetime, timezone
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler("es_to_mysql.log"),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-
-def mysql_connection(host, user, password, database):
-    return mysql.connector.connect(host=host, user=user, password=password, database=database)
-
-def insert_worker(queue, db_config, table):
-    conn = mysql_connection(**db_config)
-    cursor = conn.cursor()
+from autotune import Autotuner
+from checkpoint import CheckpointStore, CheckpointTracker, job_key
+from codec import ContentCodec, load_dictionary
+from encode_pool import EncodePool
+from flatten import consecutive_ids, create_tables, load_config, write_batch
+from hitstream import page_total, parse_scroll_page
+from idindex import IdIndex, count_rows
+from infile import ChunkWriter, create_staging_table, load_chunk
+from projection import Projection
+from metrics import registry as metrics, serve as serve_metrics, start_textfile, write_summary
+from partitions import prepare_partitions
+from retry import MYSQL_CONNECTION_LOST, MYSQL_TRANSIENT, RetryPolicy, mysql_errno
+from transport import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, EsTransport
+from watermark import format_millis, load_watermark, save_watermark, window_start
+
+# Options every migration needs; not marked required so --jobs can take them from the job file instead
+REQUIRED = ("es_url", "db_host", "db_user", "db_pass", "db_name", "db_table")
+
+class BoundedQueue(Queue):
+    """Queue between the scroll and insert threads, bounded by item count and content bytes.
+
+    put() blocks while either limit is reached, so the scroll loop is throttled to the
+    pace of the insert workers and memory stays flat however large the query window is.
+    An item bigger than max_bytes is still admitted once the queue has drained, so an
+    oversized document cannot wedge the pipeline. A limit of 0 disables that bound.
+    """
+
+    def __init__(self, maxsize=0, max_bytes=0):
+        super().__init__(maxsize)
+        self.max_bytes = max_bytes
+        self.bytes_in_flight = 0
+
+    @staticmethod
+    def _item_bytes(item):
+        return 0 if item is None else len(item[1])
+
+    def _is_full(self, size):
+        if 0 < self.maxsize <= self._qsize():
+            return True
+        return 0 < self.max_bytes < self.bytes_in_flight + size and self.bytes_in_flight > 0
+
+    def put(self, item, block=True, timeout=None):
+        size = self._item_bytes(item)
+        with self.not_full:
+            if not block:
+                if self._is_full(size):
+                    raise Full
+            elif timeout is None:
+                while self._is_full(size):
+                    self.not_full.wait()
+            else:
+                endtime = time.monotonic() + timeout
+                while self._is_full(size):
+                    remaining = endtime - time.monotonic()
+                    if remaining <= 0.0:
+                        raise Full
+                    self.not_full.wait(remaining)
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def _put(self, item):
+        super()._put(item)
+        self.bytes_in_flight += self._item_bytes(item)
+
+    def _get(self):
+        item = super()._get()
+        self.bytes_in_flight -= self._item_bytes(item)
+        # Producers wait on different sizes, so wake all of them and let each re-check
+        self.not_full.notify_all()
+        return item
+
+    def fill(self):
+        """How full the queue is against its tighter bound, 0.0 to 1.0 (0.0 if unbounded)."""
+        with self.mutex:
+            return max(self._qsize() / self.maxsize if self.maxsize > 0 else 0.0,
+                       self.bytes_in_flight / self.max_bytes if self.max_bytes > 0 else 0.0)
+
+    def describe(self):
+        return f"queue depth {self.qsize()}, {self.bytes_in_flight / (1024 * 1024):.1f} MiB in flight"
+
+def mysql_connection(host, user, password, database, **options):
+    return mysql.connector.connect(host=host, user=user, password=password, database=database, **options)
+
+def build_insert_sql(table, row_count):
     # Use INSERT IGNORE to skip duplicates automatically without errors
-    insert_sql = f"INSERT IGNORE INTO {table} (id, content) VALUES (%s, %s)"
+    placeholders = ", ".join(["(%s, %s)"] * row_count)
+    return f"INSERT IGNORE INTO {table} (id, content) VALUES {placeholders}"
+
+def insert_batch(conn, cursor, table, batch):
+    """Insert a batch of (id, content, mark) items with one multi-row statement and commit it.
+
+    Returns the number of rows actually inserted; with INSERT IGNORE the affected-row
+    count excludes duplicates, so the rest of the batch was skipped.
+    """
+    params = []
+    for item in batch:
+        params.append(item[0])
+        params.append(item[1])
+    with metrics.timer("insert_seconds"):
+        cursor.execute(build_insert_sql(table, len(batch)), params)
+    inserted = cursor.rowcount
+    with metrics.timer("commit_seconds"):
+        conn.commit()
+    return inserted
+
+def write_with_retry(conn, cursor, db_config, retry, label, write, on_connect=None, gate=None, **options):
+    """Run write(conn, cursor), retrying transient MySQL errors with backoff.
+
+    After a lost connection (or when conn is None) a new connection is opened and
+    on_connect(cursor) re-creates any session state. write must be safe to repeat,
+    which INSERT IGNORE is. With a gate (a scheduler.JobGate), every attempt holds one
+    of its slots; backoff sleeps do not. Returns (write's result or None if it failed
+    for good, conn, cursor); conn is None if the last reconnect failed.
+    """
+    attempt = 0
+    while True:
+        try:
+            if conn is None:
+                conn = mysql_connection(**db_config, **options)
+                cursor = conn.cursor()
+                if on_connect:
+                    on_connect(cursor)
+            with gate.slot() if gate else nullcontext():
+                return write(conn, cursor), conn, cursor
+        except Exception as e:
+            errno = mysql_errno(e)
+            if conn is not None:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+            if errno not in MYSQL_TRANSIENT or attempt >= retry.max_retries:
+                logging.error(f"{label}: {e}")
+                return None, conn, cursor
+            logging.warning(f"{label}: {e}; retrying ({attempt + 1}/{retry.max_retries})")
+            metrics.inc("retries_total")
+            if errno in MYSQL_CONNECTION_LOST or (conn is not None and not conn.is_connected()):
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+                conn = None
+            retry.sleep(attempt)
+            attempt += 1
+
+def next_batch(queue, carry, max_rows, max_bytes):
+    """Pull up to max_rows items (and max_bytes of content) off the queue.
+
+    Blocks only for the first item of a batch; after that it takes whatever is already
+    queued. An item that would push the batch over max_bytes is handed back as the new
+    carry so it starts the next batch. Returns (batch, carry, done) where done means the
+    None sentinel was received.
+    """
+    batch = []
+    batch_bytes = 0
+    if carry is not None:
+        batch.append(carry)
+        batch_bytes += len(carry[1])
+        carry = None
+    while len(batch) < max_rows:
+        try:
+            item = queue.get_nowait() if batch else queue.get()
+        except Empty:
+            break
+        if item is None:
+            return batch, None, True
+        item_bytes = len(item[1])
+        if batch and batch_bytes + item_bytes > max_bytes:
+            return batch, item, False
+        batch.append(item)
+        batch_bytes += item_bytes
+    return batch, carry, False
+
+def insert_worker(queue, db_config, table, batch_rows=500, batch_bytes=4 * 1024 * 1024, tracker=None, id_index=None,
+                  retry=None, failed=None, tuner=None, worker_index=0, codec=None, gate=None):
+    """Drain the queue into multi-row INSERT batches until the stop sentinel.
+
+    Batches that hit transient MySQL errors are retried (on a new connection after a
+    lost one); the row count of batches that still fail is appended to failed. With an
+    autotuner the batch size comes from the tuner, every batch's latency is reported to
+    it, and the worker parks between batches while it is above the active worker count.
+    With a codec, content is compressed once per batch before the first attempt.
+    With a gate, each write waits for a slot shared with the other jobs of a --jobs run.
+    """
+    retry = retry or RetryPolicy()
+    # Connected on the first batch, so connection errors go through the retry path too
+    conn = cursor = None
     inserted_count = 0
     skipped_count = 0
+    failed_count = 0
     total_processed = 0
+    carry = None
+    done = False
 
-    while True:
-        item = queue.get()
-        if item is None:
-            break
-        row_id, content_json = item
+    while not done:
+        if tuner:
+            # A held-over item must be written before parking, or queue.join() never returns
+            if carry is None:
+                tuner.wait_active(worker_index)
+            batch_rows = tuner.batch_rows
+        with metrics.timer("queue_get_wait_seconds"):
+            batch, carry, done = next_batch(queue, carry, batch_rows, batch_bytes)
+        if not batch:
+            continue
+        label = f"Error inserting batch of {len(batch)} rows (IDs {batch[0][0]} .. {batch[-1][0]})"
+        started = time.perf_counter()
+        rows = codec.encode_batch(batch) if codec else batch
+        inserted, conn, cursor = write_with_retry(
+            conn, cursor, db_config, retry, label, lambda conn, cursor: insert_batch(conn, cursor, table, rows), gate=gate
+        )
+        if tuner:
+            tuner.record(len(batch), time.perf_counter() - started, inserted is None)
+        if inserted is None:
+            failed_count += len(batch)
+            metrics.inc("rows_failed_total", len(batch))
+        else:
+            inserted_count += inserted
+            skipped_count += len(batch) - inserted
+            metrics.inc("rows_inserted_total", inserted)
+            metrics.inc("rows_skipped_total", len(batch) - inserted)
+            if tracker:
+                # Only committed rows may move a slice's checkpoint forward
+                for mark, count in Counter(item[2] for item in batch).items():
+                    tracker.ack(mark, count)
+            if id_index is not None:
+                id_index.add_many(item[0] for item in batch)
+        total_processed += len(batch)
+        logging.info(f"Worker progress: {total_processed} processed, {inserted_count} inserted, {skipped_count} skipped ({queue.describe()})")
+        for _ in batch:
+            queue.task_done()
+
+    logging.info(f"Worker finished: {total_processed} processed, {inserted_count} inserted, {skipped_count} duplicates skipped, {failed_count} failed")
+    if failed is not None:
+        failed.append(failed_count)
+    if conn is not None:
+        cursor.close()
+        conn.close()
+
+def infile_worker(queue, db_config, table, chunk_rows=100000, chunk_bytes=256 * 1024 * 1024,
+                  directory=None, keep_chunks=False, flush_secs=2.0, tracker=None, id_index=None,
+                  retry=None, failed=None, gate=None):
+    """Like insert_worker, but spools rows into TSV chunks loaded with LOAD DATA LOCAL INFILE.
+
+    Rows are written to the chunk file as they are dequeued, so a chunk never sits in
+    memory. A chunk is loaded once it reaches chunk_rows/chunk_bytes, when the queue has
+    been idle for flush_secs, or at shutdown. Failed loads are retried from the same
+    chunk file.
+    """
+    retry = retry or RetryPolicy()
+    conn = cursor = None
+    chunk = ChunkWriter(directory or tempfile.gettempdir(), f"{table}-{os.getpid()}-{threading.current_thread().name}")
+    marks = Counter()
+    chunk_ids = []
+    inserted_count = 0
+    skipped_count = 0
+    failed_count = 0
+    total_processed = 0
+    chunk_wait = 0.0
+    done = False
+
+    while not done:
+        flush = False
+        wait_start = time.perf_counter()
         try:
-            cursor.execute(insert_sql, (row_id, content_json))
-            if cursor.rowcount > 0:
-                inserted_count += 1
+            item = queue.get(timeout=flush_secs) if chunk.rows else queue.get()
+        except Empty:
+            flush = True
+        else:
+            chunk_wait += time.perf_counter() - wait_start
+            if item is None:
+                done = flush = True
             else:
-                skipped_count += 1
-        except Exception as e:
-            logging.error(f"Error inserting ID {row_id}: {e}")
-        total_processed += 1
-        if total_processed % 100 == 0:
-            logging.info(f"Worker progress: {total_processed} processed, {inserted_count} inserted, {skipped_count} skipped")
-        queue.task_done()
-
-    conn.commit()
-    logging.info(f"Worker finished: {total_processed} processed, {inserted_count} inserted, {skipped_count} duplicates skipped")
-    cursor.close()
-    conn.close()
-
-def main():
+                chunk.write(item[0], item[1])
+                marks[item[2]] += 1
+                if id_index is not None:
+                    chunk_ids.append(item[0])
+                flush = chunk.rows >= chunk_rows or chunk.bytes >= chunk_bytes
+        if not (flush and chunk.rows):
+            continue
+
+        rows = chunk.rows
+        path = chunk.close()
+        # Observed once per chunk: summed time spent waiting for this chunk's rows
+        metrics.observe("queue_get_wait_seconds", chunk_wait)
+        chunk_wait = 0.0
+        inserted, conn, cursor = write_with_retry(
+            conn, cursor, db_config, retry, f"Error loading chunk {path} ({rows} rows)",
+            lambda conn, cursor: load_chunk(conn, cursor, table, path),
+            lambda cursor: create_staging_table(cursor, table), gate, allow_local_infile=True,
+        )
+        if inserted is None:
+            failed_count += rows
+            metrics.inc("rows_failed_total", rows)
+        else:
+            inserted_count += inserted
+            skipped_count += rows - inserted
+            metrics.inc("rows_inserted_total", inserted)
+            metrics.inc("rows_skipped_total", rows - inserted)
+            if tracker:
+                for mark, count in marks.items():
+                    tracker.ack(mark, count)
+            if id_index is not None:
+                id_index.add_many(chunk_ids)
+        if inserted is None:
+            logging.error(f"Chunk {path} kept for a manual reload")
+        elif not keep_chunks:
+            os.remove(path)
+        marks.clear()
+        chunk_ids.clear()
+        total_processed += rows
+        logging.info(f"Worker progress: {total_processed} processed, {inserted_count} inserted, {skipped_count} skipped ({queue.describe()})")
+        for _ in range(rows):
+            queue.task_done()
+
+    logging.info(f"Worker finished: {total_processed} processed, {inserted_count} inserted, {skipped_count} duplicates skipped, {failed_count} failed")
+    if failed is not None:
+        failed.append(failed_count)
+    if conn is not None:
+        cursor.close()
+        conn.close()
+
+def flatten_worker(queue, db_config, config, batch_rows=500, batch_bytes=4 * 1024 * 1024, tracker=None, id_index=None,
+                   retry=None, failed=None, gate=None):
+    """Like insert_worker, but writes every batch through flatten.write_batch.
+
+    Each batch becomes the mapping config's normalized rows plus the hits themselves in
+    the config's archive table, committed together. Hits that could not be flattened
+    are archived anyway (as flattenRecords does) and counted as failed.
+    """
+    retry = retry or RetryPolicy()
+    conn = cursor = None
+    session = {}
+    archived_count = 0
+    skipped_count = 0
+    failed_count = 0
+    total_processed = 0
+    carry = None
+    done = False
+
+    def on_connect(cursor):
+        # Whether one multi-row INSERT gets consecutive AUTO_INCREMENT IDs depends on the server
+        session["increment"] = consecutive_ids(cursor)
+
+    while not done:
+        with metrics.timer("queue_get_wait_seconds"):
+            batch, carry, done = next_batch(queue, carry, batch_rows, batch_bytes)
+        if not batch:
+            continue
+        label = f"Error flattening batch of {len(batch)} rows (IDs {batch[0][0]} .. {batch[-1][0]})"
+        # Shared by the attempts, so hits committed before a transient error count once
+        progress = {}
+        result, conn, cursor = write_with_retry(
+            conn, cursor, db_config, retry, label,
+            lambda conn, cursor: write_batch(conn, cursor, config, batch, session["increment"], progress), on_connect, gate
+        )
+        if result is None:
+            committed = len(progress.get("committed", ()))
+            unflattened = len(progress.get("unflattened", ()))
+            archived_count += committed
+            failed_count += len(batch) - committed + unflattened
+            metrics.inc("rows_inserted_total", committed)
+            metrics.inc("rows_failed_total", len(batch) - committed + unflattened)
+        else:
+            archived, skipped, unflattened = result
+            archived_count += archived
+            skipped_count += skipped
+            failed_count += unflattened
+            metrics.inc("rows_inserted_total", archived)
+            metrics.inc("rows_skipped_total", skipped)
+            metrics.inc("rows_failed_total", unflattened)
+            if tracker:
+                for mark, count in Counter(item[2] for item in batch).items():
+                    tracker.ack(mark, count)
+            if id_index is not None:
+                id_index.add_many(item[0] for item in batch)
+        total_processed += len(batch)
+        logging.info(f"Worker progress: {total_processed} processed, {archived_count} archived, {skipped_count} skipped ({queue.describe()})")
+        for _ in batch:
+            queue.task_done()
+
+    logging.info(f"Worker finished: {total_processed} processed, {archived_count} archived, {skipped_count} already archived, {failed_count} failed")
+    if failed is not None:
+        failed.append(failed_count)
+    if conn is not None:
+        cursor.close()
+        conn.close()
+
+def decode_page(body, encoder=None):
+    """parse_scroll_page() (or the encode pool's decode_page()) plus the fetch/decode metrics for one scroll response."""
+    metrics.inc("es_bytes_total", len(body))
+    with metrics.timer("decode_seconds"):
+        scroll_id, hits = encoder.decode_page(body) if encoder else parse_scroll_page(body)
+    metrics.inc("es_hits_total", len(hits))
+    return scroll_id, hits
+
+def resume_query(query, checkpoint):
+    """Sort the query by @timestamp and, given a slice checkpoint, restart at its sort key.
+
+    The range is inclusive, so hits sharing the checkpoint's timestamp are sent again
+    and dropped by INSERT IGNORE; everything before it is skipped.
+    """
+    body = dict(query)
+    body["sort"] = [{"@timestamp": "asc"}]
+    if checkpoint and checkpoint.get("sort_key"):
+        body["query"] = {
+            "bool": {
+                "filter": [
+                    query["query"],
+                    {"range": {"@timestamp": {"gte": checkpoint["sort_key"][0], "format": "epoch_millis"}}}
+                ]
+            }
+        }
+    return body
+
+def scroll_complete(label, total, fetched):
+    """Whether a scroll that ran out of hits returned all of hits.total ((value, relation) or None)."""
+    if total and total[1] == "eq" and fetched < total[0]:
+        # A scroll page can be lost when ES executed a request whose response never arrived
+        logging.error(f"{label}: scroll ended after {fetched} of {total[0]} hits")
+        return False
+    return True
+
+def scroll_slice(transport, query, batch_size, queue, slice_id=0, slices=1, tracker=None, id_index=None, projection=None,
+                 encoder=None, prefetcher=None):
+    """Scroll through one slice of the query and queue every hit.
+
+    With slices > 1 the query is split with ES sliced scroll, so each call walks an
+    independent scroll context and several can run concurrently against the same queue.
+    With a checkpoint tracker every page is registered before its hits are queued, and
+    the slice is marked finished once the scroll is exhausted. With an ID index, hits
+    whose _id is already known are not queued. A projection adds filter_path to every
+    request and its client-side changes to every queued hit (made by the encode pool
+    when there is one). With a prefetcher (an executor), the next page is requested as
+    soon as the current one arrives, so it is in flight while the current page is being
+    queued. The transport retries 429/5xx responses, timeouts and connection errors (for
+    scroll requests only those that cannot have moved the scroll forward), and a slice
+    that ends short of the first page's hits.total counts as stopped early; the scroll
+    context is cleared however the slice ends.
+    Returns (records fetched, whether the slice was scrolled to the end).
+    """
+    body = dict(query)
+    label = "Scroll"
+    if slices > 1:
+        body["slice"] = {"id": slice_id, "max": slices}
+        label = f"Slice {slice_id + 1}/{slices}"
+    projection = projection or Projection()
+    params = {"scroll": "2m", "size": batch_size, **projection.request_params()}
+
+    def fetch_next(scroll_id):
+        with metrics.timer("es_request_seconds"):
+            return transport.scroll(scroll_id, projection.request_params(), label)
+
+    try:
+        with metrics.timer("es_request_seconds"):
+            response = transport.search(body, params, label)
+    except requests.RequestException as e:
+        logging.error(f"{label}: initial scroll request failed: {e}")
+        return 0, False
+    if response.status_code != 200:
+        logging.error(f"{label}: initial scroll request failed: {response.status_code}, {response.text}")
+        return 0, False
+
+    try:
+        scroll_id, hits = decode_page(response.content, encoder)
+    except ValueError as e:
+        logging.error(f"{label}: unreadable initial scroll response: {e}")
+        return 0, False
+    total = page_total(response.content)
+    total_queued = 0
+    completed = False
+    next_page = None
+
+    try:
+        while hits:
+            if prefetcher:
+                next_page = prefetcher.submit(fetch_next, scroll_id)
+            # Known IDs are dropped here, before they cost queue memory or a MySQL round trip
+            new_hits = id_index.filter_new(hits) if id_index is not None else hits
+            if not encoder:
+                new_hits = projection.transform_hits(new_hits)
+            mark = None
+            if tracker:
+                last_id, _, last_sort = hits[-1]
+                mark = tracker.start_page(slice_id, last_sort, last_id, len(new_hits))
+            # Hits stay as the raw JSON text ES sent; they are only decoded for --drop_redundant_original
+            with metrics.timer("queue_put_wait_seconds"):
+                for row_id, content_json, _ in new_hits:
+                    queue.put((row_id, content_json, mark))
+            total_queued += len(hits)
+            known = f", {len(hits) - len(new_hits)} already known" if id_index is not None else ""
+            logging.info(f"{label}: queued {len(new_hits)} records{known}. Total so far: {total_queued} ({queue.describe()})")
+
+            # Get next batch
+            try:
+                response = next_page.result() if next_page else fetch_next(scroll_id)
+            except requests.RequestException as e:
+                logging.error(f"{label}: scroll request failed: {e}")
+                break
+            if response.status_code != 200:
+                logging.error(f"{label}: scroll request failed: {response.status_code}, {response.text}")
+                break
+            try:
+                scroll_id, hits = decode_page(response.content, encoder)
+            except ValueError as e:
+                logging.error(f"{label}: unreadable scroll response: {e}")
+                break
+        else:
+            completed = scroll_complete(label, total, total_queued)
+            if completed and tracker:
+                tracker.finish_slice(slice_id)
+    finally:
+        # A page still in flight (the slice was interrupted) must not race the clear
+        if next_page is not None and not next_page.cancel():
+            concurrent.futures.wait([next_page])
+        transport.clear_scroll(scroll_id, label)
+
+    logging.info(f"{label}: {'finished' if completed else 'stopped early'}, {total_queued} records queued")
+    return total_queued, completed
+
+def run_threaded_migration(args, db_config, headers, auth, slice_queries, slices, tracker=None, id_index=None, tuner=None,
+                           projection=None, flatten_config=None, codec=None, encoder=None, es_session=None, es_gate=None,
+                           mysql_gate=None):
+    """Run one scroll thread per slice and args.threads insert threads around a bounded queue.
+
+    With --autotune, args.threads is the upper bound on active insert workers. Under
+    --jobs, ES requests go over the run's shared session and wait for slots from es_gate,
+    and MySQL writes wait for slots from mysql_gate.
+    Returns ([(records queued, slice completed) per slice], rows that failed to insert).
+    """
+    queue = BoundedQueue(args.queue_max_items, args.queue_max_bytes)
+    retry = RetryPolicy(args.max_retries, args.retry_base_delay, args.retry_max_delay)
+    failed = []
+    metrics.gauge("queue_depth", queue.qsize)
+    metrics.gauge("queue_bytes", lambda: queue.bytes_in_flight)
+    if tuner:
+        tuner.queue_fill = queue.fill
+    # The encode pool compresses content before it is queued
+    worker_codec = None if encoder else codec
+    threads = []
+    logging.info(f"Starting {args.threads} insert worker threads for table {args.db_table} in DB {args.db_name} on host {args.db_host} as user {args.db_user}")
+    for i in range(args.threads):
+        if args.load_mode == "infile":
+            worker_args = (queue, db_config, args.db_table, args.infile_chunk_rows, args.infile_chunk_bytes,
+                           args.infile_dir, args.keep_infile_chunks, args.infile_flush_secs, tracker, id_index,
+                           retry, failed, mysql_gate)
+            t = threading.Thread(target=infile_worker, args=worker_args, name=f"InsertWorker-{i+1}")
+        elif args.load_mode == "flatten":
+            worker_args = (queue, db_config, flatten_config, args.insert_batch_rows, args.insert_batch_bytes, tracker,
+                           id_index, retry, failed, mysql_gate)
+            t = threading.Thread(target=flatten_worker, args=worker_args, name=f"InsertWorker-{i+1}")
+        else:
+            t = threading.Thread(target=insert_worker, args=(queue, db_config, args.db_table, args.insert_batch_rows, args.insert_batch_bytes, tracker, id_index, retry, failed, tuner, i, worker_codec, mysql_gate), name=f"InsertWorker-{i+1}")
+        t.start()
+        threads.append(t)
+
+    # Every slice feeds the same insert queue, over one pool of keep-alive connections
+    results = [(0, True)] * slices
+    fetchers = []
+    transport = EsTransport(args.es_url, auth, headers, retry, pool_size=max(2 * slices, 10), connect_timeout=args.es_connect_timeout,
+                            read_timeout=args.es_read_timeout, compress_requests=args.es_compress_requests, session=es_session,
+                            gate=es_gate)
+    prefetcher = None if args.no_prefetch else concurrent.futures.ThreadPoolExecutor(slices, thread_name_prefix="ScrollPrefetch")
+    logging.info(f"Starting Elasticsearch scroll with {slices} slice(s)...")
+    try:
+        for i, slice_query in slice_queries.items():
+            def run_slice(slice_id=i, slice_query=slice_query):
+                results[slice_id] = scroll_slice(transport, slice_query, args.batch_size, queue, slice_id, slices, tracker, id_index,
+                                                 projection, encoder, prefetcher)
+            t = threading.Thread(target=run_slice, name=f"ScrollSlice-{i+1}")
+            t.start()
+            fetchers.append(t)
+        for t in fetchers:
+            t.join()
+    finally:
+        if prefetcher:
+            prefetcher.shutdown()
+        transport.close()
+
+    # Stop workers
+    queue.join()
+    if tuner:
+        tuner.stop()
+    for _ in threads:
+        queue.put(None)
+    for t in threads:
+        t.join()
+    return results, sum(failed)
+
+def build_parser():
     parser = argparse.ArgumentParser(description="Fetch data from Elasticsearch and insert into MySQL with pagination and threading.")
     
     # Elasticsearch args
-    parser.add_argument("--es_url", required=True, help="Elasticsearch URL (e.g., http://host:9200/index/_search)")
+    parser.add_argument("--es_url", help="Elasticsearch URL (e.g., http://host:9200/index/_search)")
     parser.add_argument("--es_user", help="Elasticsearch username (for basic auth)")
     parser.add_argument("--es_pass", help="Elasticsearch password (for basic auth)")
     parser.add_argument("--api_key", help="Elasticsearch API Key (alternative to user/pass)")
+    parser.add_argument("--es_connect_timeout", type=float, default=DEFAULT_CONNECT_TIMEOUT, help="Seconds to wait for an ES connection (timeouts are retried)")
+    parser.add_argument("--es_read_timeout", type=float, default=DEFAULT_READ_TIMEOUT, help="Seconds to wait for ES response data (timeouts are retried)")
+    parser.add_argument("--es_compress_requests", action="store_true", help="Threaded engine: gzip ES request bodies (large sliced scroll IDs)")
+    parser.add_argument("--no_prefetch", action="store_true", help="Threaded engine: request the next scroll page only after the current one is queued")
     
     # MySQL args
-    parser.add_argument("--db_host", required=True)
-    parser.add_argument("--db_user", required=True)
-    parser.add_argument("--db_pass", required=True)
-    parser.add_argument("--db_name", required=True)
-    parser.add_argument("--db_table", required=True)
+    parser.add_argument("--db_host")
+    parser.add_argument("--db_user")
+    parser.add_argument("--db_pass")
+    parser.add_argument("--db_name")
+    parser.add_argument("--db_table")
     
     # Query options
     parser.add_argument("--gte", help="Start date (e.g., 2020-06-01T00:00:00)")
@@ -74,14 +628,149 @@ def main():
     parser.add_argument("--match_all", action="store_true", help="Use match_all query instead of range")
     parser.add_argument("--threads", type=int, default=5, help="Number of threads for DB inserts")
     parser.add_argument("--batch_size", type=int, default=1000, help="Batch size for Elasticsearch scroll")
-    
-    args = parser.parse_args()
+    parser.add_argument("--slices", type=int, default=1, help="Number of concurrent sliced scrolls feeding the insert queue")
+    parser.add_argument("--engine", choices=["threaded", "async"], default="threaded", help="threaded: requests + mysql.connector threads; async: aiohttp + aiomysql on one event loop")
+    parser.add_argument("--fetch_concurrency", type=int, default=0, help="Async engine: max concurrent ES requests (default: --slices)")
+    parser.add_argument("--insert_concurrency", type=int, default=0, help="Async engine: max concurrent insert batches / pooled MySQL connections (default: --threads)")
+    parser.add_argument("--load_mode", choices=["insert", "infile", "flatten"], default="insert", help="insert: multi-row INSERT IGNORE; infile: LOAD DATA LOCAL INFILE chunks merged with INSERT IGNORE ... SELECT; flatten: write the normalized tables of --flatten_config directly")
+    parser.add_argument("--flatten_config", help="Mapping config for --load_mode flatten: a JSON file or the name of a config saved in mapping_configs")
+    parser.add_argument("--content_codec", choices=["json", "zstd"], default="json", help="json: content as JSON text; zstd: content as zstd-compressed bytes (needs a BLOB content column)")
+    parser.add_argument("--zstd_level", type=int, default=3, help="zstd compression level for --content_codec zstd")
+    parser.add_argument("--zstd_dict", help="zstd dictionary for --content_codec zstd: a file or the name of a dictionary stored with codec.py train --store")
+    parser.add_argument("--encode_processes", type=int, default=0, help="Split pages, apply --drop_redundant_original and --content_codec in this many worker processes (0 = in the scroll threads)")
+    parser.add_argument("--ensure_partitions", action="store_true", help="Before loading, add the day partitions the run's window needs to a table set up with partitions.py")
+    parser.add_argument("--infile_dir", help="Directory for LOAD DATA chunk files (default: system temp dir)")
+    parser.add_argument("--infile_chunk_rows", type=int, default=100000, help="Rows per LOAD DATA chunk")
+    parser.add_argument("--infile_chunk_bytes", type=int, default=256 * 1024 * 1024, help="Content bytes per LOAD DATA chunk")
+    parser.add_argument("--infile_flush_secs", type=float, default=2.0, help="Load a partial chunk after the queue has been idle this long")
+    parser.add_argument("--keep_infile_chunks", action="store_true", help="Keep chunk files after loading (for debugging)")
+    parser.add_argument("--include", help="Comma-separated _source fields to fetch (ES _source includes; wildcards allowed)")
+    parser.add_argument("--exclude", help="Comma-separated _source fields to leave out (ES _source excludes), e.g. event.original")
+    parser.add_argument("--drop_hit_metadata", action="store_true", help="Use filter_path so hits carry only _id, _source and sort (no _index, _score, _ignored)")
+    parser.add_argument("--drop_redundant_original", action="store_true", help="Remove _source.event.original from hits where it only repeats the parsed fields")
+    parser.add_argument("--projection", help="JSON projection profile with include, exclude, drop_hit_metadata and drop_redundant_original")
+    parser.add_argument("--id_index", help="File holding the known-ID index; hits with known IDs are dropped before queueing (built from MySQL if missing)")
+    parser.add_argument("--rebuild_id_index", action="store_true", help="Rebuild --id_index from SELECT id on the staging and processed tables")
+    parser.add_argument("--processed_table", help="Processed table whose IDs also count as known (default: --db_table without its _toprocess suffix)")
+    parser.add_argument("--checkpoint_db", help="SQLite file recording the last committed sort key per slice (enables @timestamp-sorted scroll)")
+    parser.add_argument("--resume", action="store_true", help="Continue from the checkpoints in --checkpoint_db for the same URL, table, window and slices")
+    parser.add_argument("--since_watermark", help="Watermark file: start at the last fully ingested @timestamp minus --watermark_lateness_hours (--gte is only used when the file does not exist yet) and advance it after the run")
+    parser.add_argument("--watermark_lateness_hours", type=float, default=6.0, help="How far before the watermark to start re-reading, to catch late-indexed documents")
+    parser.add_argument("--max_retries", type=int, default=5, help="Retries for 429/5xx/connection errors from ES and transient MySQL errors (0 = no retries)")
+    parser.add_argument("--retry_base_delay", type=float, default=0.5, help="Base backoff delay in seconds; doubles per attempt, with full jitter")
+    parser.add_argument("--retry_max_delay", type=float, default=30.0, help="Max backoff delay in seconds")
+    parser.add_argument("--autotune", action="store_true", help="Adjust insert batch rows and active insert workers (up to --threads) from measured batch latency and queue fill")
+    parser.add_argument("--autotune_target_latency", type=float, default=1.0, help="Autotune: target seconds per insert batch")
+    parser.add_argument("--autotune_interval", type=float, default=10.0, help="Autotune: seconds between tuning decisions")
+    parser.add_argument("--autotune_min_batch_rows", type=int, default=50, help="Autotune: lower bound for rows per insert batch")
+    parser.add_argument("--autotune_max_batch_rows", type=int, default=5000, help="Autotune: upper bound for rows per insert batch")
+    parser.add_argument("--autotune_step_rows", type=int, default=100, help="Autotune: rows added per interval while under the latency target")
+    parser.add_argument("--metrics_port", type=int, help="Serve Prometheus metrics on this port at /metrics while the run lasts")
+    parser.add_argument("--metrics_host", default="127.0.0.1", help="Address for --metrics_port; 0.0.0.0 lets a remote Prometheus scrape it")
+    parser.add_argument("--metrics_textfile", help="Rewrite this node_exporter textfile (.prom) every 15s and at exit")
+    parser.add_argument("--statsd", help="Send metrics to StatsD at HOST:PORT (UDP)")
+    parser.add_argument("--summary_json", help="Write a machine-readable run summary (status, totals, docs/sec, per-stage latencies) here at exit")
+    parser.add_argument("--queue_max_items", type=int, default=10000, help="Max hits buffered between scroll and insert threads (0 = unbounded)")
+    parser.add_argument("--queue_max_bytes", type=int, default=256 * 1024 * 1024, help="Max content bytes buffered between scroll and insert threads (0 = unbounded)")
+    parser.add_argument("--insert_batch_rows", type=int, default=500, help="Max rows per multi-row INSERT statement (each batch is committed)")
+    parser.add_argument("--insert_batch_bytes", type=int, default=4 * 1024 * 1024, help="Max content bytes per INSERT statement; keep well below MySQL max_allowed_packet")
+
+    # Job runner options
+    parser.add_argument("--jobs", help="JSON or YAML job file: run its migrations in this process with shared ES and MySQL limits (the other options go in the file)")
+    parser.add_argument("--max_parallel_jobs", type=int, default=0, help="--jobs: jobs running at once, highest priority first (0 = all)")
+    parser.add_argument("--max_es_requests", type=int, default=8, help="--jobs: concurrent ES search/scroll requests across all jobs")
+    parser.add_argument("--max_es_requests_per_sec", type=float, default=0.0, help="--jobs: ES search/scroll requests per second across all jobs (0 = unlimited)")
+    parser.add_argument("--max_mysql_writes", type=int, default=8, help="--jobs: concurrent insert batches / chunk loads across all jobs")
+    return parser
 
+def check_required(parser, args):
+    missing = [f"--{name}" for name in REQUIRED if getattr(args, name) is None]
+    if missing:
+        parser.error(f"the following arguments are required: {', '.join(missing)}")
+
+def main(argv=None):
+    # Configured here rather than on import, so tools importing this module keep their own log
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        handlers=[
+            logging.FileHandler("es_to_mysql.log"),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.jobs:
+        from jobs import run_jobs
+        sys.exit(run_jobs(parser, args))
+    check_required(parser, args)
+    run_migration(args)
+
+def run_migration(args, es_session=None, es_gate=None, mysql_gate=None):
+    """Run one migration as configured by args; exits with 1 on bad options or a partial migration.
+
+    The session and gates come from the --jobs runner, which runs one of these per job.
+    """
     # Validate authentication
     if not args.api_key and (not args.es_user or not args.es_pass):
         logging.error("Error: Either --api_key or both --es_user and --es_pass must be provided.")
         sys.exit(1)
 
+    if args.load_mode == "infile" and args.engine != "threaded":
+        logging.error("Error: --load_mode infile is only supported by the threaded engine.")
+        sys.exit(1)
+    if args.load_mode == "flatten" and args.engine != "threaded":
+        logging.error("Error: --load_mode flatten is only supported by the threaded engine.")
+        sys.exit(1)
+    if args.load_mode == "flatten" and not args.flatten_config:
+        logging.error("Error: --load_mode flatten requires --flatten_config.")
+        sys.exit(1)
+    if args.content_codec == "zstd" and (args.engine != "threaded" or args.load_mode != "insert"):
+        logging.error("Error: --content_codec zstd is only supported by the threaded engine with --load_mode insert.")
+        sys.exit(1)
+    if args.zstd_dict and args.content_codec != "zstd":
+        logging.error("Error: --zstd_dict requires --content_codec zstd.")
+        sys.exit(1)
+    if args.encode_processes and args.engine != "threaded":
+        logging.error("Error: --encode_processes is only supported by the threaded engine.")
+        sys.exit(1)
+    if (args.es_compress_requests or args.no_prefetch) and args.engine != "threaded":
+        logging.error("Error: --es_compress_requests and --no_prefetch are only supported by the threaded engine.")
+        sys.exit(1)
+    if args.ensure_partitions and args.load_mode == "flatten":
+        logging.error("Error: --ensure_partitions cannot be combined with --load_mode flatten, which does not write --db_table.")
+        sys.exit(1)
+    if args.infile_dir and not os.path.isdir(args.infile_dir):
+        logging.error(f"Error: --infile_dir {args.infile_dir} does not exist.")
+        sys.exit(1)
+
+    if args.autotune and args.load_mode != "insert":
+        logging.error("Error: --autotune tunes insert batches and requires --load_mode insert.")
+        sys.exit(1)
+    if args.resume and not args.checkpoint_db:
+        logging.error("Error: --resume requires --checkpoint_db.")
+        sys.exit(1)
+
+    watermark = None
+    if args.since_watermark:
+        if args.match_all:
+            logging.error("Error: --since_watermark cannot be combined with --match_all.")
+            sys.exit(1)
+        try:
+            watermark = load_watermark(args.since_watermark)
+        except (OSError, ValueError) as e:
+            logging.error(f"Error: cannot read watermark file {args.since_watermark}: {e}")
+            sys.exit(1)
+        if watermark:
+            args.gte = window_start(watermark, args.watermark_lateness_hours)
+            logging.info(f"Watermark {watermark['timestamp']} (_id {watermark['last_id']}) from {args.since_watermark}; "
+                         f"reading from {args.gte} ({args.watermark_lateness_hours}h lateness allowance)")
+        elif not args.gte:
+            logging.error(f"Error: {args.since_watermark} does not exist yet; pass --gte for the first run.")
+            sys.exit(1)
+        if not args.lte:
+            args.lte = format_millis(int(time.time() * 1000))
+
     # Build query
     if args.match_all:
         query = {"query": {"match_all": {}}}
@@ -101,6 +790,17 @@ def main():
             }
         }
 
+    try:
+        projection = Projection.from_args(args)
+    except (OSError, ValueError) as e:
+        logging.error(f"Error: cannot read projection profile {args.projection}: {e}")
+        sys.exit(1)
+    if projection:
+        query = projection.apply_to_query(query)
+        logging.info(f"Projection: _source includes {projection.include or 'all'}, excludes {projection.exclude or 'none'}, "
+                     f"hit metadata {'dropped' if projection.drop_hit_metadata else 'kept'}, "
+                     f"redundant event.original {'dropped' if projection.drop_redundant_original else 'kept'}")
+
     # MySQL config
     db_config = {
         "host": args.db_host,
@@ -109,20 +809,97 @@ def main():
         "database": args.db_name
     }
 
-    # Initialize queue and threads
-    queue = Queue()
-    threads = []
-    logging.info(f"Starting {args.threads} insert worker threads for table {args.db_table} in DB {args.db_name} on host {args.db_host} as user {args.db_user}")
-    for i in range(args.threads):
-        t = threading.Thread(target=insert_worker, args=(queue, db_config, args.db_table), name=f"InsertWorker-{i+1}")
-        t.start()
-        threads.append(t)
+    slices = max(1, args.slices)
+
+    flatten_config = None
+    if args.load_mode == "flatten":
+        conn = None
+        try:
+            conn = mysql_connection(**db_config)
+            flatten_config = load_config(args.flatten_config, conn)
+            cursor = conn.cursor()
+            create_tables(cursor, flatten_config)
+            cursor.close()
+        except (OSError, ValueError, KeyError, mysql.connector.Error) as e:
+            logging.error(f"Error: cannot load mapping config {args.flatten_config}: {e}")
+            sys.exit(1)
+        finally:
+            if conn is not None:
+                conn.close()
+        logging.info(f"Flatten on ingest: {flatten_config.describe()}")
+        # Hits land in the archive table, so that is the processed table for the ID index
+        args.processed_table = args.processed_table or flatten_config.base_table
+
+    codec = None
+    if args.content_codec == "zstd":
+        conn = None
+        try:
+            dictionary = None
+            if args.zstd_dict:
+                conn = mysql_connection(**db_config) if not os.path.exists(args.zstd_dict) else None
+                dictionary = load_dictionary(args.zstd_dict, conn)
+            codec = ContentCodec(args.zstd_level, dictionary)
+        except (ImportError, OSError, ValueError, mysql.connector.Error) as e:
+            logging.error(f"Error: cannot set up --content_codec zstd: {e}")
+            sys.exit(1)
+        finally:
+            if conn is not None:
+                conn.close()
+        logging.info(f"Content codec: {codec.describe()}")
+
+    if args.ensure_partitions:
+        conn = None
+        try:
+            conn = mysql_connection(**db_config)
+            first = date.fromisoformat(args.gte[:10]) if not args.match_all else None
+            last = date.fromisoformat(args.lte[:10]) if not args.match_all else None
+            added = prepare_partitions(conn, args.db_table, first, last)
+        except (ValueError, mysql.connector.Error) as e:
+            logging.error(f"Error: cannot add partitions to {args.db_table}: {e}")
+            sys.exit(1)
+        finally:
+            if conn is not None:
+                conn.close()
+        logging.info(f"Partitions: {len(added)} day partitions added to {args.db_table}" + (f" ({added[0]} to {added[-1]})" if added else ""))
+
+    id_index = None
+    if args.id_index:
+        tables = [args.db_table]
+        processed_table = args.processed_table
+        if not processed_table and args.db_table.endswith("_toprocess"):
+            processed_table = args.db_table[:-len("_toprocess")]
+        if processed_table:
+            tables.append(processed_table)
+        conn = mysql_connection(**db_config)
+        try:
+            if os.path.exists(args.id_index) and not args.rebuild_id_index:
+                id_index = IdIndex.load(args.id_index)
+                mismatch = id_index.mismatch(tables, count_rows(conn, tables))
+                if mismatch:
+                    logging.warning(f"ID index: {args.id_index} {mismatch}; rebuilding it")
+                    id_index = None
+                else:
+                    logging.info(f"ID index: {len(id_index)} known IDs loaded from {args.id_index}")
+            if id_index is None:
+                id_index = IdIndex.from_tables(conn, tables)
+        finally:
+            conn.close()
+
+    # Checkpoints are keyed by everything that decides which hits land in which slice
+    tracker = None
+    checkpoints = {}
+    if args.checkpoint_db or args.since_watermark:
+        # The watermark needs per-slice commit tracking even without a checkpoint file
+        store = CheckpointStore(args.checkpoint_db or ":memory:")
+        job = job_key(args.es_url, args.db_table, query, slices)
+        if args.resume:
+            checkpoints = store.load(job)
+            logging.info(f"Resuming job {job[:12]} from {len(checkpoints)} slice checkpoint(s) in {args.checkpoint_db}")
+        tracker = CheckpointTracker(store, job, checkpoints)
 
     # Elasticsearch scroll
-    scroll_url = args.es_url
     headers = {"Content-Type": "application/json"}
-    params = {"scroll": "2m", "size": args.batch_size}
-    
+
     # Setup authentication
     auth = None
     if args.api_key:
@@ -130,44 +907,127 @@ def main():
     else:
         auth = (args.es_user, args.es_pass)
 
-    logging.info("Starting Elasticsearch scroll...")
-    response = requests.post(scroll_url, auth=auth, headers=headers, params=params, data=json.dumps(query))
-    if response.status_code != 200:
-        logging.error(f"Initial scroll request failed: {response.status_code}, {response.text}")
-        sys.exit(1)
+    # One scroll per slice; slices finished in a previous run are left out
+    slice_queries = {}
+    for i in range(slices):
+        checkpoint = checkpoints.get(i)
+        if checkpoint and checkpoint["done"]:
+            logging.info(f"Slice {i + 1}/{slices}: completed in a previous run ({checkpoint['rows_committed']} rows), skipping")
+            continue
+        slice_queries[i] = resume_query(query, checkpoint) if tracker else query
 
-    data = response.json()
-    scroll_id = data.get("_scroll_id")
-    hits = data.get("hits", {}).get("hits", [])
-    total_inserted = 0
-
-    while hits:
-        for hit in hits:
-            row_id = hit["_id"]
-            content_json = json.dumps(hit)
-            queue.put((row_id, content_json))
-        total_inserted += len(hits)
-        logging.info(f"Queued {len(hits)} records. Total so far: {total_inserted}")
-
-        # Get next batch
-        # Extract base ES URL (remove /index/_search part)
-        base_url = args.es_url.split('/_search')[0].rsplit('/', 1)[0]
-        response = requests.post(f"{base_url}/_search/scroll", auth=auth,
-                                 headers=headers, data=json.dumps({"scroll": "2m", "scroll_id": scroll_id}))
-        if response.status_code != 200:
-            logging.error(f"Scroll request failed: {response.status_code}, {response.text}")
-            break
-        data = response.json()
-        scroll_id = data.get("_scroll_id")
-        hits = data.get("hits", {}).get("hits", [])
+    tuner = None
+    if args.autotune:
+        max_workers = (args.insert_concurrency or args.threads) if args.engine == "async" else args.threads
+        tuner = Autotuner(args.insert_batch_rows, max_workers, target_latency=args.autotune_target_latency,
+                          interval=args.autotune_interval, min_batch_rows=args.autotune_min_batch_rows,
+                          max_batch_rows=args.autotune_max_batch_rows, step_rows=args.autotune_step_rows)
+        logging.info(f"Autotune: starting with {tuner.workers} of {max_workers} insert workers active, {tuner.batch_rows} rows per batch")
 
-    # Stop workers
-    queue.join()
-    for _ in threads:
-        queue.put(None)
-    for t in threads:
-        t.join()
+    finish_textfile = None
+    if args.statsd:
+        metrics.configure_statsd(args.statsd)
+    if args.metrics_port:
+        serve_metrics(args.metrics_port, args.metrics_host)
+    if args.metrics_textfile:
+        finish_textfile = start_textfile(args.metrics_textfile)
+    started_at = datetime.now(timezone.utc)
+
+    if args.engine == "async":
+        try:
+            from async_engine import run_async_migration
+        except ImportError as e:
+            logging.error(f"Error: --engine async requires aiohttp and aiomysql: {e}")
+            sys.exit(1)
+        results, failed_rows = run_async_migration(args, db_config, headers, auth, slice_queries, slices, tracker, id_index, tuner, projection)
+    else:
+        encoder = None
+        if args.encode_processes > 0:
+            encoder = EncodePool(args.encode_processes, projection, codec)
+            logging.info(f"Encode pool: {args.encode_processes} processes decode{', project' if projection.drop_redundant_original else ''}"
+                         f"{' and compress' if codec else ''} scroll pages")
+        try:
+            results, failed_rows = run_threaded_migration(args, db_config, headers, auth, slice_queries, slices, tracker, id_index, tuner, projection,
+                                                          flatten_config, codec, encoder, es_session, es_gate, mysql_gate)
+        finally:
+            if encoder:
+                encoder.close()
+    if tracker:
+        tracker.store.close()
+    saved = None
+    if args.since_watermark:
+        low = tracker.low_watermark(slices)
+        if low and (not watermark or low[0] > watermark["sort_key"]):
+            saved = save_watermark(args.since_watermark, *low)
+            logging.info(f"Watermark advanced to {saved['timestamp']} (_id {saved['last_id']}) in {args.since_watermark}")
+        else:
+            logging.info(f"Watermark in {args.since_watermark} not advanced")
+    if id_index is not None:
+        try:
+            conn = mysql_connection(**db_config)
+            try:
+                rows = count_rows(conn, id_index.tables)
+            finally:
+                conn.close()
+        except Exception as e:
+            # Keep the previous file rather than save a row count that was never checked
+            logging.error(f"ID index: could not count the rows of {', '.join(id_index.tables)} ({e}); {args.id_index} not updated")
+        else:
+            id_index.save(args.id_index, rows)
+            logging.info(f"ID index: dropped {id_index.filtered} already-known hits before queueing; {len(id_index)} IDs saved to {args.id_index}")
+
+    wire_bytes = metrics.counters.get("es_wire_bytes_total", 0)
+    if wire_bytes:
+        es_bytes = metrics.counters.get("es_bytes_total", 0)
+        logging.info(f"ES transfer: {wire_bytes / (1024 * 1024):.1f} MiB on the wire for {es_bytes / (1024 * 1024):.1f} MiB of responses "
+                     f"(ratio {es_bytes / wire_bytes:.2f})")
+    if codec:
+        raw_bytes = metrics.counters.get("content_bytes_total", 0)
+        stored_bytes = metrics.counters.get("stored_bytes_total", 0)
+        _, encode_seconds = metrics.totals("encode_seconds")
+        if stored_bytes:
+            logging.info(f"Content codec: {raw_bytes / (1024 * 1024):.1f} MiB compressed to {stored_bytes / (1024 * 1024):.1f} MiB "
+                         f"(ratio {raw_bytes / stored_bytes:.2f}), {raw_bytes / (1024 * 1024) / max(encode_seconds, 1e-9):.0f} MiB/s per worker")
 
+    total_inserted = sum(count for count, _ in results)
+    failed_slices = [i + 1 for i, (_, completed) in enumerate(results) if not completed]
+
+    if finish_textfile:
+        finish_textfile()
+    if args.summary_json:
+        write_summary(args.summary_json, {
+            "status": "partial" if failed_slices or failed_rows else "completed",
+            "exit_code": 1 if failed_slices or failed_rows else 0,
+            "started_at": started_at.isoformat(),
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "es_url": args.es_url,
+            "db_table": args.db_table,
+            "window": {"gte": args.gte, "lte": args.lte, "match_all": args.match_all},
+            "engine": args.engine,
+            "load_mode": args.load_mode,
+            "content_codec": args.content_codec,
+            "slices": [{"slice": i + 1, "fetched": count, "completed": completed} for i, (count, completed) in enumerate(results)],
+            "fetched": total_inserted,
+            "failed_rows": failed_rows,
+            "id_index_filtered": id_index.filtered if id_index is not None else None,
+            "watermark": saved["timestamp"] if saved else None,
+            "autotune": tuner.describe(args.batch_size) if tuner else None,
+        })
+        logging.info(f"Run summary written to {args.summary_json}")
+
+    if tuner:
+        result = tuner.describe(args.batch_size)
+        logging.info(f"Autotune: finished at {result['batch_rows']} rows per batch with {result['active_workers']} active workers; "
+                     f"suggested --batch_size for the next run: {result['recommended_batch_size']}")
+
+    if failed_slices or failed_rows:
+        problems = []
+        if failed_slices:
+            problems.append(f"slice(s) {', '.join(str(i) for i in failed_slices)} did not scroll to the end")
+        if failed_rows:
+            problems.append(f"{failed_rows} rows failed to insert after retries")
+        logging.error(f"Partial migration: {'; '.join(problems)}; {total_inserted} records processed from Elasticsearch")
+        sys.exit(1)
     logging.info(f"Completed. Total records processed from Elasticsearch: {total_inserted}")
     logging.info("If the MySQL table is still empty, check the worker logs above for inserted/skipped counts and verify DB connection parameters.")
 
@@ -0,0 +1,285 @@
+"""Day partitions for a _toprocess table: create, add ahead of the data, retire whole days.
+
+    python partitions.py --db_host ... --db_table platforms_cicd_data_toprocess create --key timestamp --start 2025-12-01
+    python partitions.py --db_host ... --db_table platforms_cicd_data_toprocess ensure --days_ahead 7
+    python partitions.py --db_host ... --db_table platforms_cicd_data_toprocess retire --older_than_days 3
+    python partitions.py --db_host ... --db_table platforms_cicd_data_toprocess status
+
+The table gets a p_day DATE column and is partitioned BY RANGE COLUMNS (p_day), one
+partition per day (p20251201 holds p_day 2025-12-01), plus p_old for everything before
+the first day and p_future (MAXVALUE) for everything after the last. p_day is either
+    --key timestamp: the UTC date of the hit's _source.@timestamp, a STORED generated column
+    --key ingest:    the date the row was inserted (DEFAULT (CURRENT_DATE))
+so MySQL routes every insert of migrate.py to its day's partition; the inserts are
+unchanged. The primary key becomes (id, p_day), because MySQL requires the partitioning
+column in every unique key. With the timestamp key a hit always has the same p_day, so
+INSERT IGNORE still drops duplicates; with the ingest key a hit loaded again on a later
+day is a second row (use --id_index, and the processed table's own primary key).
+
+ensure splits p_future (and, for backfills, p_old) into the missing day partitions.
+Both normally hold no rows, so this is a metadata change. Run it daily, or let
+migrate.py --ensure_partitions add the days of each run's window before loading. retire removes days whose rows
+all made it into the processed table, with DROP PARTITION (or EXCHANGE PARTITION into a
+standalone <table>_pYYYYMMDD table first, to keep the rows): constant cost per day,
+no row deletes, no undo and a single small event in the binlog.
+"""
+import argparse
+import logging
+import re
+import sys
+from datetime import date, datetime, timedelta
+
+import mysql.connector
+
+DAY_COLUMN = "p_day"
+OLD_PARTITION = "p_old"
+FUTURE_PARTITION = "p_future"
+KEYS = ("timestamp", "ingest")
+# Same path spelling as json_columns.py; a hit without @timestamp lands in p_old
+TIMESTAMP_DAY = ("CAST(LEFT(COALESCE(JSON_UNQUOTE(JSON_EXTRACT(content, '$._source.\"@timestamp\"')), '1970-01-01'), 10) "
+                 "AS DATE)")
+_DAY_PARTITION = re.compile(r"^p(\d{8})$")
+
+
+def partition_name(day):
+    return f"p{day:%Y%m%d}"
+
+
+def day_column_sql(key):
+    if key == "timestamp":
+        return f"{DAY_COLUMN} DATE GENERATED ALWAYS AS ({TIMESTAMP_DAY}) STORED NOT NULL"
+    return f"{DAY_COLUMN} DATE NOT NULL DEFAULT (CURRENT_DATE)"
+
+
+def days_between(first, last):
+    """The days first..last (inclusive)."""
+    return [first + timedelta(days=n) for n in range((last - first).days + 1)]
+
+
+def day_partitions_sql(days):
+    return [f"PARTITION {partition_name(day)} VALUES LESS THAN ('{day + timedelta(days=1)}')" for day in days]
+
+
+def partitioning_sql(first, last):
+    definitions = [f"PARTITION {OLD_PARTITION} VALUES LESS THAN ('{first}')", *day_partitions_sql(days_between(first, last)),
+                   f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE)"]
+    return f"PARTITION BY RANGE COLUMNS ({DAY_COLUMN}) ({', '.join(definitions)})"
+
+
+def create_table_sql(table, key, first, last, content_type="JSON"):
+    return (f"CREATE TABLE {table} (id VARCHAR(255) NOT NULL, content {content_type} NOT NULL, {day_column_sql(key)}, "
+            f"PRIMARY KEY (id, {DAY_COLUMN})) {partitioning_sql(first, last)}")
+
+
+def convert_table_sql(table, key, first, last):
+    """Partition an existing id/content table in place (one table copy)."""
+    return (f"ALTER TABLE {table} ADD COLUMN {day_column_sql(key)}, DROP PRIMARY KEY, ADD PRIMARY KEY (id, {DAY_COLUMN}) "
+            f"{partitioning_sql(first, last)}")
+
+
+def table_layout(cursor, table):
+    """(content column type, partition key or None) of an existing table; None if it does not exist."""
+    cursor.execute("SELECT COLUMN_NAME, COLUMN_TYPE, EXTRA FROM information_schema.COLUMNS "
+                   "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (table,))
+    columns = {name: (column_type, extra) for name, column_type, extra in cursor.fetchall()}
+    if not columns:
+        return None
+    key = None
+    if DAY_COLUMN in columns:
+        # EXTRA is "STORED GENERATED" for the @timestamp column, "DEFAULT_GENERATED" for the ingest date
+        key = "timestamp" if "STORED GENERATED" in columns[DAY_COLUMN][1].upper() else "ingest"
+    return columns.get("content", ("",))[0], key
+
+
+def list_partitions(cursor, table):
+    """[(name, upper bound as written in the DDL, approximate rows, data bytes)] in range order; [] if not partitioned."""
+    cursor.execute("SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS, DATA_LENGTH FROM information_schema.PARTITIONS "
+                   "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+                   "ORDER BY PARTITION_ORDINAL_POSITION", (table,))
+    return [(name, bound, rows or 0, size or 0) for name, bound, rows, size in cursor.fetchall()]
+
+
+def day_partitions(partitions):
+    """{day: name} of the per-day partitions."""
+    days = {}
+    for name, _, _, _ in partitions:
+        match = _DAY_PARTITION.match(name)
+        if match:
+            days[datetime.strptime(match.group(1), "%Y%m%d").date()] = name
+    return days
+
+
+def _bound_day(bound):
+    return date.fromisoformat(bound.strip("'"))
+
+
+def ensure_partitions(cursor, table, first, last):
+    """Add the day partitions first..last that the table does not have yet; returns their names.
+
+    Days after the newest day partition are split off p_future, days before the oldest
+    are split off p_old. Retired days are not re-created: their late rows land in the
+    next remaining (or new) day partition and are retired with it.
+    """
+    partitions = list_partitions(cursor, table)
+    names = [name for name, _, _, _ in partitions]
+    if len(names) < 2 or names[0] != OLD_PARTITION or names[-1] != FUTURE_PARTITION:
+        raise ValueError(f"{table} is not partitioned by day (set it up with partitions.py create)")
+    added = []
+    # p_future starts where the partition before it ends; a gap before first (retired days)
+    # is not re-created but covered by the first new partition
+    future_start = max(_bound_day(partitions[-2][1]), first)
+    if last >= future_start:
+        days = days_between(future_start, last)
+        cursor.execute(f"ALTER TABLE {table} REORGANIZE PARTITION {FUTURE_PARTITION} INTO "
+                       f"({', '.join(day_partitions_sql(days))}, PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE))")
+        added += [partition_name(day) for day in days]
+    old_end = _bound_day(partitions[0][1])
+    if first < old_end:
+        days = days_between(first, old_end - timedelta(days=1))
+        cursor.execute(f"ALTER TABLE {table} REORGANIZE PARTITION {OLD_PARTITION} INTO "
+                       f"(PARTITION {OLD_PARTITION} VALUES LESS THAN ('{first}'), {', '.join(day_partitions_sql(days))})")
+        added = [partition_name(day) for day in days] + added
+    return added
+
+
+def prepare_partitions(conn, table, first, last):
+    """migrate.py --ensure_partitions: add the partitions a run needs; returns their names.
+
+    For an ingest-date table the run's rows all land on today (or tomorrow, if it
+    crosses midnight), whatever the window; for a @timestamp table on first..last, the
+    days of the run's --gte/--lte window (None with --match_all: today and tomorrow).
+    """
+    cursor = conn.cursor()
+    try:
+        layout = table_layout(cursor, table)
+        if layout is None or layout[1] is None:
+            raise ValueError(f"{table} has no {DAY_COLUMN} column (set it up with partitions.py create)")
+        if layout[1] == "ingest" or first is None:
+            first, last = date.today(), date.today() + timedelta(days=1)
+        return ensure_partitions(cursor, table, first, last)
+    finally:
+        cursor.close()
+
+
+def unprocessed_rows(cursor, table, partition, processed_table):
+    """Rows of the partition whose id is not in the processed table yet."""
+    cursor.execute(f"SELECT COUNT(*) FROM {table} PARTITION ({partition}) s "
+                   f"WHERE NOT EXISTS (SELECT 1 FROM {processed_table} p WHERE p.id = s.id)")
+    return cursor.fetchone()[0]
+
+
+def retire_partitions(cursor, table, processed_table, before, exchange=False, force=False, dry_run=False):
+    """Remove the day partitions before the given day whose rows are all processed.
+
+    Returns [(partition, rows it held, unprocessed rows)] of the partitions considered;
+    those with unprocessed rows are kept unless force is set. With exchange, each day's
+    rows are first swapped into a new standalone table <table>_<partition>.
+    """
+    partitions = list_partitions(cursor, table)
+    rows = {name: count for name, _, count, _ in partitions}
+    report = []
+    retire = []
+    for day, name in sorted(day_partitions(partitions).items()):
+        if day >= before:
+            break
+        pending = 0 if force else unprocessed_rows(cursor, table, name, processed_table)
+        report.append((name, rows[name], pending))
+        if pending:
+            logging.warning(f"{name}: {pending} rows not in {processed_table} yet; kept")
+            continue
+        retire.append(name)
+    if dry_run or not retire:
+        return report
+    if exchange:
+        for name in retire:
+            archive = f"{table}_{name}"
+            cursor.execute(f"CREATE TABLE {archive} LIKE {table}")
+            cursor.execute(f"ALTER TABLE {archive} REMOVE PARTITIONING")
+            cursor.execute(f"ALTER TABLE {table} EXCHANGE PARTITION {name} WITH TABLE {archive} WITHOUT VALIDATION")
+            logging.info(f"{name}: rows moved to {archive}")
+    cursor.execute(f"ALTER TABLE {table} DROP PARTITION {', '.join(retire)}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create, extend and retire the day partitions of a _toprocess table")
+    parser.add_argument("--db_host", required=True)
+    parser.add_argument("--db_user", required=True)
+    parser.add_argument("--db_pass", required=True)
+    parser.add_argument("--db_name", required=True)
+    parser.add_argument("--db_table", required=True, help="Staging table whose content column holds the ES hits")
+    parser.add_argument("--dry_run", action="store_true", help="Print the DDL (create) or the partitions that would be retired (retire)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="Create the table partitioned by day, or partition an existing one (copies the table)")
+    create.add_argument("--key", choices=KEYS, default="timestamp",
+                        help="timestamp: UTC day of _source.@timestamp; ingest: day the row was inserted")
+    create.add_argument("--start", help="First day partition, YYYY-MM-DD (default: today); older rows go to p_old")
+    create.add_argument("--days_ahead", type=int, default=7, help="Day partitions to create after today")
+    create.add_argument("--content_type", default="JSON", help="content column type of a new table, e.g. LONGBLOB for --content_codec zstd")
+    ensure = commands.add_parser("ensure", help="Add day partitions up to --days_ahead after today (and back to --start)")
+    ensure.add_argument("--start", help="Also add day partitions back to this day, YYYY-MM-DD (backfills)")
+    ensure.add_argument("--days_ahead", type=int, default=7)
+    retire = commands.add_parser("retire", help="Drop day partitions whose rows are all in the processed table")
+    retire.add_argument("--older_than_days", type=int, default=3, help="Only days at least this many days before today")
+    retire.add_argument("--processed_table", help="Table the consumer copies processed rows to (default: --db_table without _toprocess)")
+    retire.add_argument("--exchange", action="store_true", help="Keep each day's rows in a standalone <table>_pYYYYMMDD table")
+    retire.add_argument("--force", action="store_true", help="Retire without checking the processed table")
+    commands.add_parser("status", help="List the partitions with approximate rows and size")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s",
+                        handlers=[logging.StreamHandler(sys.stdout)])
+    today = date.today()
+    try:
+        start = date.fromisoformat(args.start) if getattr(args, "start", None) else None
+    except ValueError as e:
+        logging.error(f"Error: --start: {e}")
+        sys.exit(1)
+    conn = mysql.connector.connect(host=args.db_host, user=args.db_user, password=args.db_pass, database=args.db_name)
+    cursor = conn.cursor()
+    try:
+        if args.command == "create":
+            layout = table_layout(cursor, args.db_table)
+            first, last = start or today, today + timedelta(days=args.days_ahead)
+            if layout is None:
+                sql = create_table_sql(args.db_table, args.key, first, last, args.content_type)
+            elif layout[1] is not None:
+                logging.error(f"Error: {args.db_table} already has a {DAY_COLUMN} column; use ensure to add partitions")
+                sys.exit(1)
+            elif args.key == "timestamp" and "blob" in layout[0].lower():
+                logging.error(f"Error: {args.db_table} stores compressed content, so @timestamp cannot be read in SQL; use --key ingest")
+                sys.exit(1)
+            else:
+                sql = convert_table_sql(args.db_table, args.key, first, last)
+                logging.info(f"{args.db_table} exists and will be copied into the partitioned layout; writes wait until it is done")
+            logging.info(sql)
+            if not args.dry_run:
+                cursor.execute(sql)
+                logging.info(f"{args.db_table}: partitioned by {args.key} day, {first} to {last}")
+        elif args.command == "ensure":
+            added = ensure_partitions(cursor, args.db_table, start or today, today + timedelta(days=args.days_ahead))
+            logging.info(f"{args.db_table}: added {len(added)} day partitions" + (f" ({added[0]} to {added[-1]})" if added else ""))
+        elif args.command == "retire":
+            processed_table = args.processed_table or args.db_table.removesuffix("_toprocess")
+            if processed_table == args.db_table:
+                logging.error("Error: --processed_table is required when --db_table does not end in _toprocess")
+                sys.exit(1)
+            report = retire_partitions(cursor, args.db_table, processed_table, today - timedelta(days=args.older_than_days - 1),
+                                       args.exchange, args.force, args.dry_run)
+            retired = [(name, rows) for name, rows, pending in report if not pending]
+            kept = len(report) - len(retired)
+            logging.info(f"{args.db_table}: {'would retire' if args.dry_run else 'retired'} {len(retired)} day partitions "
+                         f"(~{sum(rows for _, rows in retired)} rows)" + (f", kept {kept} with unprocessed rows" if kept else ""))
+        else:
+            for name, bound, rows, size in list_partitions(cursor, args.db_table):
+                print(f"{name:<12} < {bound:<14} ~{rows:>10} rows {size / (1024 * 1024):10.1f} MiB")
+    except (ValueError, mysql.connector.Error) as e:
+        logging.error(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
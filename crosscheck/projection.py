@@ -0,0 +1,112 @@
+"""Field projection for migrate.py: send and store only the parts of each hit that are used.
+
+- --include/--exclude become ES `_source` filtering, so unwanted fields never leave ES.
+- --drop_hit_metadata sets `filter_path` on every search/scroll request, so only the
+  hit's _id, _source and sort values are returned (no _index, _score, _ignored, ...).
+- --drop_redundant_original removes `event.original` from a hit when the JSON it holds
+  is identical to the parsed fields stored next to it in _source. This is checked per
+  document on the client; when event.original is known to be redundant for the whole
+  index, --exclude event.original saves the transfer as well.
+
+A --projection JSON profile may set any of these:
+{"include": [...], "exclude": [...], "drop_hit_metadata": true, "drop_redundant_original": true}
+"""
+import json
+
+from metrics import registry as metrics
+
+# _scroll_id and the hits' sort values are needed to continue the scroll and for checkpoints,
+# hits.total to check that the scroll returned every hit
+FILTER_PATH = "_scroll_id,hits.total,hits.hits._id,hits.hits._source,hits.hits.sort"
+
+
+class Projection:
+    def __init__(self, include=None, exclude=None, drop_hit_metadata=False, drop_redundant_original=False):
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.drop_hit_metadata = drop_hit_metadata
+        self.drop_redundant_original = drop_redundant_original
+
+    @classmethod
+    def from_args(cls, args):
+        """Combine a --projection profile with the command-line flags (flags add to the profile)."""
+        profile = {}
+        if args.projection:
+            with open(args.projection, encoding="utf-8") as f:
+                profile = json.load(f)
+            unknown = set(profile) - {"include", "exclude", "drop_hit_metadata", "drop_redundant_original"}
+            if unknown:
+                raise ValueError(f"unknown key(s) in {args.projection}: {', '.join(sorted(unknown))}")
+        return cls(
+            profile.get("include", []) + split_fields(args.include),
+            profile.get("exclude", []) + split_fields(args.exclude),
+            profile.get("drop_hit_metadata", False) or args.drop_hit_metadata,
+            profile.get("drop_redundant_original", False) or args.drop_redundant_original,
+        )
+
+    def __bool__(self):
+        return bool(self.include or self.exclude or self.drop_hit_metadata or self.drop_redundant_original)
+
+    def apply_to_query(self, query):
+        """Return the search body with `_source` filtering added."""
+        if not (self.include or self.exclude):
+            return query
+        body = dict(query)
+        source = {}
+        if self.include:
+            source["includes"] = self.include
+        if self.exclude:
+            source["excludes"] = self.exclude
+        body["_source"] = source
+        return body
+
+    def request_params(self):
+        """Extra URL parameters for every search and scroll request."""
+        return {"filter_path": FILTER_PATH} if self.drop_hit_metadata else {}
+
+    def transform_hits(self, hits):
+        """Apply client-side projection to [(row_id, raw hit JSON, sort), ...]."""
+        if not self.drop_redundant_original:
+            return hits
+        dropped = 0
+        projected = []
+        for row_id, content, sort in hits:
+            stripped = strip_redundant_original(content)
+            if stripped is not None:
+                content = stripped
+                dropped += 1
+            projected.append((row_id, content, sort))
+        metrics.inc("original_dropped_total", dropped)
+        metrics.inc("original_kept_total", len(hits) - dropped)
+        return projected
+
+
+def split_fields(value):
+    return [field.strip() for field in value.split(",") if field.strip()] if value else []
+
+
+def strip_redundant_original(content):
+    """Return the hit JSON without _source.event.original, or None to keep the hit as is.
+
+    event.original is redundant when it parses to an object whose every key holds the same
+    value as the parsed field of that name in _source.
+    """
+    # Cheap pre-check so hits without the field are never decoded
+    if '"original"' not in content:
+        return None
+    hit = json.loads(content)
+    source = hit.get("_source")
+    event = source.get("event") if isinstance(source, dict) else None
+    original = event.get("original") if isinstance(event, dict) else None
+    if not isinstance(original, str):
+        return None
+    try:
+        parsed = json.loads(original)
+    except ValueError:
+        return None
+    if not isinstance(parsed, dict) or not parsed or any(source.get(key) != value for key, value in parsed.items()):
+        return None
+    del event["original"]
+    if not event:
+        del source["event"]
+    return json.dumps(hit, ensure_ascii=False, separators=(",", ":"))
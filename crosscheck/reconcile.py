@@ -0,0 +1,337 @@
+"""Check that a window of an ES index arrived in MySQL, and re-migrate only what is missing.
+
+    python reconcile.py --es_url https://host:9200/platforms.cicd/_search --api_key ... \
+        --db_host ... --db_table platforms_cicd_data_toprocess \
+        --gte 2025-12-01T00:00:00 --lte 2025-12-07T23:59:59 --repair
+
+Counts are compared first, per hour: a date_histogram aggregation on ES and a GROUP BY
+over the staging and processed tables (a hit counts once, in whichever table it is).
+Only hours whose counts differ are compared per minute, and only minutes whose counts
+differ have their IDs listed on both sides and diffed. Beyond the two aggregations, the
+work grows with the size of the discrepancy, not with the window.
+
+Equal counts can still hide a missing hit balanced by an extra row (one whose hit was
+deleted from ES). --digest also compares an XOR of ID hashes for every hour whose counts
+agree. MySQL computes its digest server side. ES cannot: _id has no doc values, so
+aggregations and scripts cannot read it. The ES digest is therefore computed from an
+IDs-only scroll of the hour (filter_path=hits.hits._id, about 60 bytes per hit instead
+of the whole document).
+
+--repair fetches the missing hits by ID (an ids query, 1000 per request) and inserts
+them into the staging table with INSERT IGNORE, as migrate.py would have. Pass the same
+projection options the window was migrated with. Rows that have no ES hit are reported,
+never deleted.
+
+Buckets use the UTC @timestamp string in _source (ISO-8601, as the ingest pipeline writes
+it), so _source.@timestamp must not be projected away and the content column must be
+JSON text (not --content_codec zstd). With json_columns.py's _source.@timestamp:32
+column, MySQL reads the buckets from that index instead of the documents.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import sys
+from datetime import datetime, timedelta, timezone
+
+import mysql.connector
+import requests
+
+from hitstream import parse_scroll_page
+from migrate import insert_batch, mysql_connection
+from projection import Projection
+from retry import RetryPolicy
+from transport import EsTransport
+
+# The path spelling json_columns.py indexes, so MySQL can substitute the generated column
+TIMESTAMP = "JSON_UNQUOTE(JSON_EXTRACT(content, '$._source.\"@timestamp\"'))"
+# level: (bucket key length of the ISO timestamp, ES interval, ES key format, strptime format, bucket length)
+LEVELS = {
+    "hour": (13, "1h", "yyyy-MM-dd'T'HH", "%Y-%m-%dT%H", timedelta(hours=1)),
+    "minute": (16, "1m", "yyyy-MM-dd'T'HH:mm", "%Y-%m-%dT%H:%M", timedelta(minutes=1)),
+}
+IDS_PER_REQUEST = 1000
+IDS_PAGE_SIZE = 10000
+
+
+def bucket_range(key, level):
+    """(start, end) of the bucket with this key."""
+    _, _, _, pattern, length = LEVELS[level]
+    start = datetime.strptime(key, pattern).replace(tzinfo=timezone.utc)
+    return start, start + length
+
+
+def _iso(moment):
+    # Compares correctly with any ISO-8601 UTC timestamp string, with or without fractions
+    return moment.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def _millis(moment):
+    return int(moment.timestamp() * 1000)
+
+
+def id_digest(ids):
+    """XOR of the first 64 bits of each ID's MD5, the same as mysql_digests()."""
+    digest = 0
+    for row_id in ids:
+        digest ^= int(hashlib.md5(row_id.encode("utf-8")).hexdigest()[:16], 16)
+    return digest
+
+
+class EsSide:
+    """Bucket counts, IDs and hits of one index, over an EsTransport."""
+
+    def __init__(self, transport, projection=None):
+        self.transport = transport
+        self.projection = projection or Projection()
+
+    @staticmethod
+    def _range(start, end):
+        return {"range": {"@timestamp": {"gte": _millis(start), "lt": _millis(end), "format": "epoch_millis"}}}
+
+    @staticmethod
+    def _check(response, what):
+        if response.status_code != 200:
+            raise ValueError(f"ES {what} failed: {response.status_code}, {response.text[:500]}")
+        return response
+
+    def counts(self, start, end, level):
+        """{bucket key: hits} for start <= @timestamp < end."""
+        _, interval, key_format, _, _ = LEVELS[level]
+        body = {
+            "size": 0,
+            "query": self._range(start, end),
+            "aggs": {"buckets": {"date_histogram": {"field": "@timestamp", "fixed_interval": interval, "format": key_format,
+                                                    "min_doc_count": 1}}},
+        }
+        response = self._check(self.transport.search(body, {"filter_path": "aggregations"}, "Reconcile"), f"{level} counts")
+        buckets = response.json().get("aggregations", {}).get("buckets", {}).get("buckets", [])
+        return {bucket["key_as_string"]: bucket["doc_count"] for bucket in buckets}
+
+    def ids(self, start, end):
+        """Every _id with start <= @timestamp < end, from an IDs-only scroll."""
+        body = {"query": self._range(start, end), "_source": False, "sort": ["_doc"]}
+        params = {"scroll": "1m", "size": IDS_PAGE_SIZE, "filter_path": "_scroll_id,hits.total,hits.hits._id"}
+        page = self._check(self.transport.search(body, params, "Reconcile"), "ID scroll").json()
+        total = page.get("hits", {}).get("total")
+        ids = set()
+        fetched = 0
+        try:
+            while page.get("hits", {}).get("hits"):
+                ids.update(hit["_id"] for hit in page["hits"]["hits"])
+                fetched += len(page["hits"]["hits"])
+                page = self._check(self.transport.scroll(page["_scroll_id"], {"filter_path": "_scroll_id,hits.hits._id"},
+                                                         "Reconcile", keepalive="1m"), "ID scroll").json()
+        finally:
+            self.transport.clear_scroll(page.get("_scroll_id"), "Reconcile")
+        if isinstance(total, dict) and total.get("relation") == "eq" and fetched < total["value"]:
+            raise ValueError(f"ID scroll ended after {fetched} of {total['value']} hits")
+        return ids
+
+    def fetch(self, ids):
+        """Yield the hits with these IDs as (row_id, raw hit JSON, None), projected like migrate.py."""
+        ids = sorted(ids)
+        for n in range(0, len(ids), IDS_PER_REQUEST):
+            chunk = ids[n:n + IDS_PER_REQUEST]
+            body = self.projection.apply_to_query({"query": {"ids": {"values": chunk}}, "size": len(chunk)})
+            response = self._check(self.transport.search(body, self.projection.request_params(), "Reconcile"), "fetch by ID")
+            _, hits = parse_scroll_page(response.content)
+            yield from self.projection.transform_hits(hits)
+
+
+def _union(tables, columns):
+    """A UNION over the tables of the rows with start <= @timestamp < end (two parameters per table)."""
+    return " UNION ".join(f"SELECT {columns} FROM {table} WHERE {TIMESTAMP} >= %s AND {TIMESTAMP} < %s" for table in tables)
+
+
+def mysql_counts(cursor, tables, start, end, level):
+    """{bucket key: distinct IDs} over the tables, like EsSide.counts()."""
+    length = LEVELS[level][0]
+    cursor.execute(f"SELECT LEFT(ts, {length}) AS bucket, COUNT(*) FROM ({_union(tables, f'id, {TIMESTAMP} AS ts')}) u "
+                   "GROUP BY bucket", (_iso(start), _iso(end)) * len(tables))
+    return {bucket: count for bucket, count in cursor.fetchall()}
+
+
+def mysql_digests(cursor, tables, start, end, level="hour"):
+    """{bucket key: id_digest() of its distinct IDs}, computed in MySQL."""
+    length = LEVELS[level][0]
+    cursor.execute(f"SELECT LEFT(ts, {length}) AS bucket, BIT_XOR(CAST(CONV(LEFT(MD5(id), 16), 16, 10) AS UNSIGNED)) "
+                   f"FROM ({_union(tables, f'id, {TIMESTAMP} AS ts')}) u GROUP BY bucket", (_iso(start), _iso(end)) * len(tables))
+    return {bucket: int(digest) for bucket, digest in cursor.fetchall()}
+
+
+def mysql_ids(cursor, tables, start, end):
+    cursor.execute(_union(tables, "id"), (_iso(start), _iso(end)) * len(tables))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _differing(first, second):
+    return sorted(key for key in first.keys() | second.keys() if first.get(key, 0) != second.get(key, 0))
+
+
+def reconcile(es, cursor, tables, start, end, digest=False):
+    """Compare start <= @timestamp < end between ES and the tables; returns a report dict.
+
+    The report has the hit/row totals, the hours and minutes whose counts (or digests)
+    differ, and the sorted IDs missing from MySQL and present only in MySQL.
+    """
+    es_hours = es.counts(start, end, "hour")
+    mysql_hours = mysql_counts(cursor, tables, start, end, "hour")
+    hours = _differing(es_hours, mysql_hours)
+    logging.info(f"{sum(es_hours.values())} hits in ES, {sum(mysql_hours.values())} rows in MySQL; "
+                 f"{len(hours)} of {len(es_hours.keys() | mysql_hours.keys())} hours differ")
+    missing, extra = set(), set()
+
+    digest_hours = []
+    if digest:
+        mysql_digest = mysql_digests(cursor, tables, start, end)
+        for hour in sorted(es_hours.keys() - set(hours)):
+            hour_start, hour_end = bucket_range(hour, "hour")
+            es_ids = es.ids(hour_start, hour_end)
+            if id_digest(es_ids) != mysql_digest.get(hour, 0):
+                digest_hours.append(hour)
+                mysql_side = mysql_ids(cursor, tables, hour_start, hour_end)
+                missing |= es_ids - mysql_side
+                extra |= mysql_side - es_ids
+        logging.info(f"Digests: {len(digest_hours)} hours with equal counts have different IDs")
+
+    minutes = []
+    for hour in hours:
+        hour_start, hour_end = bucket_range(hour, "hour")
+        for minute in _differing(es.counts(hour_start, hour_end, "minute"), mysql_counts(cursor, tables, hour_start, hour_end, "minute")):
+            minutes.append(minute)
+            minute_start, minute_end = bucket_range(minute, "minute")
+            es_ids = es.ids(minute_start, minute_end)
+            mysql_side = mysql_ids(cursor, tables, minute_start, minute_end)
+            missing |= es_ids - mysql_side
+            extra |= mysql_side - es_ids
+    if hours:
+        logging.info(f"{len(minutes)} minutes differ: {len(missing)} hits missing from MySQL, {len(extra)} rows not in ES")
+    return {
+        "es_hits": sum(es_hours.values()),
+        "mysql_rows": sum(mysql_hours.values()),
+        "hours_compared": len(es_hours.keys() | mysql_hours.keys()),
+        "hours_differing": hours,
+        "digest_hours_differing": digest_hours,
+        "minutes_differing": minutes,
+        "missing": sorted(missing),
+        "extra": sorted(extra),
+    }
+
+
+def repair(es, conn, table, ids, batch_rows=500):
+    """Insert the hits with these IDs into table; returns (rows inserted, IDs ES no longer has)."""
+    cursor = conn.cursor()
+    inserted = 0
+    found = set()
+    batch = []
+    try:
+        for row_id, content, _ in es.fetch(ids):
+            found.add(row_id)
+            batch.append((row_id, content, None))
+            if len(batch) >= batch_rows:
+                inserted += insert_batch(conn, cursor, table, batch)
+                batch = []
+        if batch:
+            inserted += insert_batch(conn, cursor, table, batch)
+    finally:
+        cursor.close()
+    return inserted, sorted(set(ids) - found)
+
+
+def parse_time(value):
+    """--gte/--lte: ISO-8601, taken as UTC unless it has an offset."""
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare an ES window with the MySQL staging/processed tables by bucket counts and repair the gaps")
+    parser.add_argument("--es_url", required=True, help="Elasticsearch URL (e.g., http://host:9200/index/_search)")
+    parser.add_argument("--es_user", help="Elasticsearch username (for basic auth)")
+    parser.add_argument("--es_pass", help="Elasticsearch password (for basic auth)")
+    parser.add_argument("--api_key", help="Elasticsearch API Key (alternative to user/pass)")
+    parser.add_argument("--db_host", required=True)
+    parser.add_argument("--db_user", required=True)
+    parser.add_argument("--db_pass", required=True)
+    parser.add_argument("--db_name", required=True)
+    parser.add_argument("--db_table", required=True, help="Staging table migrate.py loads (repairs are inserted here)")
+    parser.add_argument("--processed_table", help="Processed table whose rows also count (default: --db_table without its _toprocess suffix)")
+    parser.add_argument("--gte", required=True, help="Window start (UTC ISO-8601); rounded down to the hour")
+    parser.add_argument("--lte", help="Window end (UTC ISO-8601, default: now); rounded up to the hour")
+    parser.add_argument("--digest", action="store_true", help="Also compare ID digests of the hours whose counts agree (IDs-only scroll of those hours)")
+    parser.add_argument("--repair", action="store_true", help="Fetch the hits missing from MySQL by ID and insert them into --db_table")
+    parser.add_argument("--include", help="Repair: _source includes the window was migrated with")
+    parser.add_argument("--exclude", help="Repair: _source excludes the window was migrated with")
+    parser.add_argument("--drop_hit_metadata", action="store_true", help="Repair: as migrate.py --drop_hit_metadata")
+    parser.add_argument("--drop_redundant_original", action="store_true", help="Repair: as migrate.py --drop_redundant_original")
+    parser.add_argument("--projection", help="Repair: projection profile the window was migrated with")
+    parser.add_argument("--report_json", help="Write the report (bucket differences, missing and extra IDs) here")
+    parser.add_argument("--max_retries", type=int, default=5, help="Retries for 429/5xx/connection errors from ES")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s",
+                        handlers=[logging.StreamHandler(sys.stdout)])
+
+    if not args.api_key and (not args.es_user or not args.es_pass):
+        logging.error("Error: Either --api_key or both --es_user and --es_pass must be provided.")
+        sys.exit(1)
+    try:
+        start = parse_time(args.gte).replace(minute=0, second=0, microsecond=0)
+        lte = parse_time(args.lte) if args.lte else datetime.now(timezone.utc)
+        end = lte.replace(minute=0, second=0, microsecond=0)
+        if end != lte:
+            end += timedelta(hours=1)
+        projection = Projection.from_args(args)
+    except (OSError, ValueError) as e:
+        logging.error(f"Error: {e}")
+        sys.exit(1)
+    tables = [args.db_table]
+    processed_table = args.processed_table
+    if not processed_table and args.db_table.endswith("_toprocess"):
+        processed_table = args.db_table[:-len("_toprocess")]
+    if processed_table:
+        tables.append(processed_table)
+
+    headers = {"Content-Type": "application/json"}
+    auth = None
+    if args.api_key:
+        headers["Authorization"] = f"ApiKey {args.api_key}"
+    else:
+        auth = (args.es_user, args.es_pass)
+    transport = EsTransport(args.es_url, auth, headers, RetryPolicy(args.max_retries))
+    es = EsSide(transport, projection)
+    conn = mysql_connection(args.db_host, args.db_user, args.db_pass, args.db_name)
+    cursor = conn.cursor()
+    logging.info(f"Reconciling {args.es_url} with {', '.join(tables)} from {_iso(start)}Z to {_iso(end)}Z")
+    try:
+        report = reconcile(es, cursor, tables, start, end, args.digest)
+        unresolved = len(report["missing"])
+        if args.repair and report["missing"]:
+            inserted, gone = repair(es, conn, args.db_table, report["missing"])
+            report.update(repaired=inserted, missing_from_es_now=gone)
+            unresolved = len(report["missing"]) - inserted - len(gone)
+            logging.info(f"Repair: {inserted} hits inserted into {args.db_table}"
+                         + (f", {len(gone)} no longer in ES" if gone else ""))
+    except (ValueError, requests.RequestException, mysql.connector.Error) as e:
+        logging.error(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        cursor.close()
+        conn.close()
+        transport.close()
+
+    if report["extra"]:
+        logging.warning(f"{len(report['extra'])} rows have no ES hit in this window (deleted from ES or a changed @timestamp); "
+                        f"first: {', '.join(report['extra'][:5])}")
+    if args.report_json:
+        with open(args.report_json, "w", encoding="utf-8") as f:
+            json.dump(dict(report, es_url=args.es_url, tables=tables, gte=_iso(start) + "Z", lt=_iso(end) + "Z"), f, indent=2)
+    if unresolved:
+        logging.error(f"{unresolved} hits are missing from MySQL" + ("" if args.repair else "; rerun with --repair to load them"))
+        sys.exit(1)
+    logging.info("No hits are missing from MySQL" if not report["missing"] else "All missing hits repaired")
+
+
+if __name__ == "__main__":
+    main()
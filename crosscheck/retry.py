@@ -0,0 +1,90 @@
+"""Retry policy shared by the ES and MySQL paths of migrate.py and async_engine.py."""
+import logging
+import random
+import time
+from contextlib import nullcontext
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+from metrics import registry as metrics
+
+# Statuses ES returns for overload (429, rejected execution) and unavailable nodes
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# A scroll request moves the scroll forward, so it is only retried where ES turned it
+# away before reading the page: overload (429) and an unavailable node (503)
+SCROLL_RETRY_STATUSES = {429, 503}
+
+# MySQL client/server errors worth retrying; the connection ones need a new connection
+MYSQL_CONNECTION_LOST = {2006, 2013, 2055}  # server has gone away, lost connection, lost connection (SSL/socket)
+MYSQL_TRANSIENT = MYSQL_CONNECTION_LOST | {1205, 1213, 2003}  # lock wait timeout, deadlock, can't connect
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter: attempt n sleeps uniform(0, min(max_delay, base_delay * 2**n))."""
+
+    def __init__(self, max_retries=5, base_delay=0.5, max_delay=30.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait before retry number attempt (0-based); a Retry-After header wins if longer."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after:
+            try:
+                delay = max(delay, min(self.max_delay, float(retry_after)))
+            except ValueError:
+                pass
+        return delay
+
+    def sleep(self, attempt, retry_after=None):
+        time.sleep(self.delay(attempt, retry_after))
+
+
+def mysql_errno(error):
+    """errno of a mysql.connector or PyMySQL (aiomysql) error, or None."""
+    errno = getattr(error, "errno", None)
+    if errno is None and error.args and isinstance(error.args[0], int):
+        errno = error.args[0]
+    return errno
+
+
+def connect_failed(error):
+    """Whether a requests exception means the request never reached the server."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    # requests wraps urllib3's MaxRetryError, whose reason is the underlying failure
+    return bool(error.args) and isinstance(getattr(error.args[0], "reason", None), NewConnectionError)
+
+
+def post_with_retry(session, url, retry, label, idempotent=True, gate=None, **kwargs):
+    """POST with session (a requests.Session or the requests module itself), retrying on
+    connection errors, timeouts and RETRY_STATUSES.
+
+    A request that is not idempotent (a scroll) may already have been executed when the
+    connection drops or the read times out, so it is only retried when it failed to
+    connect or got one of SCROLL_RETRY_STATUSES. With a gate (a scheduler.JobGate), every
+    attempt holds one of its slots; backoff sleeps do not.
+    Returns the last response (which may still be an error status); raises the last
+    requests exception if every attempt failed.
+    """
+    statuses = RETRY_STATUSES if idempotent else SCROLL_RETRY_STATUSES
+    attempt = 0
+    while True:
+        try:
+            with gate.slot() if gate else nullcontext():
+                response = session.post(url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt >= retry.max_retries or not (idempotent or connect_failed(e)):
+                raise
+            logging.warning(f"{label}: {e}; retrying ({attempt + 1}/{retry.max_retries})")
+            metrics.inc("retries_total")
+            retry.sleep(attempt)
+        else:
+            if response.status_code not in statuses or attempt >= retry.max_retries:
+                return response
+            logging.warning(f"{label}: HTTP {response.status_code}; retrying ({attempt + 1}/{retry.max_retries})")
+            metrics.inc("retries_total")
+            retry.sleep(attempt, response.headers.get("Retry-After"))
+        attempt += 1
@@ -0,0 +1,137 @@
+"""Shared request slots for the jobs of a migrate.py --jobs run.
+
+A FairScheduler owns a fixed number of slots (concurrent ES requests, or concurrent
+MySQL writes) that every job draws from. Each job registers once with a weight (its
+priority) and gets a JobGate; every request or write runs inside gate.slot().
+
+Slots go out by weighted fair queuing: a job is charged the time it holds each slot,
+divided by its weight, and a free slot goes to the waiting job with the least charge
+so far. A job with weight 2 therefore gets about twice the slot time of a job with
+weight 1 while both are busy, and all of it when the other is idle. A job that was
+idle starts from the current charge level instead of the credit it would otherwise
+have banked, so it cannot lock the others out when it wakes up.
+
+An optional rate limit (a token bucket) caps how many slots are handed out per second
+across all jobs, on top of the concurrency limit. A request takes its token before it
+queues for a slot, so time spent throttled is waiting time, never slot time.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import registry as metrics
+
+
+class TokenBucket:
+    """rate acquisitions per second on average, with bursts of up to burst."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Take a token, sleeping until it is due. Tokens are reserved in call order."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if delay:
+            time.sleep(delay)
+        return delay
+
+
+class JobGate:
+    """One job's handle on a FairScheduler."""
+
+    def __init__(self, scheduler, name, weight, order):
+        self.scheduler = scheduler
+        self.name = name
+        self.weight = weight
+        self.order = order
+        self.charge = 0.0
+        # Expected slot time, charged up front so concurrent grants interleave between jobs
+        self.estimate = None
+        self.waiting = 0
+        self.active = 0
+        self.granted = 0
+        self.held_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    @contextmanager
+    def slot(self):
+        estimate = self.scheduler.acquire(self)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.scheduler.release(self, estimate, time.monotonic() - started)
+
+    def describe(self):
+        return {"weight": self.weight, "granted": self.granted, "held_seconds": round(self.held_seconds, 3),
+                "wait_seconds": round(self.wait_seconds, 3)}
+
+
+class FairScheduler:
+    def __init__(self, name, slots, rate=0.0):
+        self.name = name
+        self.slots = slots
+        self.limiter = TokenBucket(rate) if rate > 0 else None
+        self.gates = []
+        self._free = slots
+        self._mean_held = None
+        self._cond = threading.Condition()
+
+    def register(self, name, weight=1.0):
+        with self._cond:
+            gate = JobGate(self, name, float(weight), len(self.gates))
+            self.gates.append(gate)
+        return gate
+
+    def _next(self):
+        waiting = [gate for gate in self.gates if gate.waiting]
+        return min(waiting, key=lambda gate: (gate.charge, gate.order)) if waiting else None
+
+    def acquire(self, gate):
+        started = time.monotonic()
+        if self.limiter:
+            # Before queuing for a slot: a throttled job must not sit on a slot, or be charged for it
+            self.limiter.wait()
+        with self._cond:
+            if not gate.waiting and not gate.active:
+                # Waking up: no credit for the time spent idle
+                busy = [other.charge for other in self.gates if other is not gate and (other.waiting or other.active)]
+                if busy:
+                    gate.charge = max(gate.charge, min(busy))
+            gate.waiting += 1
+            while not self._free or self._next() is not gate:
+                self._cond.wait()
+            gate.waiting -= 1
+            gate.active += 1
+            gate.granted += 1
+            self._free -= 1
+            estimate = gate.estimate or self._mean_held or 0.01
+            gate.charge += estimate / gate.weight
+            # Another slot may be free for another waiting job
+            self._cond.notify_all()
+            waited = time.monotonic() - started
+            gate.wait_seconds += waited
+        metrics.observe(f"{self.name}_slot_wait_seconds", waited)
+        return estimate
+
+    def release(self, gate, estimate, held):
+        with self._cond:
+            gate.active -= 1
+            gate.held_seconds += held
+            gate.charge += (held - estimate) / gate.weight
+            gate.estimate = held if gate.estimate is None else 0.8 * gate.estimate + 0.2 * held
+            self._mean_held = held if self._mean_held is None else 0.9 * self._mean_held + 0.1 * held
+            self._free += 1
+            self._cond.notify_all()
+
+    def describe(self):
+        return {gate.name: gate.describe() for gate in self.gates}
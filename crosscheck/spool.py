@@ -0,0 +1,500 @@
+"""Spool ES hits to compressed NDJSON segments, and load the segments into MySQL separately.
+
+    python spool.py --spool_dir /data/spool/cicd-20251201 extract --es_url https://host:9200/platforms.cicd/_search \
+        --api_key ... --gte 2025-12-01T00:00:00 --lte 2025-12-01T23:59:59 --slices 4
+    python spool.py --spool_dir /data/spool/cicd-20251201 load --db_host ... --db_table platforms_cicd_data_toprocess --workers 4
+    python spool.py --spool_dir /data/spool/bench import load.ndjson.gz
+    python spool.py --spool_dir /data/spool/cicd-20251201 status
+
+extract runs migrate.py's sliced scroll (same query, projection and transport) but writes
+the hits to disk instead of MySQL, so scroll contexts stay open only as long as ES takes
+to send the window, however slow MySQL is. load writes a spool into MySQL with INSERT
+IGNORE, one segment per worker; it can follow an extract that is still running (--follow),
+run later, or run again (a replay, or a MySQL benchmark without ES). import turns an NDJSON
+file of hits, such as gen_data.py output, into a spool.
+
+A spool directory holds:
+
+- segment-NNNNNN.ndjson.gz: one hit per line, the JSON text migrate.py would store. The
+  file is a series of independent gzip members of about BLOCK_BYTES of hits each, so zcat
+  reads it as one NDJSON stream and a reader can start at any member.
+- segment-NNNNNN.idx: one line per hit: the offset of its gzip member in the segment, the
+  offset of its line within the decompressed member, and its _id.
+- manifest.json: the query, the completed segments and whether the extract finished.
+  Segments are written under a .tmp name and only listed once they are complete.
+"""
+import argparse
+import concurrent.futures
+import gzip
+import io
+import json
+import logging
+import mmap
+import os
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from itertools import groupby
+
+import mysql.connector
+import requests
+
+from codec import ContentCodec, load_dictionary
+from hitstream import hit_id
+from metrics import registry as metrics, write_atomic
+from migrate import BoundedQueue, insert_batch, mysql_connection, next_batch, scroll_slice, write_with_retry
+from projection import Projection
+from retry import RetryPolicy
+from transport import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, EsTransport
+
+MANIFEST = "manifest.json"
+# Uncompressed hit bytes per gzip member: the unit a reader decompresses at once
+BLOCK_BYTES = 1024 * 1024
+DEFAULT_SEGMENT_BYTES = 256 * 1024 * 1024
+
+
+class SegmentWriter:
+    """Writes one segment and its index under .tmp names; close() renames them into place."""
+
+    def __init__(self, directory, number, level=1):
+        self.directory = directory
+        self.name = f"segment-{number:06d}.ndjson.gz"
+        self.index_name = f"segment-{number:06d}.idx"
+        self.level = level
+        self.data = open(os.path.join(directory, self.name + ".tmp"), "wb")
+        self.index = open(os.path.join(directory, self.index_name + ".tmp"), "w", encoding="utf-8")
+        self.lines = []
+        self.ids = []
+        self.block_bytes = 0
+        self.hits = 0
+        self.bytes = 0
+
+    def write(self, row_id, content):
+        if "\n" in row_id or "\r" in row_id:
+            raise ValueError(f"_id {row_id!r} contains a line break")
+        if "\n" in content or "\r" in content:
+            # Only a pretty-printed hit has raw line breaks, and only between tokens
+            content = json.dumps(json.loads(content), separators=(",", ":"), ensure_ascii=False)
+        line = content.encode("utf-8") + b"\n"
+        self.lines.append(line)
+        self.ids.append(row_id)
+        self.block_bytes += len(line)
+        self.hits += 1
+        self.bytes += len(line)
+        if self.block_bytes >= BLOCK_BYTES:
+            self._flush()
+
+    def _flush(self):
+        if not self.lines:
+            return
+        member_offset = self.data.tell()
+        line_offset = 0
+        index = []
+        for row_id, line in zip(self.ids, self.lines):
+            index.append(f"{member_offset}\t{line_offset}\t{row_id}\n")
+            line_offset += len(line)
+        self.data.write(gzip.compress(b"".join(self.lines), self.level, mtime=0))
+        self.index.write("".join(index))
+        self.lines = []
+        self.ids = []
+        self.block_bytes = 0
+
+    def close(self):
+        """Finish the segment; returns its manifest entry."""
+        self._flush()
+        stored_bytes = self.data.tell()
+        self.data.close()
+        self.index.close()
+        # The index first: a listed segment always has one
+        os.replace(os.path.join(self.directory, self.index_name + ".tmp"), os.path.join(self.directory, self.index_name))
+        os.replace(os.path.join(self.directory, self.name + ".tmp"), os.path.join(self.directory, self.name))
+        return {"name": self.name, "index": self.index_name, "hits": self.hits, "bytes": self.bytes, "stored_bytes": stored_bytes}
+
+    def abort(self):
+        self.data.close()
+        self.index.close()
+        for name in (self.name, self.index_name):
+            os.remove(os.path.join(self.directory, name + ".tmp"))
+
+
+class Spool:
+    """A spool directory and its manifest; segments may be added from several threads."""
+
+    def __init__(self, directory, manifest):
+        self.directory = directory
+        self.manifest = manifest
+        self._next_number = len(manifest["segments"]) + 1
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, directory, **details):
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(os.path.join(directory, MANIFEST)):
+            raise ValueError(f"{directory} already holds a spool; use a new directory")
+        spool = cls(directory, {"version": 1, **details, "started_at": datetime.now(timezone.utc).isoformat(),
+                                "finished_at": None, "complete": False, "hits": 0, "segments": []})
+        spool._save()
+        return spool
+
+    def new_segment(self, level=1):
+        with self._lock:
+            number = self._next_number
+            self._next_number += 1
+        return SegmentWriter(self.directory, number, level)
+
+    def add(self, entry):
+        with self._lock:
+            self.manifest["segments"].append(entry)
+            self.manifest["hits"] += entry["hits"]
+            self._save()
+
+    def finish(self, complete, **details):
+        with self._lock:
+            self.manifest.update(details, complete=complete, finished_at=datetime.now(timezone.utc).isoformat())
+            self._save()
+
+    def _save(self):
+        write_atomic(os.path.join(self.directory, MANIFEST), json.dumps(self.manifest, indent=2) + "\n")
+
+
+def read_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        raise ValueError(f"{directory} is not a spool (no {MANIFEST})")
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_segments(spool, hits, segment_bytes=DEFAULT_SEGMENT_BYTES, level=1):
+    """Write (row_id, content) pairs to new segments of spool, starting a new one every segment_bytes; returns the hit count."""
+    segment = None
+    count = 0
+    try:
+        for row_id, content in hits:
+            if segment is None:
+                segment = spool.new_segment(level)
+            segment.write(row_id, content)
+            count += 1
+            if segment.bytes >= segment_bytes:
+                spool.add(segment.close())
+                segment = None
+    except BaseException:
+        if segment is not None:
+            segment.abort()
+        raise
+    if segment is not None:
+        spool.add(segment.close())
+    return count
+
+
+def spool_worker(queue, spool, segment_bytes, level, errors):
+    """Drain the scroll queue into segments until the stop sentinel."""
+    def queued_hits():
+        carry = None
+        done = False
+        while not done:
+            batch, carry, done = next_batch(queue, carry, 1000, BLOCK_BYTES)
+            for row_id, content, _ in batch:
+                yield row_id, content
+
+    hits = queued_hits()
+    try:
+        write_segments(spool, hits, segment_bytes, level)
+    except (OSError, ValueError) as e:
+        logging.error(f"Spool writer: {e}")
+        errors.append(str(e))
+        # Keep draining, or the scroll threads would block on a full queue
+        for _ in hits:
+            pass
+
+
+def read_segment(directory, entry):
+    """Yield the hits of one segment as lists of (row_id, content), one list per gzip member."""
+    with open(os.path.join(directory, entry["index"]), encoding="utf-8") as f:
+        members = [(int(offset), [line.rstrip("\n").split("\t", 2)[2] for line in lines])
+                   for offset, lines in groupby(f, key=lambda line: line.split("\t", 1)[0])]
+    with open(os.path.join(directory, entry["name"]), "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data, memoryview(data) as view:
+        for n, (offset, ids) in enumerate(members):
+            end = members[n + 1][0] if n + 1 < len(members) else len(data)
+            lines = zlib.decompress(view[offset:end], wbits=31).split(b"\n")
+            if len(lines) - 1 != len(ids):
+                raise ValueError(f"{entry['name']}: member at {offset} has {len(lines) - 1} hits, its index {len(ids)}")
+            yield [(row_id, line.decode("utf-8")) for row_id, line in zip(ids, lines)]
+
+
+def load_segment(directory, entry, db_config, table, batch_rows=500, batch_bytes=4 * 1024 * 1024, retry=None, codec=None):
+    """INSERT IGNORE one segment into table over its own connection; returns (rows, inserted, failed)."""
+    retry = retry or RetryPolicy()
+    conn = cursor = None
+    rows = inserted_count = failed_count = 0
+    batch = []
+    size = 0
+
+    def flush():
+        nonlocal conn, cursor, inserted_count, failed_count
+        label = f"Error inserting batch of {len(batch)} rows from {entry['name']} (IDs {batch[0][0]} .. {batch[-1][0]})"
+        encoded = codec.encode_batch(batch) if codec else batch
+        inserted, conn, cursor = write_with_retry(conn, cursor, db_config, retry, label,
+                                                  lambda conn, cursor: insert_batch(conn, cursor, table, encoded))
+        if inserted is None:
+            failed_count += len(batch)
+            metrics.inc("rows_failed_total", len(batch))
+        else:
+            inserted_count += inserted
+            metrics.inc("rows_inserted_total", inserted)
+            metrics.inc("rows_skipped_total", len(batch) - inserted)
+
+    try:
+        for hits in read_segment(directory, entry):
+            for row_id, content in hits:
+                if batch and (len(batch) >= batch_rows or size + len(content) > batch_bytes):
+                    flush()
+                    batch = []
+                    size = 0
+                batch.append((row_id, content, None))
+                size += len(content)
+                rows += 1
+        if batch:
+            flush()
+    finally:
+        if conn is not None:
+            cursor.close()
+            conn.close()
+    logging.info(f"{entry['name']}: {rows} rows, {inserted_count} inserted, {rows - inserted_count - failed_count} skipped, {failed_count} failed")
+    return rows, inserted_count, failed_count
+
+
+def read_ndjson(path):
+    """Yield (row_id, content) for every hit of an NDJSON file (.gz and .zst are decompressed)."""
+    if path.endswith(".gz"):
+        f = gzip.open(path, "rb")
+    elif path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError(f"reading .zst files needs the zstandard package (pip install zstandard): {e}")
+        f = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+    else:
+        f = open(path, "rb")
+    with f:
+        for n, line in enumerate(f, 1):
+            line = line.rstrip(b"\r\n")
+            if not line:
+                continue
+            row_id = hit_id(line)
+            if row_id is None:
+                raise ValueError(f"{path}:{n}: no _id in the hit")
+            yield row_id, line.decode("utf-8")
+
+
+def extract(args, spool):
+    """Scroll the window into spool; returns (hits spooled, whether every slice and writer finished)."""
+    if args.match_all:
+        query = {"query": {"match_all": {}}}
+    else:
+        query = {"query": {"range": {"@timestamp": {"gte": args.gte, "lte": args.lte, "format": "strict_date_optional_time"}}}}
+    projection = Projection.from_args(args)
+    query = projection.apply_to_query(query)
+    spool.manifest.update(query=query, projection={"include": projection.include, "exclude": projection.exclude,
+                                                   "drop_hit_metadata": projection.drop_hit_metadata,
+                                                   "drop_redundant_original": projection.drop_redundant_original})
+
+    headers = {"Content-Type": "application/json"}
+    auth = None
+    if args.api_key:
+        headers["Authorization"] = f"ApiKey {args.api_key}"
+    else:
+        auth = (args.es_user, args.es_pass)
+    slices = max(1, args.slices)
+    queue = BoundedQueue(10000, args.queue_max_bytes)
+    errors = []
+    writers = [threading.Thread(target=spool_worker, args=(queue, spool, args.segment_bytes, args.gzip_level, errors),
+                                name=f"SpoolWriter-{i + 1}") for i in range(args.writers)]
+    for t in writers:
+        t.start()
+
+    results = [(0, False)] * slices
+    transport = EsTransport(args.es_url, auth, headers, RetryPolicy(args.max_retries), pool_size=max(2 * slices, 10),
+                            connect_timeout=args.es_connect_timeout, read_timeout=args.es_read_timeout)
+    prefetcher = concurrent.futures.ThreadPoolExecutor(slices, thread_name_prefix="ScrollPrefetch")
+    try:
+        def run_slice(slice_id):
+            results[slice_id] = scroll_slice(transport, query, args.batch_size, queue, slice_id, slices, projection=projection,
+                                             prefetcher=prefetcher)
+        fetchers = [threading.Thread(target=run_slice, args=(i,), name=f"ScrollSlice-{i + 1}") for i in range(slices)]
+        for t in fetchers:
+            t.start()
+        for t in fetchers:
+            t.join()
+    finally:
+        prefetcher.shutdown()
+        transport.close()
+        for _ in writers:
+            queue.put(None)
+        for t in writers:
+            t.join()
+
+    failed_slices = [i + 1 for i, (_, completed) in enumerate(results) if not completed]
+    spool.finish(not failed_slices and not errors, failed_slices=failed_slices, writer_errors=errors)
+    return spool.manifest["hits"], not failed_slices and not errors
+
+
+def load(args):
+    """Load every segment of the spool (following a running extract with --follow); returns the exit code."""
+    db_config = {"host": args.db_host, "user": args.db_user, "password": args.db_pass, "database": args.db_name}
+    codec = None
+    if args.content_codec == "zstd":
+        conn = mysql_connection(**db_config) if args.zstd_dict and not os.path.exists(args.zstd_dict) else None
+        try:
+            codec = ContentCodec(args.zstd_level, load_dictionary(args.zstd_dict, conn) if args.zstd_dict else None)
+        finally:
+            if conn is not None:
+                conn.close()
+        logging.info(f"Content codec: {codec.describe()}")
+    retry = RetryPolicy(args.max_retries)
+
+    submitted = set()
+    futures = []
+    stalled = False
+    with concurrent.futures.ThreadPoolExecutor(args.workers, thread_name_prefix="SpoolLoader") as executor:
+        last_manifest, changed_at = None, time.monotonic()
+        while True:
+            manifest = read_manifest(args.spool_dir)
+            for entry in manifest["segments"]:
+                if entry["name"] not in submitted:
+                    submitted.add(entry["name"])
+                    futures.append(executor.submit(load_segment, args.spool_dir, entry, db_config, args.db_table,
+                                                   args.insert_batch_rows, args.insert_batch_bytes, retry, codec))
+            if not args.follow or manifest["finished_at"]:
+                break
+            # An extract that died never sets finished_at; stop once its manifest has stopped changing
+            if manifest != last_manifest:
+                last_manifest, changed_at = manifest, time.monotonic()
+            elif args.idle_timeout and time.monotonic() - changed_at >= args.idle_timeout:
+                stalled = True
+                break
+            time.sleep(args.poll_secs)
+        results = [future.result() for future in futures]
+
+    rows = sum(result[0] for result in results)
+    inserted = sum(result[1] for result in results)
+    failed = sum(result[2] for result in results)
+    logging.info(f"Loaded {len(results)} segments into {args.db_table}: {rows} rows, {inserted} inserted, "
+                 f"{rows - inserted - failed} skipped, {failed} failed")
+    if stalled:
+        logging.error(f"{args.spool_dir} has not changed for {args.idle_timeout:g}s; its extract may have died. "
+                      f"If it is still running, load again (loaded rows are skipped), else extract the window again into a new spool")
+        return 1
+    if not manifest["complete"] and not manifest["finished_at"]:
+        logging.error(f"{args.spool_dir} is still being extracted; load it again when the extract has finished (loaded rows are skipped) or use --follow")
+        return 1
+    if not manifest["complete"]:
+        logging.error(f"{args.spool_dir} is incomplete: its extract stopped early; extract the window again into a new spool")
+        return 1
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spool ES hits to compressed NDJSON segments, and load spools into MySQL")
+    parser.add_argument("--spool_dir", required=True, help="Spool directory (extract and import create it)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    extract_parser = commands.add_parser("extract", help="Scroll an ES window into a new spool")
+    extract_parser.add_argument("--es_url", required=True, help="Elasticsearch URL (e.g., http://host:9200/index/_search)")
+    extract_parser.add_argument("--es_user", help="Elasticsearch username (for basic auth)")
+    extract_parser.add_argument("--es_pass", help="Elasticsearch password (for basic auth)")
+    extract_parser.add_argument("--api_key", help="Elasticsearch API Key (alternative to user/pass)")
+    extract_parser.add_argument("--es_connect_timeout", type=float, default=DEFAULT_CONNECT_TIMEOUT)
+    extract_parser.add_argument("--es_read_timeout", type=float, default=DEFAULT_READ_TIMEOUT)
+    extract_parser.add_argument("--gte", help="Start date (e.g., 2020-06-01T00:00:00)")
+    extract_parser.add_argument("--lte", help="End date (e.g., 2020-06-30T23:59:59)")
+    extract_parser.add_argument("--match_all", action="store_true", help="Use match_all query instead of range")
+    extract_parser.add_argument("--batch_size", type=int, default=1000, help="Batch size for Elasticsearch scroll")
+    extract_parser.add_argument("--slices", type=int, default=1, help="Number of concurrent sliced scrolls")
+    extract_parser.add_argument("--include", help="Comma-separated _source fields to fetch")
+    extract_parser.add_argument("--exclude", help="Comma-separated _source fields to leave out")
+    extract_parser.add_argument("--drop_hit_metadata", action="store_true", help="As migrate.py --drop_hit_metadata")
+    extract_parser.add_argument("--drop_redundant_original", action="store_true", help="As migrate.py --drop_redundant_original")
+    extract_parser.add_argument("--projection", help="JSON projection profile, as for migrate.py")
+    extract_parser.add_argument("--max_retries", type=int, default=5, help="Retries for 429/5xx/connection errors from ES")
+    extract_parser.add_argument("--queue_max_bytes", type=int, default=256 * 1024 * 1024, help="Max content bytes buffered between scroll and writer threads")
+    extract_parser.add_argument("--writers", type=int, default=2, help="Writer threads, each compressing into its own segment")
+    extract_parser.add_argument("--segment_bytes", type=int, default=DEFAULT_SEGMENT_BYTES, help="Start a new segment after this many uncompressed bytes")
+    extract_parser.add_argument("--gzip_level", type=int, default=1, help="gzip level of the segments (1-9)")
+
+    load_parser = commands.add_parser("load", help="INSERT IGNORE the spool's segments into a MySQL table, one segment per worker")
+    load_parser.add_argument("--db_host", required=True)
+    load_parser.add_argument("--db_user", required=True)
+    load_parser.add_argument("--db_pass", required=True)
+    load_parser.add_argument("--db_name", required=True)
+    load_parser.add_argument("--db_table", required=True)
+    load_parser.add_argument("--workers", type=int, default=4, help="Segments loaded in parallel, one MySQL connection each")
+    load_parser.add_argument("--insert_batch_rows", type=int, default=500, help="Max rows per multi-row INSERT statement")
+    load_parser.add_argument("--insert_batch_bytes", type=int, default=4 * 1024 * 1024, help="Max content bytes per INSERT statement")
+    load_parser.add_argument("--max_retries", type=int, default=5, help="Retries for transient MySQL errors")
+    load_parser.add_argument("--content_codec", choices=["json", "zstd"], default="json", help="As migrate.py --content_codec")
+    load_parser.add_argument("--zstd_level", type=int, default=3)
+    load_parser.add_argument("--zstd_dict", help="As migrate.py --zstd_dict")
+    load_parser.add_argument("--follow", action="store_true", help="Keep loading new segments until the extract writing the spool finishes")
+    load_parser.add_argument("--poll_secs", type=float, default=5.0, help="--follow: seconds between manifest checks")
+    load_parser.add_argument("--idle_timeout", type=float, default=900.0,
+                             help="--follow: give up when the manifest has not changed for this many seconds (0 waits forever)")
+
+    import_parser = commands.add_parser("import", help="Create a spool from NDJSON files of hits (e.g. gen_data.py output; .gz/.zst allowed)")
+    import_parser.add_argument("files", nargs="+")
+    import_parser.add_argument("--segment_bytes", type=int, default=DEFAULT_SEGMENT_BYTES, help="Start a new segment after this many uncompressed bytes")
+    import_parser.add_argument("--gzip_level", type=int, default=1, help="gzip level of the segments (1-9)")
+
+    commands.add_parser("status", help="Summarize the spool's manifest")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s",
+                        handlers=[logging.StreamHandler(sys.stdout)])
+
+    try:
+        if args.command == "extract":
+            if not args.api_key and (not args.es_user or not args.es_pass):
+                logging.error("Error: Either --api_key or both --es_user and --es_pass must be provided.")
+                sys.exit(1)
+            if not args.match_all and (not args.gte or not args.lte):
+                logging.error("Error: --gte and --lte required unless --match_all is used.")
+                sys.exit(1)
+            spool = Spool.create(args.spool_dir, es_url=args.es_url, slices=max(1, args.slices))
+            started = time.monotonic()
+            hits, complete = extract(args, spool)
+            if not complete:
+                logging.error(f"Extract stopped early: {hits} hits in {len(spool.manifest['segments'])} segments; the spool is marked incomplete")
+                sys.exit(1)
+            logging.info(f"Extract completed: {hits} hits in {len(spool.manifest['segments'])} segments in {time.monotonic() - started:.1f}s")
+        elif args.command == "load":
+            sys.exit(load(args))
+        elif args.command == "import":
+            missing = [path for path in args.files if not os.path.isfile(path)]
+            if missing:
+                logging.error(f"Error: no such file(s): {', '.join(missing)}")
+                sys.exit(1)
+            spool = Spool.create(args.spool_dir, source=args.files)
+            hits = sum(write_segments(spool, read_ndjson(path), args.segment_bytes, args.gzip_level) for path in args.files)
+            spool.finish(True)
+            logging.info(f"Imported {hits} hits into {len(spool.manifest['segments'])} segments")
+        else:
+            manifest = read_manifest(args.spool_dir)
+            raw = sum(entry["bytes"] for entry in manifest["segments"])
+            stored = sum(entry["stored_bytes"] for entry in manifest["segments"])
+            state = "complete" if manifest["complete"] else "being extracted" if not manifest["finished_at"] else "incomplete"
+            print(f"{args.spool_dir}: {state}, {manifest['hits']} hits in {len(manifest['segments'])} segments, "
+                  f"{raw / (1024 * 1024):.1f} MiB stored as {stored / (1024 * 1024):.1f} MiB"
+                  + (f" (ratio {raw / stored:.2f})" if stored else ""))
+            print(f"source: {manifest.get('es_url') or ', '.join(manifest.get('source', []))}")
+            if manifest.get("query"):
+                print(f"query: {json.dumps(manifest['query'])}")
+    except (ImportError, OSError, ValueError, requests.RequestException, mysql.connector.Error) as e:
+        logging.error(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
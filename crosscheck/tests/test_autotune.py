@@ -0,0 +1,100 @@
+import pytest
+
+import autotune
+from autotune import Autotuner
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    class Clock:
+        now = 1000.0
+
+        def monotonic(self):
+            return self.now
+    clock = Clock()
+    monkeypatch.setattr(autotune.time, "monotonic", clock.monotonic)
+    return clock
+
+
+def interval(clock, tuner, latency, batches=10, rows=100, failed=0):
+    """Report one interval of batches; the last one triggers a decision."""
+    for i in range(batches):
+        if i == batches - 1:
+            clock.now += tuner.interval
+        tuner.record(rows, latency, failed=i < failed)
+
+
+def tuner_for(clock, fill=0.0, **options):
+    options = dict(dict(target_latency=1.0, interval=10.0, min_batch_rows=50, max_batch_rows=1000, step_rows=100), **options)
+    return Autotuner(500, 8, queue_fill=lambda: fill, **options)
+
+
+def test_starts_in_the_middle_within_limits(clock):
+    assert (tuner_for(clock).batch_rows, tuner_for(clock).workers) == (500, 4)
+    assert Autotuner(10, 1, min_batch_rows=50).batch_rows == 50
+    assert Autotuner(10 ** 6, 1, max_batch_rows=5000).workers == 1
+    assert Autotuner(10 ** 6, 1, max_batch_rows=5000).batch_rows == 5000
+
+
+def test_no_decision_before_the_interval(clock):
+    tuner = tuner_for(clock)
+    for _ in range(100):
+        tuner.record(100, 5.0)
+    assert (tuner.batch_rows, tuner.decisions) == (500, 0)
+
+
+def test_additive_increase_up_to_the_maximum(clock):
+    tuner = tuner_for(clock)
+    for expected in (600, 700, 800, 900, 1000, 1000):
+        interval(clock, tuner, 0.2)
+        assert tuner.batch_rows == expected
+    # Queue nearly empty: ES is the bottleneck, workers are left alone
+    assert tuner.workers == 4
+
+
+def test_multiplicative_decrease_down_to_the_minimum(clock):
+    tuner = tuner_for(clock)
+    for expected in (250, 125, 62, 50, 50):
+        interval(clock, tuner, 1.5)
+        assert tuner.batch_rows == expected
+    assert tuner.workers == 4
+
+
+def test_far_over_target_halves_the_workers(clock):
+    tuner = tuner_for(clock)
+    interval(clock, tuner, 2.5)
+    assert (tuner.batch_rows, tuner.workers) == (250, 2)
+    interval(clock, tuner, 2.5)
+    interval(clock, tuner, 2.5)
+    assert tuner.workers == 1
+
+
+def test_a_failed_batch_backs_off(clock):
+    tuner = tuner_for(clock, fill=0.9)
+    interval(clock, tuner, 0.1, failed=1)
+    assert (tuner.batch_rows, tuner.workers) == (250, 2)
+
+
+def test_backed_up_queue_adds_workers_up_to_the_maximum(clock):
+    tuner = tuner_for(clock, fill=0.9)
+    for expected in (5, 6, 7, 8, 8):
+        # Throughput keeps rising, so each added worker stays
+        interval(clock, tuner, 0.2, batches=10 * expected)
+        assert tuner.workers == expected
+    assert tuner.is_active(7) and not tuner.is_active(8)
+
+
+def test_a_worker_that_did_not_help_is_removed(clock):
+    tuner = tuner_for(clock, fill=0.9)
+    interval(clock, tuner, 0.2, batches=20)
+    assert tuner.workers == 5
+    interval(clock, tuner, 0.2, batches=10)
+    assert tuner.workers == 4
+
+
+def test_describe(clock):
+    tuner = tuner_for(clock)
+    interval(clock, tuner, 0.2)
+    result = tuner.describe(1000)
+    assert result["batch_rows"] == 600 and result["active_workers"] == 4
+    assert result["max_workers"] == 8 and result["decisions"] == 1
@@ -0,0 +1,86 @@
+from checkpoint import CheckpointStore, CheckpointTracker, job_key
+from migrate import resume_query
+
+
+def open_tracker(path, job="job"):
+    store = CheckpointStore(str(path))
+    return store, CheckpointTracker(store, job, store.load(job))
+
+
+def test_checkpoint_moves_only_past_a_committed_prefix(tmp_path):
+    store, tracker = open_tracker(tmp_path / "ck.db")
+    first = tracker.start_page(0, [100], "a", 2)
+    second = tracker.start_page(0, [200], "b", 1)
+    third = tracker.start_page(0, [300], "c", 1)
+
+    # Later pages commit first: nothing is durable until the first page is
+    tracker.ack(second)
+    tracker.ack(third)
+    assert store.load("job") == {}
+    tracker.ack(first)
+    assert store.load("job") == {}
+    tracker.ack(first)
+    assert store.load("job")[0] == {"sort_key": [300], "last_id": "c", "rows_committed": 4, "done": False}
+
+
+def test_partial_page_holds_the_checkpoint(tmp_path):
+    store, tracker = open_tracker(tmp_path / "ck.db")
+    first = tracker.start_page(0, [100], "a", 1)
+    second = tracker.start_page(0, [200], "b", 3)
+    tracker.ack(first)
+    tracker.ack(second, 2)
+    assert store.load("job")[0]["sort_key"] == [100]
+    tracker.ack(second)
+    assert store.load("job")[0]["sort_key"] == [200]
+
+
+def test_slices_are_independent(tmp_path):
+    store, tracker = open_tracker(tmp_path / "ck.db")
+    a = tracker.start_page(0, [100], "a", 1)
+    tracker.start_page(1, [50], "x", 1)
+    tracker.ack(a)
+    assert set(store.load("job")) == {0}
+
+
+def test_empty_page_advances_at_once_and_finish_marks_done(tmp_path):
+    store, tracker = open_tracker(tmp_path / "ck.db")
+    tracker.start_page(0, [100], "a", 0)
+    assert store.load("job")[0]["sort_key"] == [100]
+    last = tracker.start_page(0, [200], "b", 1)
+    tracker.finish_slice(0)
+    assert not store.load("job")[0]["done"]
+    tracker.ack(last)
+    assert store.load("job")[0] == {"sort_key": [200], "last_id": "b", "rows_committed": 1, "done": True}
+
+
+def test_resume_continues_from_the_saved_state(tmp_path):
+    path = tmp_path / "ck.db"
+    store, tracker = open_tracker(path)
+    tracker.ack(tracker.start_page(0, [100], "a", 2), 2)
+    tracker.start_page(0, [200], "b", 1)  # never committed
+    tracker.ack(tracker.start_page(1, [150], "m", 1))
+    tracker.finish_slice(1)
+    store.close()
+
+    store, tracker = open_tracker(path)
+    resumed = store.load("job")
+    assert resumed[0] == {"sort_key": [100], "last_id": "a", "rows_committed": 2, "done": False}
+    assert resumed[1]["done"]
+    assert store.load("other job") == {}
+    # Rows committed before the restart keep counting
+    tracker.ack(tracker.start_page(0, [200], "b", 1))
+    assert store.load("job")[0]["rows_committed"] == 3
+
+
+def test_resume_query_restarts_at_the_checkpoint():
+    query = {"query": {"range": {"@timestamp": {"gte": "2025-12-01T00:00:00", "lte": "2025-12-01T23:59:59"}}}}
+    assert resume_query(query, None) == dict(query, sort=[{"@timestamp": "asc"}])
+    body = resume_query(query, {"sort_key": [1764590400000], "last_id": "a"})
+    assert body["sort"] == [{"@timestamp": "asc"}]
+    assert body["query"]["bool"]["filter"] == [
+        query["query"], {"range": {"@timestamp": {"gte": 1764590400000, "format": "epoch_millis"}}}]
+
+
+def test_job_key_is_stable():
+    assert job_key("url", "table", 2) == job_key("url", "table", 2)
+    assert job_key("url", "table", 2) != job_key("url", "table", 4)
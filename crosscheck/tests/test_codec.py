@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+pytest.importorskip("zstandard")
+
+from codec import ContentCodec, ContentReader, load_dictionary, train_dictionary  # noqa: E402
+
+
+def samples(count):
+    return [json.dumps({"_index": "platforms.cicd", "_id": f"id{i}",
+                        "_source": {"eventData": {"type": "pipeline.build", "status": "SUCCESS" if i % 3 else "FAILURE",
+                                                  "duration_ms": i * 37, "url": f"https://jenkins.example.com/job/app-{i}/"}}})
+            for i in range(count)]
+
+
+def test_round_trip_without_dictionary():
+    codec = ContentCodec(level=3)
+    reader = ContentReader()
+    for content in samples(5) + ["", "é€😀"]:
+        assert reader.decode(codec.encode(content)) == content
+
+
+def test_dictionary_frames_need_their_dictionary():
+    dictionary = train_dictionary(samples(2000), dict_size=4096)
+    codec = ContentCodec(dictionary=dictionary)
+    content = samples(2001)[-1]
+    frame = codec.encode(content)
+    assert len(frame) < len(ContentCodec().encode(content))
+    assert ContentReader({codec.dict_id: dictionary}).decode(frame) == content
+    with pytest.raises(ValueError, match=str(codec.dict_id)):
+        ContentReader().decode(frame)
+
+
+def test_plain_values_pass_through():
+    reader = ContentReader()
+    assert reader.decode('{"a": 1}') == '{"a": 1}'
+    assert reader.decode(b'{"a": 1}') == '{"a": 1}'
+    assert reader.decode(bytearray(b"[]")) == "[]"
+
+
+def test_encode_batch_keeps_ids_and_marks():
+    codec = ContentCodec()
+    batch = [(f"id{i}", content, ("slice", i)) for i, content in enumerate(samples(3))]
+    encoded = codec.encode_batch(batch)
+    assert [(row_id, mark) for row_id, _, mark in encoded] == [(row_id, mark) for row_id, _, mark in batch]
+    assert [ContentReader().decode(content) for _, content, _ in encoded] == [content for _, content, _ in batch]
+
+
+def test_load_dictionary_from_file(tmp_path):
+    path = tmp_path / "cicd.dict"
+    path.write_bytes(b"dictionary bytes")
+    assert load_dictionary(str(path)) == b"dictionary bytes"
+    with pytest.raises(ValueError):
+        load_dictionary(str(tmp_path / "missing.dict"))
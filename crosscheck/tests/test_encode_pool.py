@@ -0,0 +1,82 @@
+import json
+from multiprocessing import shared_memory
+
+import pytest
+
+from encode_pool import EncodePool
+from hitstream import parse_scroll_page
+from projection import Projection
+
+
+def page(count, pad=20, start=0):
+    hits = []
+    for i in range(start, start + count):
+        source = {"message": f"m{i}", "pad": "x" * pad}
+        if i % 2:
+            source["event"] = {"original": json.dumps({"message": f"m{i}"})}
+        hits.append({"_index": "logs", "_id": f"id-{i}", "_source": source, "sort": [i]})
+    return json.dumps({"_scroll_id": "s1", "hits": {"total": {"value": count, "relation": "eq"}, "hits": hits}}).encode()
+
+
+def gone(name):
+    try:
+        shared_memory.SharedMemory(name=name).close()
+    except FileNotFoundError:
+        return True
+    return False
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = EncodePool(1, Projection(drop_redundant_original=True))
+    yield pool
+    pool.close()
+
+
+def test_page_matches_the_in_process_path(pool):
+    body = page(50)
+    scroll_id, hits = pool.decode_page(body)
+    expected_id, expected = parse_scroll_page(body)
+    expected = Projection(drop_redundant_original=True).transform_hits(expected)
+    assert scroll_id == expected_id == "s1"
+    assert hits == expected
+    assert sum('"original"' in content for _, content, _ in hits) == 0
+
+
+def test_bad_page_raises_in_the_caller(pool):
+    with pytest.raises(ValueError):
+        pool.decode_page(b'{"_scroll_id": "s1", "hits": {"hits": [{"_id": ')
+    # The pool keeps working after a worker error
+    assert len(pool.decode_page(page(3))[1]) == 3
+
+
+def test_segments_are_reused_grown_and_unlinked():
+    pool = EncodePool(1)
+    try:
+        pool.decode_page(page(5))
+        small = pool._local.segment.name
+        pool.decode_page(page(5, start=5))
+        assert pool._local.segment.name == small
+        # A page larger than the segment replaces it, and the old one is unlinked at once
+        scroll_id, hits = pool.decode_page(page(2000, pad=1000))
+        assert len(hits) == 2000 and hits[-1][0] == "id-1999"
+        large = pool._local.segment.name
+        assert large != small and gone(small) and not gone(large)
+    finally:
+        pool.close()
+    assert gone(large)
+    assert pool._segments == []
+
+
+def test_zstd_contents_come_back_compressed():
+    pytest.importorskip("zstandard")
+    from codec import ContentCodec, ContentReader
+    body = page(20)
+    pool = EncodePool(1, codec=ContentCodec(level=3))
+    try:
+        _, hits = pool.decode_page(body)
+    finally:
+        pool.close()
+    reader = ContentReader()
+    assert all(isinstance(content, bytes) for _, content, _ in hits)
+    assert [(row_id, reader.decode(content), sort) for row_id, content, sort in hits] == parse_scroll_page(body)[1]
@@ -0,0 +1,134 @@
+import json
+
+import pytest
+
+from flatten import (FlattenConfig, auto_detect_relationships, column_value, convert_datetime, extract, flatten_docs,
+                     insert_order, write_batch)
+
+CONFIG = {
+    "name": "cicd_runs", "baseTableName": "cicd",
+    "whereConditions": [{"field": "_source.tool", "operator": "=", "value": "Jenkins"},
+                        {"field": "_source.pipeline", "operator": "IS NOT NULL"}],
+    "tables": [
+        {"name": "run_ask", "columns": [{"name": "id", "type": "INT", "isPrimaryKey": True},
+                                        {"name": "run_id", "type": "INT"}, {"name": "ask_id", "type": "VARCHAR(64)"}]},
+        {"name": "run", "columns": [{"name": "id", "type": "INT", "isPrimaryKey": True},
+                                    {"name": "es_id", "type": "VARCHAR(64)"}, {"name": "started_at", "type": "DATETIME"},
+                                    {"name": "first_ask", "type": "VARCHAR(64)"}]},
+    ],
+    "mappings": [
+        {"sourcePath": "_id", "targetTable": "run", "targetColumn": "es_id"},
+        {"sourcePath": "_source.@timestamp", "targetTable": "run", "targetColumn": "started_at"},
+        {"sourcePath": "_source.pipeline.askId", "targetTable": "run", "targetColumn": "first_ask"},
+        {"sourcePath": "_source.pipeline.askId", "targetTable": "run_ask", "targetColumn": "ask_id"},
+    ],
+}
+
+
+def hit(row_id, asks, tool="Jenkins"):
+    return {"_id": row_id, "_source": {"@timestamp": "2025-12-01T12:30:00.000Z", "tool": tool, "pipeline": {"askId": asks}}}
+
+
+class FakeCursor:
+    """Records INSERTs and hands out consecutive AUTO_INCREMENT IDs per table."""
+
+    def __init__(self):
+        self.inserts = []
+        self.next_id = {}
+
+    def execute(self, sql, params):
+        table = sql.split("`")[1]
+        columns = sql[sql.index("(") + 1:sql.index(")")].replace("`", "").split(", ")
+        rows = [dict(zip(columns, params[i:i + len(columns)])) for i in range(0, len(params), len(columns))]
+        self.lastrowid = self.next_id.get(table, 1)
+        self.next_id[table] = self.lastrowid + len(rows)
+        self.inserts.extend((table, row) for row in rows)
+
+
+def test_values():
+    assert convert_datetime("2025-12-01T12:30:00.000Z") == "2025-12-01 12:30:00"
+    assert convert_datetime("not a date") == "not a date"
+    assert column_value(["a", "b"]) == "a" and column_value([]) is None
+    assert column_value({"k": [1]}) == '{"k":[1]}'
+    assert extract({"a": {"b": [{"c": 1}]}}, ["a", "b", "0", "c"]) == 1
+    assert extract({"a": 1}, ["a", "b"]) is None
+
+
+def test_relationships_and_order():
+    config = FlattenConfig.from_dict(CONFIG)
+    assert config.relationships == [{"parentTable": "run", "childTable": "run_ask", "foreignKeyColumn": "run_id",
+                                     "parentKeyColumn": "id"}]
+    assert [plan.name for plan in config.plans] == ["run", "run_ask"]
+    with pytest.raises(ValueError, match="Circular"):
+        insert_order(["a", "b"], [{"parentTable": "a", "childTable": "b"}, {"parentTable": "b", "childTable": "a"}])
+    assert auto_detect_relationships([{"name": "x", "columns": [{"name": "y_id"}]}]) == []
+
+
+def test_where_conditions():
+    config = FlattenConfig.from_dict(CONFIG)
+    assert config.matches(hit("a", ["A1"]))
+    assert not config.matches(hit("a", ["A1"], tool="GitHub"))
+    assert not config.matches({"_id": "a", "_source": {"tool": "Jenkins"}})
+
+
+@pytest.mark.parametrize("increment", [1, None])
+def test_flatten_fans_out_arrays_under_their_parent(increment):
+    cursor = FakeCursor()
+    written = flatten_docs(cursor, FlattenConfig.from_dict(CONFIG),
+                           [("a", hit("a", ["A1", "A2"])), ("b", hit("b", ["B1"]))], increment)
+    assert written == {"run": 2, "run_ask": 3}
+    runs = [row for table, row in cursor.inserts if table == "run"]
+    assert runs == [{"es_id": "a", "started_at": "2025-12-01 12:30:00", "first_ask": "A1"},
+                    {"es_id": "b", "started_at": "2025-12-01 12:30:00", "first_ask": "B1"}]
+    asks = [(row["ask_id"], row["run_id"]) for table, row in cursor.inserts if table == "run_ask"]
+    assert asks == [("A1", 1), ("A2", 1), ("B1", 2)]
+
+
+class ArchiveCursor(FakeCursor):
+    """A FakeCursor with an archive table, transactions and scripted MySQL errors."""
+
+    def __init__(self):
+        super().__init__()
+        self.archived = set()
+        self.pending = []
+        self.commit_errors = []
+
+    def execute(self, sql, params):
+        if sql.startswith("SELECT"):
+            self.rows = [(row_id,) for row_id in params if row_id in self.archived]
+        elif sql.startswith("INSERT IGNORE INTO `cicd`"):
+            self.pending.extend(params[::2])
+        elif "'b'" in repr(params) and "`run`" in sql:
+            raise Exception(1366, "Incorrect datetime value")
+        else:
+            super().execute(sql, params)
+
+    def fetchall(self):
+        return self.rows
+
+    def commit(self):
+        error = self.commit_errors.pop(0) if self.commit_errors else None
+        if error:
+            self.pending = []
+            raise error
+        self.archived.update(self.pending)
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+
+def test_write_batch_retry_counts_hits_committed_one_by_one():
+    cursor = ArchiveCursor()
+    config = FlattenConfig.from_dict(CONFIG)
+    items = [(row_id, json.dumps(hit(row_id, ["A"])), None) for row_id in "abc"]
+    progress = {}
+    # b fails the batch for good, so the hits go one by one; c's commit then hits a deadlock
+    cursor.commit_errors = [None, None, Exception(1213, "Deadlock found")]
+    with pytest.raises(Exception, match="Deadlock"):
+        write_batch(cursor, cursor, config, items, 1, progress)
+    assert cursor.archived == {"a", "b"}
+    # The retry sees a and b archived but reports them as this batch's work
+    assert write_batch(cursor, cursor, config, items, 1, progress) == (3, 0, 1)
+    assert cursor.archived == {"a", "b", "c"}
+    assert write_batch(cursor, cursor, config, items, 1) == (0, 3, 0)
@@ -0,0 +1,73 @@
+import gzip
+import json
+import os
+import random
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import gen_data  # noqa: E402
+
+NOW = datetime(2025, 12, 1, 12, 0, 0)
+COUNT = gen_data.SHARD_RECORDS + 500
+
+
+def generate(tmp_path, name, *args):
+    path = tmp_path / name
+    gen_data.main(["--count", str(COUNT), "--now", NOW.isoformat(), "--no_db", "--output", str(path), *args])
+    return path.read_bytes()
+
+
+def test_output_depends_only_on_the_seed(tmp_path):
+    one = generate(tmp_path, "one.ndjson", "--seed", "7", "--workers", "1")
+    assert one.count(b"\n") == COUNT
+    assert generate(tmp_path, "two.ndjson", "--seed", "7", "--workers", "2") == one
+    assert generate(tmp_path, "other.ndjson", "--seed", "8", "--workers", "1") != one
+    assert gzip.decompress(generate(tmp_path, "one.ndjson.gz", "--seed", "7", "--workers", "3")) == one
+
+
+def test_records_can_be_regenerated_from_any_offset():
+    start = gen_data.SHARD_RECORDS - 3
+    lines = [content for rows, _ in gen_data.iter_shards(gen_data.SHARD_RECORDS + 5, 7, 1, NOW) for _, content in rows]
+    records = list(gen_data.generate_records(gen_data.SHARD_RECORDS + 5, 7, NOW, start=start))
+    assert [json.dumps(record) for record in records] == lines[start:]
+
+
+def shape(value):
+    """The keys and value types of a record, without the values."""
+    if isinstance(value, dict):
+        return {key: shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [shape(item) for item in value[:1]]
+    return type(value).__name__
+
+
+def test_batch_serializes_like_json_dumps():
+    for record, content in gen_data.iter_batch(2000, random.Random(3), NOW):
+        assert content == json.dumps(record)
+
+
+@pytest.mark.parametrize("event_type", gen_data.event_types)
+def test_batch_records_have_the_per_record_shape(event_type):
+    rng = random.Random(5)
+    per_record = next(record for record in (gen_data.generate_record(i, rng, NOW) for i in range(10000))
+                      if record["_source"]["eventData"]["type"] == event_type)
+    batch = next(record for record in gen_data.generate_batch(2000, random.Random(5), NOW)
+                 if record["_source"]["eventData"]["type"] == event_type)
+    assert shape(batch) == shape(per_record)
+    # event.original holds the parsed fields, as in generate_record()
+    original = json.loads(batch["_source"]["event"]["original"])
+    assert all(batch["_source"][key] == value for key, value in original.items())
+    assert set(original) == set(json.loads(per_record["_source"]["event"]["original"]))
+
+
+def test_batch_values_come_from_the_same_pools():
+    records = gen_data.generate_batch(5000, random.Random(9), NOW)
+    assert {record["_source"]["eventData"]["type"] for record in records} == set(gen_data.event_types)
+    assert {record["_source"]["pipelineData"]["projectKey"] for record in records} <= set(gen_data.project_keys)
+    assert {record["_source"]["eventData"]["status"] for record in records} <= set(gen_data.statuses)
+    assert {record["_source"]["@timestamp"][:10] for record in records} == {
+        f"{NOW - gen_data.timedelta(days=days):%Y-%m-%d}" for days in range(31)}
+    assert all(1 <= len(record["_source"]["pipelineData"]["askId"]) <= 4 for record in records)
@@ -0,0 +1,102 @@
+import json
+import random
+
+import pytest
+
+from hitstream import _exact_hits, _envelope, _fast_hits, hit_id, page_total, parse_scroll_page
+
+ID_CHARS = "abcXYZ019-_ é€😀\"\\/\t\n\x01"
+
+
+def page(hits, **options):
+    return json.dumps({"_scroll_id": "scroll-1", "took": 3, "hits": {"total": {"value": len(hits), "relation": "eq"},
+                                                                        "hits": hits}}, **options).encode("utf-8")
+
+
+def hit(row_id, source=None, sort=None):
+    doc = {"_index": "platforms.cicd", "_id": row_id, "_score": None, "_source": source or {"a": 1}}
+    if sort is not None:
+        doc["sort"] = sort
+    return doc
+
+
+def expected(body):
+    return [(doc["_id"], doc, doc.get("sort")) for doc in json.loads(body)["hits"]["hits"]]
+
+
+def parsed(body):
+    scroll_id, hits = parse_scroll_page(body)
+    assert scroll_id == json.loads(body)["_scroll_id"]
+    return [(row_id, json.loads(raw), sort) for row_id, raw, sort in hits]
+
+
+def fast_path(body):
+    _, pos, _ = _envelope(body)
+    return _fast_hits(body, pos)
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("separators", [(",", ":"), None])
+def test_matches_json_loads(separators, ensure_ascii):
+    rng = random.Random(7)
+    docs = [hit("".join(rng.choices(ID_CHARS, k=rng.randint(1, 12))), {"n": i, "s": "x},{\"_index\":1"}, [1764590400000 + i])
+            for i in range(300)]
+    body = page(docs, separators=separators, ensure_ascii=ensure_ascii)
+    assert parsed(body) == expected(body)
+
+
+@pytest.mark.parametrize("row_id", ["tab\there", "a\\b", 'q"uote', 'end\\', 'end"', "é€😀", "é", "/\\/"])
+def test_escaped_and_non_ascii_ids(row_id):
+    for ensure_ascii in (True, False):
+        body = page([hit("plain"), hit(row_id, sort=[1]), hit(row_id)], separators=(",", ":"), ensure_ascii=ensure_ascii)
+        assert [row[0] for row in parsed(body)] == ["plain", row_id, row_id]
+        # The compact page takes the fast path, which must agree with the exact tokenizer
+        _, pos, _ = _envelope(body)
+        assert fast_path(body) == _exact_hits(body, pos)
+
+
+def test_fast_path_keeps_raw_bytes():
+    body = page([hit("a", sort=[5, 6]), hit("b", sort=["x", 1])], separators=(",", ":"))
+    spans = fast_path(body)
+    assert [(row_id, sort) for row_id, _, _, sort in spans] == [("a", [5, 6]), ("b", ["x", 1])]
+    assert [json.loads(body[start:end]) for _, start, end, _ in spans] == json.loads(body)["hits"]["hits"]
+
+
+def test_separator_inside_last_source_falls_back():
+    body = (b'{"_scroll_id":"s","hits":{"hits":[{"_index":"i","_id":"1","_source":{}},'
+            b'{"_index":"i","_id":"2","_source":{"r":[{"k":0},{"_index":"x"},[2]]}}]}}')
+    assert fast_path(body) is None
+    assert parsed(body) == expected(body)
+
+
+def test_nested_first_key_in_middle_hit():
+    docs = [hit("1"), hit("2", {"list": [{"_index": "x"}, {"_index": "y"}]}), hit("3")]
+    body = page(docs, separators=(",", ":"))
+    assert parsed(body) == expected(body)
+
+
+def test_empty_and_missing_hits():
+    assert parse_scroll_page(page([])) == ("scroll-1", [])
+    assert parse_scroll_page(b'{"_scroll_id":"s","hits":{"total":0}}') == ("s", [])
+
+
+def test_page_total():
+    assert page_total(page([hit("1"), hit("2")])) == (2, "eq")
+    assert page_total(page([hit("1")], separators=(",", ":"))) == (1, "eq")
+    assert page_total(b'{"_scroll_id":"s","hits":{"total":{"value":10000,"relation":"gte"},"hits":[]}}') == (10000, "gte")
+    # rest_total_hits_as_int
+    assert page_total(b'{"_scroll_id":"s","hits":{"total":7,"hits":[]}}') == (7, "eq")
+    # Left out by filter_path, or a "total" that is not hits.total
+    assert page_total(b'{"_scroll_id":"s","hits":{"hits":[]}}') is None
+    assert page_total(b'{"_shards":{"total":5},"hits":{"hits":[{"_id":"1","_source":{"total":3}}]}}') is None
+
+
+def test_truncated_page_raises():
+    body = page([hit("1"), hit("2")], separators=(",", ":"))
+    with pytest.raises(ValueError):
+        parse_scroll_page(body[:-10])
+
+
+def test_hit_id():
+    assert hit_id(json.dumps(hit("a\\b\"é")).encode("utf-8")) == "a\\b\"é"
+    assert hit_id(b'{"_source":{}}') is None
@@ -0,0 +1,132 @@
+import hashlib
+import struct
+import sys
+from array import array
+
+import pytest
+
+from idindex import IdIndex, count_rows, id_digest
+
+
+class FakeCursor:
+    """Answers IdIndex.from_tables(): the table lookup, then the sorted digests in pages."""
+
+    def __init__(self, tables, ids, counts=None):
+        self.tables = tables
+        self.digests = sorted({id_digest(row_id) for row_id in ids})
+        self.counts = counts or {}
+        self.sql = []
+
+    def execute(self, sql, params=None):
+        self.sql.append(sql)
+        if "information_schema" in sql:
+            self.rows = [(table,) for table in params if table in self.tables]
+        elif sql.startswith("SELECT COUNT(*)"):
+            self.rows = [(self.counts.get(sql.split()[-1], 0),)]
+        else:
+            self.rows = [(str(digest),) for digest in self.digests]
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+
+def test_digest_matches_the_sql_expression():
+    # CONV(LEFT(MD5(id), 16), 16, 10)
+    for row_id in ("abc", "é€", ""):
+        assert id_digest(row_id) == int(hashlib.md5(row_id.encode("utf-8")).hexdigest()[:16], 16)
+
+
+def test_membership_and_filter():
+    index = IdIndex(array("Q", sorted(id_digest(row_id) for row_id in ("a", "b"))))
+    index.add_many(["c"])
+    assert "a" in index and "c" in index and "d" not in index
+    assert len(index) == 3
+    hits = [("a", "{}", None), ("d", "{}", None), ("c", "{}", None), ("e", "{}", None)]
+    assert index.filter_new(hits) == [("d", "{}", None), ("e", "{}", None)]
+    assert index.filtered == 2
+
+
+def test_save_merges_and_load_round_trips(tmp_path):
+    path = str(tmp_path / "ids.idx")
+    index = IdIndex(array("Q", sorted(id_digest(row_id) for row_id in ("a", "m", "z"))), ["t_toprocess", "t"])
+    index.add_many(["b", "m", "y"])
+    index.save(path, 7)
+    assert len(index) == 5
+    loaded = IdIndex.load(path)
+    assert len(loaded) == 5
+    assert loaded.tables == ["t_toprocess", "t"] and loaded.rows == 7
+    assert list(loaded._sorted) == sorted(loaded._sorted)
+    assert all(row_id in loaded for row_id in "abmyz")
+    assert "c" not in loaded
+
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not an index")
+    with pytest.raises(ValueError):
+        IdIndex.load(str(path))
+
+
+def test_file_is_little_endian(tmp_path, monkeypatch):
+    path = str(tmp_path / "ids.idx")
+    digests = sorted(id_digest(row_id) for row_id in ("a", "b"))
+    IdIndex(array("Q", digests), ["t"]).save(path, 2)
+    data = open(path, "rb").read()
+    assert data.endswith(b"".join(digest.to_bytes(8, "little") for digest in digests))
+    # A big-endian host swaps on the way out and back in
+    monkeypatch.setattr(sys, "byteorder", "big" if sys.byteorder == "little" else "little")
+    swapped = str(tmp_path / "swapped.idx")
+    IdIndex(array("Q", digests), ["t"]).save(swapped, 2)
+    assert open(swapped, "rb").read() != data
+    assert list(IdIndex.load(swapped)._sorted) == digests
+
+
+def test_mismatch():
+    index = IdIndex(array("Q"), ["t_toprocess", "t"], rows=10)
+    assert index.mismatch(["t_toprocess", "t"], 10) is None
+    assert index.mismatch(["t_toprocess", "t"], 12) is None
+    assert "held 10 rows" in index.mismatch(["t_toprocess", "t"], 9)
+    assert "built from t_toprocess, t" in index.mismatch(["u_toprocess", "u"], 10)
+
+
+def test_version_1_files_load_but_mismatch(tmp_path):
+    path = tmp_path / "old.idx"
+    digest = id_digest("a")
+    path.write_bytes(b"MIGIDX1\n" + struct.pack("<Q", 1) + digest.to_bytes(8, sys.byteorder))
+    index = IdIndex.load(str(path))
+    assert "a" in index
+    assert index.mismatch(["t"], 0) == "does not record its tables"
+
+
+def test_from_tables_skips_missing_tables():
+    cursor = FakeCursor({"t_toprocess"}, ["a", "b", "c"], {"t_toprocess": 4})
+    index = IdIndex.from_tables(FakeConnection(cursor), ["t_toprocess", "t_processed"], fetch_size=2)
+    assert len(index) == 3 and "b" in index and "d" not in index
+    assert index.tables == ["t_toprocess", "t_processed"] and index.rows == 4
+    assert count_rows(FakeConnection(cursor), ["t_toprocess", "t_processed"]) == 4
+    assert "t_processed" not in cursor.sql[2]
+
+
+def test_from_tables_with_no_tables():
+    cursor = FakeCursor(set(), [])
+    index = IdIndex.from_tables(FakeConnection(cursor), ["t_toprocess"])
+    assert len(index) == 0 and len(cursor.sql) == 1
@@ -0,0 +1,76 @@
+import pytest
+
+from infile import ChunkWriter
+
+# How LOAD DATA ... FIELDS TERMINATED BY '\t' ESCAPED BY '\\' LINES TERMINATED BY '\n' reads escapes
+UNESCAPE = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a"}
+NULL = object()
+
+
+def load_data(text):
+    """Parse a chunk file like MySQL would: rows of fields, with NULL for an unquoted \\N field."""
+    rows, fields, field, raw = [], [], [], []
+    chars = iter(text)
+    for char in chars:
+        if char == "\\":
+            escaped = next(chars)
+            field.append(UNESCAPE.get(escaped, escaped))
+            raw.append("\\" + escaped)
+        elif char in "\t\n":
+            fields.append(NULL if "".join(raw) == "\\N" else "".join(field))
+            field, raw = [], []
+            if char == "\n":
+                rows.append(tuple(fields))
+                fields = []
+        else:
+            field.append(char)
+            raw.append(char)
+    assert not fields and not field, "chunk does not end with a line terminator"
+    return rows
+
+
+HOSTILE = [
+    ("plain", '{"message": "hi"}'),
+    ("tab", '{"message": "a\tb"}'),
+    ("newline", '{"message": "line 1\nline 2\r\n"}'),
+    ("backslashes", r'{"path": "C:\\temp\\new", "escaped": "\"quoted\" \n \t \u00e9"}'),
+    ("null marker", "\\N"),
+    ("null marker inside", '{"s": "\\N"}'),
+    ("trailing backslash", "ends with \\"),
+    ("nul and ctrl-z", "a\0b\x1ac"),
+    ("unicode", "é€😀"),
+    ("empty", ""),
+    ("id\twith\ttabs\\N", "x"),
+]
+
+
+def test_round_trip_of_hostile_content(tmp_path):
+    writer = ChunkWriter(str(tmp_path), "chunk")
+    for row_id, content in HOSTILE:
+        writer.write(row_id, content)
+    assert writer.rows == len(HOSTILE)
+    assert writer.bytes == sum(len(content) for _, content in HOSTILE)
+    path = writer.close()
+    with open(path, encoding="utf-8", newline="") as f:
+        assert load_data(f.read()) == HOSTILE
+
+
+def test_chunks_are_numbered(tmp_path):
+    writer = ChunkWriter(str(tmp_path), "w1")
+    assert writer.close() is None
+    writer.write("a", "1")
+    first = writer.close()
+    assert (writer.rows, writer.bytes) == (0, 0)
+    writer.write("b", "2")
+    second = writer.close()
+    assert [p.rsplit("/", 1)[1] for p in (first, second)] == ["w1-000001.tsv", "w1-000002.tsv"]
+    with open(second, encoding="utf-8", newline="") as f:
+        assert load_data(f.read()) == [("b", "2")]
+
+
+@pytest.mark.parametrize("content", ["\\", "\\\\N", "\t\\N\t"])
+def test_no_field_reads_as_null(tmp_path, content):
+    writer = ChunkWriter(str(tmp_path), "chunk")
+    writer.write("\\N", content)
+    with open(writer.close(), encoding="utf-8", newline="") as f:
+        assert load_data(f.read()) == [("\\N", content)]
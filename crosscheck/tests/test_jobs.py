@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from jobs import build_jobs, expand_env, load_job_file, option_argv
+from migrate import build_parser
+
+DEFAULTS = {"api_key": "k", "db_host": "h", "db_user": "u", "db_pass": "p", "db_name": "d", "match_all": True}
+
+
+def job(name, table, **options):
+    return {"name": name, "es_url": f"http://es:9200/{table}/_search", "db_table": table, **options}
+
+
+def test_expand_env(monkeypatch):
+    monkeypatch.setenv("GTE", "2025-12-01T00:00:00")
+    assert expand_env({"a": ["${GTE}", 1, True], "b": "from ${GTE} on"}) == {
+        "a": ["2025-12-01T00:00:00", 1, True], "b": "from 2025-12-01T00:00:00 on"}
+    monkeypatch.delenv("GTE")
+    with pytest.raises(ValueError, match="GTE"):
+        expand_env("${GTE}")
+
+
+def test_option_argv():
+    assert option_argv({"threads": 4, "match_all": True, "resume": False, "include": ["a", "b"], "gte": None}) == [
+        "--threads", "4", "--match_all", "--include", "a,b"]
+
+
+def test_build_jobs_merges_defaults():
+    jobs = build_jobs(build_parser(), {"defaults": dict(DEFAULTS, threads=2),
+                                       "jobs": [job("cicd", "cicd_toprocess", priority=2, threads=4),
+                                                {"es_url": "http://es:9200/deploy/_search", "db_table": "deploy_toprocess"}]})
+    assert [(j.name, j.priority, j.args.threads) for j in jobs] == [("cicd", 2, 4), ("deploy_toprocess", 1, 2)]
+    assert jobs[0].args.match_all and jobs[0].args.db_host == "h"
+
+
+@pytest.mark.parametrize("jobs, message", [
+    ([job("a", "a_t", priority=0)], "priority"),
+    ([job("a", "a_t", max_es_requests=4)], "whole run"),
+    ([job("a", "a_t", threads="many")], "invalid options"),
+    ([{"name": "a", "es_url": "http://es:9200/a/_search"}], "missing db_table"),
+    ([job("a", "a_t", engine="async")], "threaded"),
+    ([job("a", "a_t"), job("a", "b_t")], "more than once"),
+    ([job("a", "a_t", since_watermark="w.json"), job("b", "b_t", since_watermark="w.json")], "since_watermark"),
+])
+def test_build_jobs_rejects(jobs, message):
+    with pytest.raises(ValueError, match=message):
+        build_jobs(build_parser(), {"defaults": DEFAULTS, "jobs": jobs})
+
+
+def test_load_job_file(tmp_path, monkeypatch):
+    monkeypatch.setenv("API_KEY", "secret")
+    path = tmp_path / "jobs.json"
+    path.write_text(json.dumps({"defaults": {"api_key": "${API_KEY}"}, "jobs": [job("a", "a_t")]}))
+    assert load_job_file(str(path))["defaults"] == {"api_key": "secret"}
+    path.write_text(json.dumps({"jobs": []}))
+    with pytest.raises(ValueError, match="non-empty"):
+        load_job_file(str(path))
+    path.write_text(json.dumps({"jobs": [job("a", "a_t")], "extra": 1}))
+    with pytest.raises(ValueError, match="extra"):
+        load_job_file(str(path))
+
+
+def test_load_yaml_job_file(tmp_path):
+    pytest.importorskip("yaml")
+    path = tmp_path / "jobs.yaml"
+    path.write_text("jobs:\n  - name: a\n    db_table: a_t\n")
+    assert load_job_file(str(path))["jobs"] == [{"name": "a", "db_table": "a_t"}]
@@ -0,0 +1,148 @@
+import pytest
+
+from json_columns import MAX_LENGTH, JsonColumn, column_length, filter_shapes, provision, verify
+
+
+class FakeCursor:
+    """Answers existing(), longest_value() and EXPLAIN; records every other statement."""
+
+    def __init__(self, columns=(), indexes=(), longest=0, uses_index=lambda sql: True):
+        self.columns = columns
+        self.indexes = indexes
+        self.longest = longest
+        self.uses_index = uses_index
+        self.executed = []
+        self.explained = None
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+        self.last = sql
+        if sql.startswith("EXPLAIN "):
+            self.explained = sql[len("EXPLAIN "):]
+        elif sql.startswith("PREPARE "):
+            self.explained = params[0][len("EXPLAIN "):]
+
+    def fetchall(self):
+        if "information_schema.COLUMNS" in self.last:
+            return [(name,) for name in self.columns]
+        if "information_schema.STATISTICS" in self.last:
+            return [(name,) for name in self.indexes]
+        return [("SIMPLE", "t", "ref", "ix_eventData_type" if self.uses_index(self.explained) else None)]
+
+    @property
+    def column_names(self):
+        return ("select_type", "table", "type", "key")
+
+    def fetchone(self):
+        return (self.longest,)
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+
+def ddl(cursor):
+    return [sql for sql, _ in cursor.executed if sql.startswith("ALTER")]
+
+
+def test_parse():
+    column = JsonColumn.parse(" _source.@timestamp:32 ")
+    assert (column.path, column.length, column.column, column.index) == ("_source.@timestamp", 32, "g_timestamp", "ix_timestamp")
+    assert column.json_path == '$._source."@timestamp"'
+    assert JsonColumn.parse("_source.eventData.type").length is None
+    for spec in ("_source.a:0", f"_source.a:{MAX_LENGTH + 1}"):
+        with pytest.raises(ValueError, match="length must be"):
+            JsonColumn.parse(spec)
+
+
+@pytest.mark.parametrize("longest, length", [(0, 255), (20, 255), (200, 400), (384, 768), (500, 768)])
+def test_length_from_the_data(longest, length):
+    assert column_length(JsonColumn("_source.a"), longest) == length
+
+
+def test_values_longer_than_the_column():
+    assert column_length(JsonColumn("_source.a", 64), 30) == 64
+    with pytest.raises(ValueError, match="use _source.a:80 or --truncate"):
+        column_length(JsonColumn("_source.a", 32), 40)
+    with pytest.raises(ValueError, match="longer than an index key"):
+        column_length(JsonColumn("_source.a"), MAX_LENGTH + 1)
+    # --truncate keeps the length and cuts the values
+    assert column_length(JsonColumn("_source.a", 32, truncate=True), 40) == 32
+    assert column_length(JsonColumn("_source.a", truncate=True), 5000) == MAX_LENGTH
+
+
+def test_generated_column_sql():
+    column = JsonColumn("_source.eventData.type", 64)
+    assert column.add_column_sql("t") == (
+        "ALTER TABLE t ADD COLUMN g_eventData_type VARCHAR(64) COLLATE utf8mb4_bin GENERATED ALWAYS AS "
+        "(JSON_UNQUOTE(JSON_EXTRACT(content, '$._source.eventData.type'))) VIRTUAL, ALGORITHM=INPLACE, LOCK=NONE")
+    column.truncate = True
+    assert column.add_column_sql("t", stored=True) == (
+        "ALTER TABLE t ADD COLUMN g_eventData_type VARCHAR(64) COLLATE utf8mb4_bin GENERATED ALWAYS AS "
+        "(LEFT(JSON_UNQUOTE(JSON_EXTRACT(content, '$._source.eventData.type')), 64)) STORED, ALGORITHM=COPY")
+
+
+def test_provision_sizes_from_the_longest_value():
+    cursor = FakeCursor(longest=150)
+    column = JsonColumn("_source.eventData.type")
+    assert provision(FakeConn(cursor), "t", [column])
+    assert column.length == 300
+    assert cursor.executed[2][0] == ("SELECT MAX(CHAR_LENGTH(JSON_UNQUOTE(JSON_EXTRACT(content, '$._source.eventData.type')))) FROM t")
+    assert ddl(cursor) == [column.add_column_sql("t"), column.add_index_sql("t")]
+
+
+def test_provision_dry_run_and_existing_columns():
+    cursor = FakeCursor(longest=10)
+    assert provision(FakeConn(cursor), "t", [JsonColumn("_source.eventData.type")], dry_run=True)
+    assert ddl(cursor) == []
+    cursor = FakeCursor(columns=["g_eventData_type"], indexes=["ix_eventData_type"])
+    assert provision(FakeConn(cursor), "t", [JsonColumn("_source.eventData.type")])
+    assert len(cursor.executed) == 2
+
+
+def test_provision_refuses_values_that_would_fail_inserts():
+    cursor = FakeCursor(longest=100)
+    assert not provision(FakeConn(cursor), "t", [JsonColumn("_source.eventData.type", 50)])
+    assert ddl(cursor) == []
+    cursor = FakeCursor(longest=100)
+    assert provision(FakeConn(cursor), "t", [JsonColumn("_source.eventData.type", 50, truncate=True)])
+    assert "LEFT(" in ddl(cursor)[0]
+
+
+def test_skipping_the_length_check():
+    cursor = FakeCursor(longest=10 ** 6)
+    column = JsonColumn("_source.eventData.type")
+    assert provision(FakeConn(cursor), "t", [column], check_lengths=False)
+    assert column.length == 255
+    assert not any("MAX(CHAR_LENGTH" in sql for sql, _ in cursor.executed)
+
+
+def test_verify_explains_every_filter_shape():
+    column = JsonColumn("_source.eventData.type", 64)
+    cursor = FakeCursor()
+    assert verify(FakeConn(cursor), "t", [column])
+    statements = [sql for sql, _ in cursor.executed]
+    literal = [sql for sql in statements if sql.startswith("EXPLAIN ")]
+    prepared = [params[0] for sql, params in cursor.executed if sql.startswith("PREPARE ")]
+    shapes = filter_shapes("t", column)
+    assert len(literal) + len(prepared) == len(shapes)
+    assert sum(params is not None for _, _, params in shapes) == len(prepared) == statements.count("DEALLOCATE PREPARE json_columns_check")
+    # The JSON path of a prepared shape is bound, not spliced into the SQL
+    assert ("SET @p0 = %s, @p1 = %s", ["$._source.eventData.type", "x"]) in cursor.executed
+
+
+def test_verify_fails_when_the_backend_filter_scans():
+    column = JsonColumn("_source.eventData.type", 64)
+    expression_scans = FakeCursor(uses_index=lambda sql: "JSON_EXTRACT" not in sql)
+    assert not verify(FakeConn(expression_scans), "t", [column])
+    # A truncated column only has to serve filters on the column itself
+    column.truncate = True
+    assert verify(FakeConn(FakeCursor(uses_index=lambda sql: "JSON_EXTRACT" not in sql)), "t", [column])
+    assert not verify(FakeConn(FakeCursor(uses_index=lambda sql: "JSON_EXTRACT" in sql)), "t", [column])
@@ -0,0 +1,131 @@
+from datetime import date, timedelta
+
+import pytest
+
+from partitions import (create_table_sql, day_partitions, ensure_partitions, partition_name, partitioning_sql,
+                        prepare_partitions, retire_partitions)
+
+D = date(2025, 12, 1)
+
+
+class FakeCursor:
+    """Answers the information_schema and COUNT(*) queries; records the DDL."""
+
+    def __init__(self, parts=(), columns=None, pending=None):
+        self.parts = list(parts)
+        self.columns = columns or []
+        self.pending = pending or {}
+        self.ddl = []
+        self.closed = False
+
+    def execute(self, sql, params=()):
+        self.sql = sql
+        if not sql.startswith("SELECT"):
+            self.ddl.append(sql)
+
+    def fetchall(self):
+        if "information_schema.PARTITIONS" in self.sql:
+            return [(name, bound, 10, 1024) for name, bound in self.parts]
+        return self.columns
+
+    def fetchone(self):
+        return (self.pending.get(self.sql.split("PARTITION (")[1].split(")")[0], 0),)
+
+    def close(self):
+        self.closed = True
+
+
+def table(first, last):
+    """Partition rows as information_schema reports them for a table created with days first..last."""
+    return ([("p_old", f"'{first}'")] + [(partition_name(first + timedelta(days=n)), f"'{first + timedelta(days=n + 1)}'")
+                                           for n in range((last - first).days + 1)] + [("p_future", "MAXVALUE")])
+
+
+def test_partition_bounds():
+    assert partition_name(D) == "p20251201"
+    assert partitioning_sql(D, D + timedelta(days=1)) == (
+        "PARTITION BY RANGE COLUMNS (p_day) (PARTITION p_old VALUES LESS THAN ('2025-12-01'), "
+        "PARTITION p20251201 VALUES LESS THAN ('2025-12-02'), PARTITION p20251202 VALUES LESS THAN ('2025-12-03'), "
+        "PARTITION p_future VALUES LESS THAN (MAXVALUE))")
+    # Month and year ends
+    assert "PARTITION p20251231 VALUES LESS THAN ('2026-01-01')" in partitioning_sql(date(2025, 12, 31), date(2026, 1, 1))
+    assert "PARTITION p20240229 VALUES LESS THAN ('2024-03-01')" in partitioning_sql(date(2024, 2, 28), date(2024, 3, 1))
+
+
+def test_create_table_sql():
+    sql = create_table_sql("t_toprocess", "timestamp", D, D)
+    assert sql.startswith("CREATE TABLE t_toprocess (id VARCHAR(255) NOT NULL, content JSON NOT NULL, p_day DATE GENERATED ALWAYS AS (")
+    assert "STORED NOT NULL, PRIMARY KEY (id, p_day)) PARTITION BY RANGE COLUMNS (p_day)" in sql
+    sql = create_table_sql("t_toprocess", "ingest", D, D, "LONGBLOB")
+    assert "content LONGBLOB NOT NULL, p_day DATE NOT NULL DEFAULT (CURRENT_DATE), PRIMARY KEY" in sql
+
+
+def test_day_partitions():
+    assert day_partitions([(name, bound, 0, 0) for name, bound in table(D, D + timedelta(days=1))]) == {
+        D: "p20251201", D + timedelta(days=1): "p20251202"}
+
+
+def test_ensure_splits_the_future_partition():
+    cursor = FakeCursor(table(D, D + timedelta(days=1)))
+    assert ensure_partitions(cursor, "t", D, D + timedelta(days=3)) == ["p20251203", "p20251204"]
+    assert cursor.ddl == ["ALTER TABLE t REORGANIZE PARTITION p_future INTO ("
+                          "PARTITION p20251203 VALUES LESS THAN ('2025-12-04'), PARTITION p20251204 VALUES LESS THAN ('2025-12-05'), "
+                          "PARTITION p_future VALUES LESS THAN (MAXVALUE))"]
+
+
+def test_ensure_backfills_from_the_old_partition():
+    cursor = FakeCursor(table(D, D))
+    assert ensure_partitions(cursor, "t", D - timedelta(days=2), D) == ["p20251129", "p20251130"]
+    assert cursor.ddl == ["ALTER TABLE t REORGANIZE PARTITION p_old INTO (PARTITION p_old VALUES LESS THAN ('2025-11-29'), "
+                          "PARTITION p20251129 VALUES LESS THAN ('2025-11-30'), PARTITION p20251130 VALUES LESS THAN ('2025-12-01'))"]
+
+
+def test_ensure_is_a_no_op_when_the_days_exist():
+    cursor = FakeCursor(table(D, D + timedelta(days=7)))
+    assert ensure_partitions(cursor, "t", D, D + timedelta(days=7)) == []
+    assert cursor.ddl == []
+
+
+def test_ensure_does_not_recreate_retired_days():
+    parts = table(D, D + timedelta(days=2))
+    del parts[1:3]  # p20251201 and p20251202 retired
+    cursor = FakeCursor(parts)
+    assert ensure_partitions(cursor, "t", D + timedelta(days=1), D + timedelta(days=3)) == ["p20251204"]
+
+
+@pytest.mark.parametrize("parts", [[], [("p0", "'2025-12-01'"), ("p_future", "MAXVALUE")]])
+def test_ensure_needs_a_day_partitioned_table(parts):
+    with pytest.raises(ValueError, match="not partitioned by day"):
+        ensure_partitions(FakeCursor(parts), "t", D, D)
+
+
+def test_prepare_uses_today_for_ingest_tables():
+    today = date.today()
+    cursor = FakeCursor(table(today, today), columns=[("id", "varchar(255)", ""), ("p_day", "date", "DEFAULT_GENERATED")])
+
+    class Conn:
+        def cursor(self):
+            return cursor
+    assert prepare_partitions(Conn(), "t", D, D) == [partition_name(today + timedelta(days=1))]
+    assert cursor.closed
+    cursor.columns = [("id", "varchar(255)", ""), ("content", "json", "")]
+    with pytest.raises(ValueError, match="no p_day column"):
+        prepare_partitions(Conn(), "t", D, D)
+
+
+def test_retire_keeps_days_with_unprocessed_rows():
+    cursor = FakeCursor(table(D, D + timedelta(days=3)), pending={"p20251202": 4})
+    report = retire_partitions(cursor, "t_toprocess", "t", D + timedelta(days=3))
+    assert report == [("p20251201", 10, 0), ("p20251202", 10, 4), ("p20251203", 10, 0)]
+    assert cursor.ddl == ["ALTER TABLE t_toprocess DROP PARTITION p20251201, p20251203"]
+
+
+def test_retire_dry_run_and_exchange():
+    cursor = FakeCursor(table(D, D + timedelta(days=1)))
+    retire_partitions(cursor, "t_toprocess", "t", D + timedelta(days=1), dry_run=True)
+    assert cursor.ddl == []
+    retire_partitions(cursor, "t_toprocess", "t", D + timedelta(days=1), exchange=True)
+    assert cursor.ddl == ["CREATE TABLE t_toprocess_p20251201 LIKE t_toprocess",
+                          "ALTER TABLE t_toprocess_p20251201 REMOVE PARTITIONING",
+                          "ALTER TABLE t_toprocess EXCHANGE PARTITION p20251201 WITH TABLE t_toprocess_p20251201 WITHOUT VALIDATION",
+                          "ALTER TABLE t_toprocess DROP PARTITION p20251201"]
@@ -0,0 +1,83 @@
+import json
+from argparse import Namespace
+
+import pytest
+
+from projection import FILTER_PATH, Projection, split_fields, strip_redundant_original
+
+
+def args(**values):
+    return Namespace(**dict(dict(projection=None, include=None, exclude=None, drop_hit_metadata=False,
+                                 drop_redundant_original=False), **values))
+
+
+def hit(source):
+    return json.dumps({"_index": "logs", "_id": "a", "_source": source})
+
+
+QUERY = {"query": {"match_all": {}}}
+
+
+def test_source_filtering():
+    projection = Projection.from_args(args(include="message, host.name,", exclude="event.original"))
+    assert split_fields(" a ,, b ") == ["a", "b"]
+    assert projection.apply_to_query(QUERY) == {
+        "query": {"match_all": {}}, "_source": {"includes": ["message", "host.name"], "excludes": ["event.original"]}}
+    assert "_source" not in QUERY
+    assert Projection(include=["message"]).apply_to_query(QUERY)["_source"] == {"includes": ["message"]}
+    assert Projection(drop_hit_metadata=True).apply_to_query(QUERY) is QUERY
+
+
+def test_profile_and_flags_combine(tmp_path):
+    path = tmp_path / "profile.json"
+    path.write_text(json.dumps({"include": ["message"], "drop_hit_metadata": True}))
+    projection = Projection.from_args(args(projection=str(path), include="host.name", drop_redundant_original=True))
+    assert projection.include == ["message", "host.name"]
+    assert projection.drop_hit_metadata and projection.drop_redundant_original
+    assert not Projection.from_args(args())
+
+
+def test_unknown_profile_key(tmp_path):
+    path = tmp_path / "profile.json"
+    path.write_text(json.dumps({"includes": ["message"]}))
+    with pytest.raises(ValueError, match="includes"):
+        Projection.from_args(args(projection=str(path)))
+
+
+def test_filter_path_keeps_what_the_scroll_needs():
+    assert Projection().request_params() == {}
+    params = Projection(drop_hit_metadata=True).request_params()
+    assert params == {"filter_path": FILTER_PATH}
+    assert set(FILTER_PATH.split(",")) == {"_scroll_id", "hits.total", "hits.hits._id", "hits.hits._source", "hits.hits.sort"}
+
+
+def test_redundant_original_is_dropped():
+    source = {"message": "hi", "n": 1, "event": {"original": json.dumps({"message": "hi", "n": 1})}}
+    assert json.loads(strip_redundant_original(hit(source))) == {"_index": "logs", "_id": "a", "_source": {"message": "hi", "n": 1}}
+    source = {"message": "hi", "event": {"kind": "x", "original": '{"message": "hi"}'}}
+    assert json.loads(strip_redundant_original(hit(source)))["_source"] == {"message": "hi", "event": {"kind": "x"}}
+
+
+@pytest.mark.parametrize("source", [
+    {"message": "hi"},
+    {"message": "hi", "event": {"original": '{"message": "bye"}'}},
+    {"message": "hi", "event": {"original": '{"message": "hi", "extra": 1}'}},
+    {"message": "hi", "event": {"original": "hi"}},
+    {"message": "hi", "event": {"original": "{not json"}},
+    {"message": "hi", "event": {"original": "{}"}},
+    {"message": "hi", "event": {"original": ["hi"]}},
+    {"message": "original", "event": "original"},
+])
+def test_differing_original_is_kept(source):
+    assert strip_redundant_original(hit(source)) is None
+
+
+def test_transform_hits():
+    redundant = hit({"message": "hi", "event": {"original": '{"message": "hi"}'}})
+    differing = hit({"message": "hi", "event": {"original": '{"message": "bye"}'}})
+    hits = [("a", redundant, [1]), ("b", differing, [2])]
+    assert Projection(include=["message"]).transform_hits(hits) is hits
+    projected = Projection(drop_redundant_original=True).transform_hits(hits)
+    assert [(row_id, sort) for row_id, _, sort in projected] == [("a", [1]), ("b", [2])]
+    assert "original" not in projected[0][1]
+    assert projected[1][1] == differing
@@ -0,0 +1,93 @@
+import threading
+from queue import Full
+
+import pytest
+
+from migrate import BoundedQueue, next_batch
+
+
+def item(row_id, size):
+    return (row_id, "x" * size, None)
+
+
+def test_item_limit():
+    queue = BoundedQueue(2, 0)
+    queue.put(item("a", 10))
+    queue.put(item("b", 10))
+    with pytest.raises(Full):
+        queue.put(item("c", 1), block=False)
+    queue.get()
+    queue.put(item("c", 1), block=False)
+
+
+def test_byte_limit_and_accounting():
+    queue = BoundedQueue(0, 100)
+    queue.put(item("a", 60))
+    assert queue.bytes_in_flight == 60
+    with pytest.raises(Full):
+        queue.put(item("b", 50), block=False)
+    with pytest.raises(Full):
+        queue.put(item("b", 50), timeout=0.01)
+    queue.put(item("c", 40), block=False)
+    assert queue.bytes_in_flight == 100
+    assert queue.fill() == 1.0
+    queue.get()
+    queue.get()
+    assert queue.bytes_in_flight == 0
+    assert queue.fill() == 0.0
+
+
+def test_oversized_item_is_admitted_into_an_empty_queue():
+    queue = BoundedQueue(0, 100)
+    queue.put(item("big", 500), block=False)
+    with pytest.raises(Full):
+        queue.put(item("small", 1), block=False)
+    queue.get()
+    queue.put(item("small", 1), block=False)
+
+
+def test_sentinel_costs_nothing():
+    queue = BoundedQueue(0, 10)
+    queue.put(item("a", 10))
+    queue.put(None, block=False)
+    assert queue.bytes_in_flight == 10
+
+
+def test_blocked_producer_resumes_when_bytes_drain():
+    queue = BoundedQueue(0, 100)
+    queue.put(item("a", 80))
+    done = threading.Event()
+
+    def produce():
+        queue.put(item("b", 80))
+        done.set()
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    assert not done.wait(0.05)
+    queue.get()
+    assert done.wait(5)
+    producer.join()
+    assert queue.bytes_in_flight == 80
+
+
+def test_unbounded_queue():
+    queue = BoundedQueue(0, 0)
+    for i in range(1000):
+        queue.put(item(str(i), 1000), block=False)
+    assert queue.qsize() == 1000
+    assert queue.fill() == 0.0
+
+
+def test_next_batch_limits_rows_and_bytes():
+    queue = BoundedQueue()
+    for i in range(5):
+        queue.put(item(str(i), 10))
+    queue.put(None)
+    batch, carry, done = next_batch(queue, None, 2, 1000)
+    assert [row[0] for row in batch] == ["0", "1"] and carry is None and not done
+    batch, carry, done = next_batch(queue, None, 10, 25)
+    # The third item would pass 25 bytes, so it is carried into the next batch
+    assert [row[0] for row in batch] == ["2", "3"] and carry[0] == "4" and not done
+    batch, carry, done = next_batch(queue, carry, 10, 25)
+    assert [row[0] for row in batch] == ["4"] and carry is None and done
@@ -0,0 +1,171 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import reconcile
+from reconcile import EsSide, bucket_range, id_digest, parse_time
+
+START = datetime(2025, 12, 1, tzinfo=timezone.utc)
+
+
+def at(minutes):
+    return START + timedelta(minutes=minutes)
+
+
+def bucket_key(moment, level):
+    return moment.strftime(reconcile.LEVELS[level][3])
+
+
+class Side:
+    """One side's {id: timestamp}, answering like EsSide and like the mysql_* helpers."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.id_scrolls = 0
+
+    def _in(self, start, end):
+        return {row_id for row_id, moment in self.docs.items() if start <= moment < end}
+
+    def counts(self, start, end, level):
+        counts = {}
+        for row_id in self._in(start, end):
+            key = bucket_key(self.docs[row_id], level)
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def ids(self, start, end):
+        self.id_scrolls += 1
+        return self._in(start, end)
+
+    def digests(self, start, end):
+        by_hour = {}
+        for row_id in self._in(start, end):
+            by_hour.setdefault(bucket_key(self.docs[row_id], "hour"), set()).add(row_id)
+        return {hour: id_digest(ids) for hour, ids in by_hour.items()}
+
+
+@pytest.fixture
+def run(monkeypatch):
+    def run(es_docs, mysql_docs, digest=False):
+        mysql = Side(mysql_docs)
+        monkeypatch.setattr(reconcile, "mysql_counts", lambda cursor, tables, start, end, level: mysql.counts(start, end, level))
+        monkeypatch.setattr(reconcile, "mysql_ids", lambda cursor, tables, start, end: mysql.ids(start, end))
+        monkeypatch.setattr(reconcile, "mysql_digests", lambda cursor, tables, start, end: mysql.digests(start, end))
+        es = Side(es_docs)
+        return reconcile.reconcile(es, None, ["t"], START, at(180), digest), es
+    return run
+
+
+def test_bucket_range():
+    assert bucket_range("2025-12-01T05", "hour") == (at(300), at(360))
+    assert bucket_range("2025-12-01T05:07", "minute") == (at(307), at(308))
+
+
+def test_id_digest_is_an_xor():
+    assert id_digest([]) == 0
+    assert id_digest(["a", "b"]) == id_digest(["b", "a"]) == id_digest(["a"]) ^ id_digest(["b"])
+
+
+def test_equal_sides(run):
+    docs = {f"id{i}": at(i) for i in range(150)}
+    report, es = run(docs, dict(docs))
+    assert report["hours_differing"] == [] and report["missing"] == [] and es.id_scrolls == 0
+
+
+def test_drills_down_to_the_differing_minutes(run):
+    es_docs = {f"id{i}": at(i) for i in range(150)}
+    mysql_docs = dict(es_docs)
+    del mysql_docs["id5"], mysql_docs["id130"]
+    mysql_docs["gone"] = at(61)
+    report, es = run(es_docs, mysql_docs)
+    assert report["hours_differing"] == ["2025-12-01T00", "2025-12-01T01", "2025-12-01T02"]
+    assert report["minutes_differing"] == ["2025-12-01T00:05", "2025-12-01T01:01", "2025-12-01T02:10"]
+    assert report["missing"] == ["id130", "id5"] and report["extra"] == ["gone"]
+    # Only the differing minutes are scrolled for IDs
+    assert es.id_scrolls == 3
+
+
+def test_digest_catches_a_swapped_id(run):
+    es_docs = {f"id{i}": at(i) for i in range(30)}
+    mysql_docs = dict(es_docs)
+    del mysql_docs["id7"]
+    mysql_docs["other"] = at(7)
+    report, _ = run(es_docs, mysql_docs)
+    assert report["missing"] == []
+    report, _ = run(es_docs, mysql_docs, digest=True)
+    assert report["digest_hours_differing"] == ["2025-12-01T00"]
+    assert report["missing"] == ["id7"] and report["extra"] == ["other"]
+
+
+class FakeResponse:
+    status_code = 200
+    text = ""
+
+    def __init__(self, page):
+        self.page = page
+
+    def json(self):
+        return self.page
+
+
+class ScrollTransport:
+    def __init__(self, pages, total):
+        self.pages = [{"_scroll_id": "s", "hits": {"total": {"value": total, "relation": "eq"},
+                                                   "hits": [{"_id": row_id} for row_id in page]}} for page in pages]
+        self.cleared = False
+
+    def search(self, body, params, label):
+        return FakeResponse(self.pages.pop(0))
+
+    def scroll(self, scroll_id, params, label, keepalive="2m"):
+        return FakeResponse(self.pages.pop(0) if self.pages else {"_scroll_id": "s", "hits": {"hits": []}})
+
+    def clear_scroll(self, scroll_id, label):
+        self.cleared = True
+
+
+def test_id_scroll():
+    transport = ScrollTransport([["a", "b"], ["c"]], 3)
+    assert EsSide(transport).ids(START, at(60)) == {"a", "b", "c"}
+    assert transport.cleared
+
+
+def test_short_id_scroll_fails():
+    transport = ScrollTransport([["a", "b"]], 3)
+    with pytest.raises(ValueError, match="2 of 3"):
+        EsSide(transport).ids(START, at(60))
+    assert transport.cleared
+
+
+def test_parse_time():
+    assert parse_time("2025-12-01T01:00:00") == at(60)
+    assert parse_time("2025-12-01T01:00:00Z") == at(60)
+    assert parse_time("2025-12-01T02:00:00+01:00") == at(60)
+
+
+class FetchingEs:
+    def __init__(self, have):
+        self.have = have
+
+    def fetch(self, ids):
+        return [(row_id, b"{}", None) for row_id in ids if row_id in self.have]
+
+
+class Closable:
+    closed = False
+
+    def cursor(self):
+        return self
+
+    def close(self):
+        self.closed = True
+
+
+def test_repair_batches_and_reports_gone_ids(monkeypatch):
+    batches = []
+    monkeypatch.setattr(reconcile, "insert_batch", lambda conn, cursor, table, batch: batches.append(batch) or len(batch))
+    conn = Closable()
+    inserted, gone = reconcile.repair(FetchingEs({"a", "b", "c"}), conn, "t", ["a", "b", "x", "c"], batch_rows=2)
+    assert inserted == 3 and gone == ["x"]
+    assert [[row[0] for row in batch] for batch in batches] == [["a", "b"], ["c"]]
+    assert conn.closed
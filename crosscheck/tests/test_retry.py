@@ -0,0 +1,94 @@
+from contextlib import contextmanager
+
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from retry import RetryPolicy, connect_failed, post_with_retry
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+
+class FakeSession:
+    """Raises or returns the scripted outcomes in order, one per post()."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.posts = 0
+
+    def post(self, url, **kwargs):
+        self.posts += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+
+def refused():
+    return requests.ConnectionError(MaxRetryError(None, "/", NewConnectionError(None, "refused")))
+
+
+RETRY = RetryPolicy(max_retries=3, base_delay=0, max_delay=0)
+
+
+def test_connect_failed():
+    assert connect_failed(refused())
+    assert connect_failed(requests.ConnectTimeout())
+    assert not connect_failed(requests.ReadTimeout())
+    assert not connect_failed(requests.ConnectionError("Connection aborted"))
+
+
+@pytest.mark.parametrize("failure", [requests.ReadTimeout(), requests.ConnectionError("Connection aborted"), 500, 502, 504])
+def test_idempotent_request_retries_every_transient_failure(failure):
+    session = FakeSession(failure, 200)
+    assert post_with_retry(session, "http://es", RETRY, "test").status_code == 200
+    assert session.posts == 2
+
+
+@pytest.mark.parametrize("failure", [refused(), requests.ConnectTimeout(), 429, 503])
+def test_scroll_retries_failures_before_execution(failure):
+    session = FakeSession(failure, 200)
+    assert post_with_retry(session, "http://es", RETRY, "test", idempotent=False).status_code == 200
+    assert session.posts == 2
+
+
+@pytest.mark.parametrize("failure", [requests.ReadTimeout(), requests.ConnectionError("Connection aborted")])
+def test_scroll_does_not_retry_possibly_executed_request(failure):
+    session = FakeSession(failure, 200)
+    with pytest.raises(type(failure)):
+        post_with_retry(session, "http://es", RETRY, "test", idempotent=False)
+    assert session.posts == 1
+
+
+@pytest.mark.parametrize("status", [500, 502, 504])
+def test_scroll_returns_server_errors(status):
+    session = FakeSession(status, 200)
+    assert post_with_retry(session, "http://es", RETRY, "test", idempotent=False).status_code == status
+    assert session.posts == 1
+
+
+def test_gives_up_after_max_retries():
+    session = FakeSession(503, 503, 503, 503, 200)
+    assert post_with_retry(session, "http://es", RETRY, "test").status_code == 503
+    assert session.posts == 4
+
+
+def test_gate_slot_per_attempt():
+    events = []
+
+    class Gate:
+        @contextmanager
+        def slot(self):
+            events.append("acquire")
+            try:
+                yield
+            finally:
+                events.append("release")
+
+    session = FakeSession(503, requests.ConnectTimeout(), 200)
+    post_with_retry(session, "http://es", RETRY, "test", gate=Gate())
+    assert events == ["acquire", "release"] * 3
@@ -0,0 +1,125 @@
+import threading
+import time
+
+from scheduler import FairScheduler, TokenBucket
+
+
+def test_token_bucket_rate():
+    bucket = TokenBucket(50, burst=1)
+    started = time.monotonic()
+    delays = [bucket.wait() for _ in range(11)]
+    # The burst covers the first acquisition; the next ten come every 20 ms
+    assert delays[0] == 0.0
+    assert time.monotonic() - started >= 0.18
+
+
+def test_token_bucket_burst_defaults_to_one_second():
+    bucket = TokenBucket(20)
+    assert all(bucket.wait() == 0.0 for _ in range(20))
+    assert bucket.wait() > 0.0
+
+
+def test_slots_bound_concurrency():
+    scheduler = FairScheduler("test", 3)
+    gates = [scheduler.register(f"job{i}") for i in range(2)]
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def work(gate):
+        for _ in range(20):
+            with gate.slot():
+                with lock:
+                    active.append(1)
+                    peak.append(len(active))
+                time.sleep(0.001)
+                with lock:
+                    active.pop()
+
+    threads = [threading.Thread(target=work, args=(gates[i % 2],)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert max(peak) == 3
+    assert sum(gate.granted for gate in gates) == 160
+    assert all(gate.active == 0 and gate.waiting == 0 for gate in gates)
+
+
+def test_weights_split_slot_time():
+    scheduler = FairScheduler("test", 1)
+    heavy = scheduler.register("heavy", 2)
+    light = scheduler.register("light", 1)
+    stop = threading.Event()
+
+    def work(gate):
+        while not stop.is_set():
+            with gate.slot():
+                time.sleep(0.002)
+
+    # Two threads per job, so each job always has a request waiting
+    threads = [threading.Thread(target=work, args=(gate,)) for gate in (heavy, light, heavy, light)]
+    for t in threads:
+        t.start()
+    time.sleep(0.6)
+    stop.set()
+    for t in threads:
+        t.join()
+    assert 1.5 < heavy.held_seconds / light.held_seconds < 2.7
+
+
+def test_idle_job_banks_no_credit():
+    scheduler = FairScheduler("test", 2)
+    busy = scheduler.register("busy")
+    idle = scheduler.register("idle")
+    for _ in range(10):
+        scheduler.release(busy, scheduler.acquire(busy), 1.0)
+    estimate = scheduler.acquire(busy)
+    # idle wakes up while busy holds a slot: it starts from busy's charge, not from 0
+    scheduler.release(idle, scheduler.acquire(idle), 1.0)
+    scheduler.release(busy, estimate, 1.0)
+    assert idle.charge >= 10.0
+
+
+def test_describe():
+    scheduler = FairScheduler("test", 1)
+    gate = scheduler.register("job", 3)
+    with gate.slot():
+        pass
+    assert scheduler.describe()["job"]["weight"] == 3.0
+    assert scheduler.describe()["job"]["granted"] == 1
+
+
+def test_throttled_request_does_not_hold_a_slot():
+    scheduler = FairScheduler("test", 1, rate=1)
+    throttled, other = scheduler.register("throttled"), scheduler.register("other")
+    release = threading.Event()
+    waiting = threading.Event()
+
+    class Limiter:
+        def wait(self):
+            if threading.current_thread().name == "throttled":
+                waiting.set()
+                release.wait()
+            return 0.0
+    scheduler.limiter = Limiter()
+
+    def run(gate, done=None):
+        with gate.slot():
+            if done:
+                done.set()
+    granted = threading.Event()
+    threads = [threading.Thread(target=run, args=(throttled,), name="throttled"),
+               threading.Thread(target=run, args=(other, granted), name="other")]
+    try:
+        threads[0].start()
+        assert waiting.wait(1)
+        # The only slot stays free for the other job while this one sleeps on the rate limit
+        threads[1].start()
+        assert granted.wait(1)
+        assert throttled.active == 0 and throttled.charge == 0.0
+    finally:
+        release.set()
+        for t in threads:
+            t.join()
+    assert throttled.granted == 1 and throttled.wait_seconds > 0
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from checkpoint import CheckpointStore, CheckpointTracker
+from migrate import BoundedQueue, scroll_complete, scroll_slice
+
+
+class FakeResponse:
+    status_code = 200
+    text = ""
+
+    def __init__(self, page):
+        self.content = json.dumps(page).encode()
+
+
+class PagedTransport:
+    """Serves hits in pages of two; skip drops the page at that index, as a lost scroll response would."""
+
+    def __init__(self, count, skip=None, total=None):
+        ids = [f"id-{i}" for i in range(count)]
+        pages = [ids[i:i + 2] for i in range(0, count, 2)]
+        if skip is not None:
+            del pages[skip]
+        total = count if total is None else total
+        self.pages = [{"_scroll_id": "s1", "hits": {"total": total, "hits": [{"_id": row_id, "_source": {}, "sort": [n]}
+                                                                            for n, row_id in enumerate(page)]}}
+                      for page in pages]
+        self.cleared = []
+
+    def search(self, body, params, label):
+        return self.scroll(None, params, label)
+
+    def scroll(self, scroll_id, params, label, keepalive="2m"):
+        return FakeResponse(self.pages.pop(0) if self.pages else {"_scroll_id": "s1", "hits": {"hits": []}})
+
+    def clear_scroll(self, scroll_id, label):
+        self.cleared.append(scroll_id)
+
+
+def run(transport, store):
+    """Scroll one slice and commit every queued hit; returns (scroll_slice() result, queued IDs)."""
+    queue = BoundedQueue()
+    tracker = CheckpointTracker(store, "job", {})
+    result = scroll_slice(transport, {"query": {"match_all": {}}}, 2, queue, tracker=tracker)
+    items = [queue.get() for _ in range(queue.qsize())]
+    for _, _, mark in items:
+        tracker.ack(mark)
+    return result, [row_id for row_id, _, _ in items]
+
+
+def test_complete_scroll(tmp_path):
+    store = CheckpointStore(str(tmp_path / "ck.db"))
+    transport = PagedTransport(5)
+    result, queued = run(transport, store)
+    assert result == (5, True)
+    assert queued == [f"id-{i}" for i in range(5)]
+    assert store.load("job")[0]["done"]
+    assert transport.cleared == ["s1"]
+
+
+def test_lost_page_fails_the_slice(tmp_path, caplog):
+    store = CheckpointStore(str(tmp_path / "ck.db"))
+    transport = PagedTransport(5, skip=1)
+    assert run(transport, store) == ((3, False), ["id-0", "id-1", "id-4"])
+    assert "scroll ended after 3 of 5 hits" in caplog.text
+    # The slice is not marked finished, so --resume scrolls it again
+    assert not store.load("job")[0]["done"]
+    assert transport.cleared == ["s1"]
+
+
+@pytest.mark.parametrize("total, fetched, complete", [
+    (None, 0, True), ((5, "eq"), 5, True), ((5, "eq"), 4, False), ((10000, "gte"), 20000, True), ((10000, "gte"), 3, True)])
+def test_scroll_complete(total, fetched, complete):
+    assert scroll_complete("Scroll", total, fetched) == complete
@@ -0,0 +1,132 @@
+import argparse
+import gzip
+import json
+import os
+
+import pytest
+
+import spool
+from spool import Spool, load_segment, read_manifest, read_ndjson, read_segment, write_segments
+
+
+def hits(count, pad=50):
+    return [(f"id-{i}", json.dumps({"_index": "i", "_id": f"id-{i}", "_source": {"n": i, "pad": "x" * pad}}))
+            for i in range(count)]
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(spool, "BLOCK_BYTES", 1000)
+
+
+def test_segments_round_trip(tmp_path, small_blocks):
+    directory = str(tmp_path / "spool")
+    target = Spool.create(directory, source=["test"])
+    written = hits(200)
+    assert write_segments(target, iter(written), segment_bytes=10000) == 200
+    target.finish(True)
+
+    manifest = read_manifest(directory)
+    assert manifest["complete"] and manifest["hits"] == 200
+    assert len(manifest["segments"]) > 1
+    assert sorted(os.listdir(directory)) == sorted(
+        [spool.MANIFEST] + [entry[key] for entry in manifest["segments"] for key in ("name", "index")])
+    read = [hit for entry in manifest["segments"] for member in read_segment(directory, entry) for hit in member]
+    assert read == written
+    # Each segment is also plain gzipped NDJSON
+    first = manifest["segments"][0]
+    with gzip.open(os.path.join(directory, first["name"]), "rt", encoding="utf-8") as f:
+        assert [line.rstrip("\n") for line in f] == [content for _, content in written[:first["hits"]]]
+
+
+def test_index_points_at_every_line(tmp_path, small_blocks):
+    directory = str(tmp_path / "spool")
+    target = Spool.create(directory)
+    write_segments(target, iter(hits(30)))
+    entry = read_manifest(directory)["segments"][0]
+    with open(os.path.join(directory, entry["name"]), "rb") as f:
+        data = f.read()
+    with open(os.path.join(directory, entry["index"]), encoding="utf-8") as f:
+        for line in f:
+            member, offset, row_id = line.rstrip("\n").split("\t")
+            block = gzip.decompress(data[int(member):])
+            assert json.loads(block[int(offset):].split(b"\n", 1)[0])["_id"] == row_id
+
+
+def test_pretty_printed_content_is_compacted(tmp_path):
+    directory = str(tmp_path / "spool")
+    write_segments(Spool.create(directory), iter([("a", json.dumps({"_id": "a", "v": [1, 2]}, indent=2))]))
+    entry = read_manifest(directory)["segments"][0]
+    assert list(read_segment(directory, entry)) == [[("a", '{"_id":"a","v":[1,2]}')]]
+
+
+def test_failed_segment_leaves_no_files(tmp_path):
+    directory = str(tmp_path / "spool")
+    target = Spool.create(directory)
+    with pytest.raises(ValueError):
+        write_segments(target, iter([("a", "{}"), ("b\nc", "{}")]))
+    assert os.listdir(directory) == [spool.MANIFEST]
+    assert read_manifest(directory)["segments"] == []
+
+
+def test_create_refuses_an_existing_spool(tmp_path):
+    directory = str(tmp_path / "spool")
+    Spool.create(directory)
+    with pytest.raises(ValueError):
+        Spool.create(directory)
+    with pytest.raises(ValueError):
+        read_manifest(str(tmp_path))
+
+
+def test_read_ndjson(tmp_path):
+    path = str(tmp_path / "hits.ndjson.gz")
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write("\n".join(content for _, content in hits(5)) + "\n\n")
+    assert list(read_ndjson(path)) == hits(5)
+    bad = tmp_path / "bad.ndjson"
+    bad.write_text('{"_source": {}}\n')
+    with pytest.raises(ValueError):
+        list(read_ndjson(str(bad)))
+
+
+def test_load_segment_batches(tmp_path, monkeypatch, small_blocks):
+    directory = str(tmp_path / "spool")
+    write_segments(Spool.create(directory), iter(hits(25)))
+    batches = []
+
+    class Closable:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    conn, cursor = Closable(), Closable()
+
+    def fake_write(_conn, _cursor, db_config, retry, label, write, **options):
+        return write(conn, cursor), conn, cursor
+
+    def fake_insert(conn, cursor, table, batch):
+        batches.append([row_id for row_id, _, _ in batch])
+        return len(batch) - 1
+
+    monkeypatch.setattr(spool, "write_with_retry", fake_write)
+    monkeypatch.setattr(spool, "insert_batch", fake_insert)
+    entry = read_manifest(directory)["segments"][0]
+    rows, inserted, failed = load_segment(directory, entry, {}, "t", batch_rows=10)
+    assert (rows, inserted, failed) == (25, 22, 0)
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert sum(batches, []) == [row_id for row_id, _ in hits(25)]
+    assert conn.closed and cursor.closed
+
+
+def test_follow_gives_up_on_a_stalled_extract(tmp_path, monkeypatch, caplog, small_blocks):
+    directory = str(tmp_path / "spool")
+    write_segments(Spool.create(directory), iter(hits(5)))  # never finished, as if the extract had died
+    loaded = []
+    monkeypatch.setattr(spool, "load_segment", lambda directory, entry, *rest: loaded.append(entry["name"]) or (5, 5, 0))
+    args = argparse.Namespace(spool_dir=directory, db_host="h", db_user="u", db_pass="p", db_name="d", db_table="t",
+                              content_codec="json", max_retries=0, workers=1, insert_batch_rows=10, insert_batch_bytes=1 << 20,
+                              follow=True, poll_secs=0.01, idle_timeout=0.1)
+    assert spool.load(args) == 1
+    assert len(loaded) == 1
+    assert "has not changed for 0.1s" in caplog.text
@@ -0,0 +1,105 @@
+import gzip
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+from metrics import registry as metrics
+from transport import EsTransport, es_base_url
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from fake_es import FakeIndex, serve  # noqa: E402
+
+
+@pytest.fixture(params=[True, False], ids=["gzip", "plain"])
+def es(request):
+    index = FakeIndex(250, unique_docs=50)
+    server = serve(index, port=0, compression=request.param)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield index, f"http://127.0.0.1:{server.server_address[1]}/bench/_search", request.param
+    server.shutdown()
+    server.server_close()
+
+
+def wire_bytes():
+    return metrics.counters.get("es_wire_bytes_total", 0)
+
+
+@pytest.mark.parametrize("compress_requests", [False, True])
+def test_scroll_over_one_connection(es, compress_requests):
+    index, url, compressed = es
+    transport = EsTransport(url, compress_requests=compress_requests)
+    before = wire_bytes()
+    response = transport.search({"query": {"match_all": {}}}, {"scroll": "1m", "size": 100}, "test")
+    pages = [response.json()]
+    content_bytes = len(response.content)
+    while pages[-1]["hits"]["hits"]:
+        response = transport.scroll(pages[-1]["_scroll_id"], {}, "test")
+        pages.append(response.json())
+        content_bytes += len(response.content)
+    transport.clear_scroll(pages[-1]["_scroll_id"], "test")
+    transport.close()
+
+    assert sum(len(page["hits"]["hits"]) for page in pages) == 250
+    assert index.stats["connections"] == 1 and index.stats["cleared"] == 1
+    # Compressed responses count what came off the socket, not the decoded body
+    if compressed:
+        assert 0 < wire_bytes() - before < content_bytes / 2
+    else:
+        assert wire_bytes() - before == content_bytes
+
+
+class FakeRaw:
+    def tell(self):
+        return 7
+
+
+class FakeResponse:
+    status_code = 200
+    content = b"{}"
+    raw = FakeRaw()
+
+
+class RecordingSession:
+    def __init__(self):
+        self.posts = []
+
+    def post(self, url, **kwargs):
+        self.posts.append((url, kwargs))
+        return FakeResponse()
+
+    def close(self):
+        raise AssertionError("a shared session is not closed")
+
+
+def test_request_options():
+    session = RecordingSession()
+    transport = EsTransport("http://es:9200/logs/_search", auth=("u", "p"), headers={"Content-Type": "application/json"},
+                            connect_timeout=3, read_timeout=30, compress_requests=True, session=session)
+    transport.search({"query": {"match_all": {}}}, {"scroll": "2m"}, "test")
+    transport.scroll("s1", {"filter_path": "hits.hits._id"}, "test", keepalive="5m")
+    transport.close()
+
+    (search_url, search), (scroll_url, scroll) = session.posts
+    assert search_url == "http://es:9200/logs/_search"
+    assert scroll_url == "http://es:9200/_search/scroll"
+    assert search["timeout"] == scroll["timeout"] == (3, 30)
+    assert search["auth"] == ("u", "p") and search["params"] == {"scroll": "2m"}
+    assert search["headers"] == {"Content-Type": "application/json", "Accept-Encoding": "gzip", "Content-Encoding": "gzip"}
+    assert json.loads(gzip.decompress(search["data"])) == {"query": {"match_all": {}}}
+    assert json.loads(gzip.decompress(scroll["data"])) == {"scroll": "5m", "scroll_id": "s1"}
+    # The caller's headers are not modified
+    assert "Content-Encoding" not in transport.headers
+
+
+def test_wire_bytes_from_the_raw_stream():
+    before = wire_bytes()
+    EsTransport("http://es:9200/logs/_search", session=RecordingSession()).search({}, {}, "test")
+    assert wire_bytes() - before == 7
+
+
+def test_es_base_url():
+    assert es_base_url("http://es:9200/logs/_search") == "http://es:9200"
+    assert es_base_url("https://es/proxy/logs-*/_search?pretty") == "https://es/proxy"
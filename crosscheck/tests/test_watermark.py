@@ -0,0 +1,111 @@
+import os
+import sys
+
+import pytest
+
+import migrate
+from checkpoint import CheckpointStore, CheckpointTracker
+from watermark import format_millis, load_watermark, save_watermark, window_start
+
+NOON = 1764590400000  # 2025-12-01T12:00:00Z
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "wm.json")
+    saved = save_watermark(path, [NOON], "a")
+    assert saved["timestamp"] == "2025-12-01T12:00:00.000Z"
+    assert load_watermark(path) == saved
+    save_watermark(path, [NOON + 1], "b")
+    assert load_watermark(path)["sort_key"] == [NOON + 1]
+    # The temporary file is renamed over the watermark, never left behind
+    assert os.listdir(tmp_path) == ["wm.json"]
+
+
+def test_missing_file_is_a_first_run(tmp_path):
+    assert load_watermark(str(tmp_path / "wm.json")) is None
+
+
+@pytest.mark.parametrize("content", ["{", "{}", '{"sort_key": []}'])
+def test_corrupt_file(tmp_path, content):
+    path = tmp_path / "wm.json"
+    path.write_text(content)
+    with pytest.raises(ValueError):
+        load_watermark(str(path))
+
+
+def test_failed_write_keeps_the_old_watermark(tmp_path, monkeypatch):
+    path = str(tmp_path / "wm.json")
+    save_watermark(path, [NOON], "a")
+
+    def crash(fd):
+        raise OSError("disk full")
+    monkeypatch.setattr(os, "fsync", crash)
+    with pytest.raises(OSError):
+        save_watermark(path, [NOON + 1], "b")
+    assert load_watermark(path)["last_id"] == "a"
+    assert os.listdir(tmp_path) == ["wm.json"]
+
+
+def test_window_start():
+    assert format_millis(NOON + 5) == "2025-12-01T12:00:00.005Z"
+    assert window_start({"sort_key": [NOON, "a"]}, 6) == "2025-12-01T06:00:00.000Z"
+    assert window_start({"sort_key": [NOON]}, 0.5) == "2025-12-01T11:30:00.000Z"
+
+
+def test_low_watermark_waits_for_every_open_slice(tmp_path):
+    store = CheckpointStore(str(tmp_path / "ck.db"))
+    tracker = CheckpointTracker(store, "job", {})
+    tracker.ack(tracker.start_page(0, [300], "c", 1))
+    assert tracker.low_watermark(2) is None
+    tracker.ack(tracker.start_page(1, [100], "a", 1))
+    assert tracker.low_watermark(2) == ([100], "a")
+    tracker.finish_slice(1)
+    assert tracker.low_watermark(2) == ([300], "c")
+    tracker.finish_slice(0)
+    assert tracker.low_watermark(2) == ([300], "c")
+
+
+class Scrolled(Exception):
+    pass
+
+
+def run_main(monkeypatch, tmp_path, *extra):
+    """Run migrate.main() up to the scroll and return the per-slice queries it would send."""
+    queries = {}
+
+    def run_threaded_migration(args, db_config, headers, auth, slice_queries, *rest):
+        queries.update(slice_queries)
+        raise Scrolled()
+    monkeypatch.setattr(migrate, "run_threaded_migration", run_threaded_migration)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["migrate.py", "--es_url", "http://es:9200/logs/_search", "--es_user", "u", "--es_pass", "p",
+                                      "--db_host", "db", "--db_user", "u", "--db_pass", "p", "--db_name", "d", "--db_table", "t",
+                                      "--lte", "2025-12-02T00:00:00", *extra])
+    with pytest.raises(Scrolled):
+        migrate.main()
+    return queries
+
+
+def test_since_watermark_reads_from_the_watermark_minus_lateness(tmp_path, monkeypatch):
+    path = str(tmp_path / "wm.json")
+    save_watermark(path, [NOON], "a")
+    queries = run_main(monkeypatch, tmp_path, "--since_watermark", path, "--watermark_lateness_hours", "2",
+                       "--gte", "2025-11-01T00:00:00")
+    body = queries[0]
+    assert body["query"]["range"]["@timestamp"]["gte"] == "2025-12-01T10:00:00.000Z"
+    assert body["query"]["range"]["@timestamp"]["lte"] == "2025-12-02T00:00:00"
+    assert body["sort"] == [{"@timestamp": "asc"}]
+
+
+def test_since_watermark_first_run_uses_gte(tmp_path, monkeypatch):
+    queries = run_main(monkeypatch, tmp_path, "--since_watermark", str(tmp_path / "wm.json"), "--gte", "2025-11-01T00:00:00")
+    assert queries[0]["query"]["range"]["@timestamp"]["gte"] == "2025-11-01T00:00:00"
+
+
+@pytest.mark.parametrize("content", [None, "not json"])
+def test_since_watermark_refuses_to_guess(tmp_path, monkeypatch, content):
+    path = tmp_path / "wm.json"
+    if content:
+        path.write_text(content)
+    with pytest.raises(SystemExit):
+        run_main(monkeypatch, tmp_path, "--since_watermark", str(path))
@@ -0,0 +1,107 @@
+"""HTTP transport for the threaded engine's ES requests: search, scroll and clear scroll.
+
+One EsTransport (one requests.Session) is shared by every scroll thread of a run, so
+connections and their TLS sessions are kept alive and reused for every page instead of
+being set up per request. Responses are requested gzip-compressed (ES compresses them
+when http.compression is on, the default), request bodies are gzipped with
+--es_compress_requests, and every request has a connect and a read timeout, which
+post_with_retry() retries like a connection error. Scroll requests move the scroll
+forward, so they are only retried when they never reached ES (see post_with_retry()).
+
+Response bytes are counted twice: es_wire_bytes_total as received (compressed) and
+es_bytes_total as decoded (by migrate.decode_page()).
+
+Under migrate.py --jobs every job's EsTransport uses the run's one session (auth and
+headers are sent per request, so jobs with different credentials can share it), and
+search and scroll requests wait for a slot from the run's ES scheduler.
+
+scroll_slice() only calls search(), scroll() and clear_scroll(), so any object with
+those three methods returning requests-like responses can stand in for EsTransport.
+"""
+import gzip
+import json
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import registry as metrics
+from retry import RetryPolicy, post_with_retry
+
+DEFAULT_CONNECT_TIMEOUT = 10.0
+# A 10000-hit page of a large index can take well over a minute under load
+DEFAULT_READ_TIMEOUT = 120.0
+
+
+def es_base_url(es_url):
+    # Extract base ES URL (remove /index/_search part)
+    return es_url.split('/_search')[0].rsplit('/', 1)[0]
+
+
+def pooled_session(pool_size=10, hosts=1):
+    """A requests.Session keeping up to pool_size connections per host alive, for hosts hosts."""
+    session = requests.Session()
+    # requests would otherwise keep only 10 connections per host
+    adapter = HTTPAdapter(pool_connections=hosts, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class EsTransport:
+    """Pooled, compressed ES requests for one search URL (.../index/_search).
+
+    With a session, requests go over it and close() leaves it open for its other users;
+    with a gate (a scheduler.JobGate), each attempt of a search or scroll request holds
+    one of its slots, released while it backs off before a retry.
+    """
+
+    def __init__(self, es_url, auth=None, headers=None, retry=None, pool_size=10, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, compress_requests=False, session=None, gate=None):
+        self.search_url = es_url
+        self.scroll_url = f"{es_base_url(es_url)}/_search/scroll"
+        self.retry = retry or RetryPolicy()
+        self.timeout = (connect_timeout, read_timeout)
+        self.compress_requests = compress_requests
+        self.gate = gate
+        # Every thread gets its own pooled connection
+        self.owns_session = session is None
+        self.session = session or pooled_session(pool_size)
+        self.auth = auth
+        self.headers = {**(headers or {}), "Accept-Encoding": "gzip"}
+
+    def _post(self, url, body, params, label, idempotent=True):
+        data = json.dumps(body).encode("utf-8")
+        headers = self.headers
+        if self.compress_requests:
+            data = gzip.compress(data, 1)
+            headers = {**headers, "Content-Encoding": "gzip"}
+        response = post_with_retry(self.session, url, self.retry, label, idempotent, self.gate, params=params, data=data,
+                                   headers=headers, auth=self.auth, timeout=self.timeout)
+        # urllib3 counts the bytes read off the socket, before gzip decoding
+        metrics.inc("es_wire_bytes_total", response.raw.tell() if response.raw else len(response.content))
+        return response
+
+    def search(self, body, params, label):
+        """Open a scroll: the first page of body's query."""
+        return self._post(self.search_url, body, params, label)
+
+    def scroll(self, scroll_id, params, label, keepalive="2m"):
+        """The next page of an open scroll."""
+        return self._post(self.scroll_url, {"scroll": keepalive, "scroll_id": scroll_id}, params, label, idempotent=False)
+
+    def clear_scroll(self, scroll_id, label):
+        """Release a scroll context now instead of letting it pin segments until the keepalive expires."""
+        if not scroll_id:
+            return
+        try:
+            response = self.session.delete(self.scroll_url, data=json.dumps({"scroll_id": [scroll_id]}), headers=self.headers,
+                                           auth=self.auth, timeout=self.timeout)
+            if response.status_code not in (200, 404):
+                logging.warning(f"{label}: clearing scroll context failed: {response.status_code}, {response.text}")
+        except requests.RequestException as e:
+            logging.warning(f"{label}: clearing scroll context failed: {e}")
+
+    def close(self):
+        if self.owns_session:
+            self.session.close()
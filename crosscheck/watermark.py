@@ -0,0 +1,52 @@
+"""High-watermark file for incremental runs (migrate.py --since_watermark).
+
+The file records the @timestamp (epoch millis, as returned in the hit's sort values)
+and _id of the newest hit up to which every matching document is committed in MySQL.
+The next run starts from that timestamp minus a lateness allowance.
+"""
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+
+def load_watermark(path):
+    """Return {"sort_key", "last_id", "updated_at"} or None if the file does not exist yet."""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        watermark = json.load(f)
+    if not watermark.get("sort_key"):
+        raise ValueError(f"{path} has no sort_key")
+    return watermark
+
+
+def save_watermark(path, sort_key, last_id):
+    """Write the watermark atomically: a crash leaves either the old or the new file."""
+    watermark = {
+        "sort_key": sort_key,
+        "last_id": last_id,
+        "timestamp": format_millis(sort_key[0]),
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".watermark-", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(watermark, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return watermark
+
+
+def format_millis(millis):
+    return datetime.fromtimestamp(millis / 1000, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def window_start(watermark, lateness_hours):
+    """Start of the next window: the watermark's timestamp minus the lateness allowance."""
+    return format_millis(watermark["sort_key"][0] - timedelta(hours=lateness_hours) // timedelta(milliseconds=1))
@@ -1,6 +1,7 @@
 #!/bin/bash
 
 LOG_FILE="etl.log"
+. "$(dirname "$0")/scripts/etl-summary.sh"
 
 echo "📊 ETL Monitoring Dashboard"
 echo "======================================"
@@ -14,6 +15,10 @@ echo "❌ Recent Errors:"
 grep "ETL Failed" $LOG_FILE | tail -5
 echo ""
 
+echo "🔁 Last migrate.py Run:"
+print_etl_summary
+echo ""
+
 echo "📈 Database Stats:"
 mysql -u root -proot test_json -e "
 SELECT 
@@ -0,0 +1,20 @@
+# Prints the summary of the last migrate.py run (daily_run.sh's SUMMARY_FILE).
+# Sourced by monitor-etl.sh and scripts/monitor-etl.sh.
+
+print_etl_summary() {
+  local summary_file="${SUMMARY_FILE:-crosscheck/daily_run.summary.json}"
+  if [ ! -f "$summary_file" ]; then
+    echo "  No summary found at $summary_file"
+    return
+  fi
+  python3 - "$summary_file" <<'PY'
+import json, sys
+s = json.load(open(sys.argv[1]))
+c = s.get("counters", {})
+print(f"  {s['status'].upper()} at {s['finished_at']} (exit {s['exit_code']}), {s['elapsed_seconds']}s")
+print(f"  fetched {s['fetched']}, inserted {c.get('rows_inserted_total', 0)}, skipped {c.get('rows_skipped_total', 0)}, failed {s['failed_rows']}, retries {c.get('retries_total', 0)}")
+print(f"  {s['docs_per_second']['fetched']} docs/sec fetched, {s['docs_per_second']['inserted']} docs/sec inserted")
+for name, stage in s.get("stages", {}).items():
+    print(f"  {name}: p50 {stage['p50']}s, p95 {stage['p95']}s, total {stage['total']}s")
+PY
+}
@@ -4,6 +4,7 @@
 # Usage: ./monitor-etl.sh
 
 LOG_FILE="etl.log"
+. "$(dirname "$0")/etl-summary.sh"
 
 echo "📊 ETL Monitoring Dashboard"
 echo "======================================"
@@ -28,6 +29,10 @@ else
 fi
 echo ""
 
+echo "🔁 Last migrate.py Run:"
+print_etl_summary
+echo ""
+
 echo "📈 Database Stats:"
 echo "Checking database connection..."
 mysql -u root -proot test_json -e "